@@ -0,0 +1,7 @@
+# Offline benchmarks of the crawler, run them from the project root, e.g.
+#
+#     python -m benchmarks.xpath_benchmark
+#     python -m benchmarks.schema_benchmark
+#     python -m benchmarks.parse_suite --output result.json [--compare previous.json]
+#     python -m benchmarks.store_benchmark --backend sqlite|mysql [--cars 10000]
+#     python -m benchmarks.async_benchmark --concurrency 1,2,4,8 [--parse]
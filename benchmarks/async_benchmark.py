@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+#######################################
+### adbapi against the non-blocking MySQL client
+#######################################
+
+# Python imports
+import sys
+from optparse import OptionParser
+from timeit import default_timer
+from twisted.internet import defer
+from twisted.internet import reactor
+from twisted.internet import task
+from twisted.python.failure import Failure
+
+# Custom imports
+from fatech_production.parsers.carlocate import CarlocateParser
+from fatech_production.storage.mysql import MySQLBackend
+from fatech_production.storage.mysqlprotocol import MySQLProtocolPool
+from benchmarks.parse_suite import install_stub_catalog
+from benchmarks.parse_suite import build_responses
+from benchmarks.parse_suite import percentile
+
+# the urls are written into a temporary table of each connection, nothing is left in the database
+SITE = 'benchmark'
+
+backend = MySQLBackend()
+
+def write_urls(cursor, number, statements, rows):
+    """ a group commit of links: statements multi-row upserts of rows links """
+
+    cursor.execute("".join(("create temporary table if not exists ", SITE, "_urls like template_urls;")))
+    first_id = number * statements * rows
+    for i in xrange(statements):
+        start = first_id + i * rows
+        backend.write_urls(cursor, SITE, [(url_id, 'http://benchmark/' + str(url_id), 'S') for url_id in xrange(start, start + rows)])
+
+@defer.inlineCallbacks
+def worker(pool, numbers, statements, rows, latencies):
+    """ run the transactions one after the other until none is left """
+
+    while numbers:
+        number = numbers.pop()
+        begin = default_timer()
+        yield pool.runInteraction(write_urls, number, statements, rows)
+        latencies.append(default_timer() - begin)
+
+def parse_pages(parsed):
+    """ parse the recorded page over and over in the reactor, like a crawl does between the writes """
+
+    install_stub_catalog()
+    response = build_responses('carlocate_detail.html', 'http://www.carlocate.com/Pages/VehicleDetail.aspx?id=41234567', 200, 1)[0]
+    parser = CarlocateParser()
+    while True:
+        parser.parse(response)
+        parsed[0] += 1
+        yield None
+
+@defer.inlineCallbacks
+def run(name, pool, concurrency, options):
+    """ run options.transactions transactions with concurrency of them in flight, print the throughput """
+
+    numbers = range(options.transactions)
+    latencies = []
+    parsed = [0]
+    parsing = task.cooperate(parse_pages(parsed)) if options.parse else None
+
+    started = default_timer()
+    yield defer.DeferredList([worker(pool, numbers, options.statements, options.rows, latencies) for i in xrange(concurrency)],
+                             fireOnOneErrback=True, consumeErrors=True)
+    elapsed = default_timer() - started
+    if parsing is not None:
+        parsing.stop()
+
+    latencies.sort()
+    line = "%-8s concurrency %3d: %8.1f transactions/sec, %10.1f rows/sec, p50 %8.2f ms, p99 %8.2f ms" % (
+        name, concurrency, len(latencies) / elapsed, len(latencies) * options.statements * options.rows / elapsed,
+        percentile(latencies, 0.50) * 1000.0, percentile(latencies, 0.99) * 1000.0)
+    if options.parse:
+        line += ", %.1f pages parsed/sec" % (parsed[0] / elapsed)
+    print line
+
+@defer.inlineCallbacks
+def main(options):
+    for concurrency in options.concurrency:
+        pool = backend.connection_pool(cp_min=concurrency, cp_max=concurrency)
+        yield run('adbapi', pool, concurrency, options)
+        pool.close()
+
+        pool = MySQLProtocolPool(size=concurrency)
+        yield run('protocol', pool, concurrency, options)
+        pool.close()
+
+def stop(result):
+    if isinstance(result, Failure):
+        result.printTraceback()
+    reactor.stop()
+
+if __name__ == "__main__":
+    option_parser = OptionParser(usage="python -m benchmarks.async_benchmark [options]")
+    option_parser.add_option('-c', '--concurrency', default='1,2,4,8', help="comma separated numbers of transactions in flight")
+    option_parser.add_option('-t', '--transactions', type='int', default=200, help="transactions per run")
+    option_parser.add_option('-s', '--statements', type='int', default=4, help="statements per transaction")
+    option_parser.add_option('-r', '--rows', type='int', default=250, help="links per statement")
+    option_parser.add_option('-p', '--parse', action='store_true', help="parse pages in the reactor meanwhile")
+    options, args = option_parser.parse_args(sys.argv[1:])
+    options.concurrency = [int(value) for value in options.concurrency.split(',')]
+
+    reactor.callWhenRunning(lambda: main(options).addBoth(stop))
+    reactor.run()
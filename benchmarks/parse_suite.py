@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+#######################################
+### Offline parse benchmark suite
+#######################################
+
+# Python imports
+import gc
+import json
+import os
+import sys
+import platform
+from datetime import datetime
+from optparse import OptionParser
+from timeit import default_timer
+
+# Scrapy imports
+from scrapy.http import HtmlResponse
+from scrapy.http import Request
+
+# Custom imports
+from fatech_production.misc import spiderutil
+from fatech_production.misc.catalog import catalog
+from fatech_production.parsers.carlocate import CarlocateParser
+from fatech_production.parsers.autotrader import AutoTraderParser
+from fatech_production.parsers.autotrader import AutoTraderVinParser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# bump it whenever the layout of the result changes
+RESULT_VERSION = 2
+
+# (make, model) pairs standing in for the year_make_model table, so the suite runs without MySQL
+STUB_CATALOG = (
+    ('Honda', 'Civic'), ('Honda', 'Accord'), ('Honda', 'CR-V'), ('Honda', 'Odyssey'),
+    ('Chevrolet', 'Silverado 1500'), ('Chevrolet', 'Malibu'), ('Chevrolet', 'Impala'),
+    ('Ford', 'F-150'), ('Ford', 'Focus'), ('Ford', 'Escape'),
+    ('Toyota', 'Camry'), ('Toyota', 'Corolla'), ('Jeep', 'Grand Cherokee'), ('Jeep', 'Wrangler'),
+)
+
+# (benchmark name, parser, fixture file, url of the response, http status)
+PAGES = (
+    ('carlocate_detail', CarlocateParser(), 'carlocate_detail.html',
+     'http://www.carlocate.com/Pages/VehicleDetail.aspx?id=41234567', 200),
+    ('carlocate_notfound', CarlocateParser(), 'carlocate_notfound.html',
+     'http://www.carlocate.com/SearchCars.aspx', 200),
+    ('autotrader_highlights', AutoTraderParser(), 'autotrader_highlights.html',
+     'http://www.autotrader.com/cars-for-sale/popup/vehiclehighlights.xhtml?listingId=338123456', 200),
+    ('autotrader_notfound', AutoTraderParser(), 'autotrader_notfound.html',
+     'http://www.autotrader.com/cars-for-sale/popup/vehiclehighlights.xhtml?listingId=338123457', 200),
+    ('autotrader_mobile_vdp', AutoTraderVinParser(), 'autotrader_mobile_vdp.html',
+     'http://m.autotrader.com/vdp.html?id=338123456', 200),
+)
+
+# (benchmark name, helper, argument)
+HELPERS = (
+    ('parse_YMMT', spiderutil.parse_YMMT, u'2012 Chevrolet Silverado 1500 LT Crew Cab'),
+    ('extract_YMMT', spiderutil.extract_YMMT, u'2012 Chevrolet Silverado 1500 LT Crew Cab'),
+    ('extract_price', spiderutil.extract_price, u'$27,488'),
+    ('extract_mileage', spiderutil.extract_mileage, u'34,521 miles'),
+    ('extract_phone', spiderutil.extract_phone, u'Phone: 614-555-0199'),
+    ('extract_street', spiderutil.extract_street, u'4500 West Broad Street'),
+    ('extract_CSZ', spiderutil.extract_CSZ, u'Columbus, OH 43228'),
+)
+
+def install_stub_catalog():
+    """ fill the shared catalog with STUB_CATALOG and never let it reload from the DB """
+
+    catalog.ttl = 0
+    catalog.load_pairs(STUB_CATALOG)
+
+def build_responses(fixture, url, status, count):
+    """ build count responses of a recorded page, each one as fresh as a downloaded response """
+
+    f = open(os.path.join(FIXTURES_DIR, fixture), 'rb')
+    body = f.read()
+    f.close()
+
+    responses = []
+    for i in xrange(count):
+        request = Request(url, meta={'url_id': 338123456})
+        responses.append(HtmlResponse(url, status=status, body=body, encoding='utf-8', request=request))
+    return responses
+
+def percentile(sorted_values, ratio):
+    """ nearest-rank percentile of a sorted list """
+
+    index = int(round(ratio * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+def measure_allocations(func, args_list):
+    """ mean memory cost of a call, returns (field, value, unit) of the result.
+        with tracemalloc, the peak bytes allocated by the call as allocations_per_page.
+        without it (python 2.7), the objects tracked by the garbage collector which are still alive
+        after the call as retained_objects_per_page: the temporaries freed by refcounting are not seen,
+        so it is not a count of allocations
+    """
+
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    total = 0
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for args in args_list:
+            # forget the blocks of the previous call, the peak is then the one of this call
+            tracemalloc.clear_traces()
+            func(*args)
+            total += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return 'allocations_per_page', float(total) / len(args_list), 'bytes'
+
+    gc.collect()
+    gc.disable()
+    try:
+        for args in args_list:
+            before = len(gc.get_objects())
+            func(*args)
+            total += len(gc.get_objects()) - before
+    finally:
+        gc.enable()
+    return 'retained_objects_per_page', float(total) / len(args_list), 'gc_objects'
+
+def run_benchmark(func, args_list, allocation_rounds):
+    """ time func over every args of args_list, returns a dict of results """
+
+    # warm up compiled xpaths, caches and the interpreter
+    for args in args_list[:10]:
+        func(*args)
+
+    latencies = []
+    started = default_timer()
+    for args in args_list:
+        begin = default_timer()
+        func(*args)
+        latencies.append(default_timer() - begin)
+    elapsed = default_timer() - started
+
+    latencies.sort()
+    field, allocations, unit = measure_allocations(func, args_list[:allocation_rounds])
+    return {
+        'rounds': len(args_list),
+        'pages_per_sec': round(len(args_list) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000.0, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000.0, 4),
+        field: round(allocations, 1),
+        'allocation_unit': unit,
+    }
+
+def run_suite(rounds):
+    """ run every page and helper benchmark, returns the machine-readable result """
+
+    install_stub_catalog()
+    allocation_rounds = min(rounds, 100)
+
+    results = {}
+    for name, parser, fixture, url, status in PAGES:
+        responses = build_responses(fixture, url, status, rounds)
+        results[name] = run_benchmark(parser.parse, [(response,) for response in responses], allocation_rounds)
+
+    for name, helper, argument in HELPERS:
+        results[name] = run_benchmark(helper, [(argument,)] * rounds, allocation_rounds)
+
+    return {
+        'version': RESULT_VERSION,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'rounds': rounds,
+        'benchmarks': results,
+    }
+
+def compare(previous, current):
+    """ print the change of throughput and p99 latency of each benchmark against a previous result """
+
+    for name in sorted(current['benchmarks']):
+        now = current['benchmarks'][name]
+        before = previous['benchmarks'].get(name)
+        if before is None:
+            print "%-24s new" % name
+            continue
+        print "%-24s pages/sec %10.1f -> %10.1f (%+.1f%%)  p99 %.4f -> %.4f ms" % (
+            name, before['pages_per_sec'], now['pages_per_sec'],
+            (now['pages_per_sec'] / before['pages_per_sec'] - 1) * 100.0, before['p99_ms'], now['p99_ms'])
+
+def main(argv):
+    option_parser = OptionParser(usage="python -m benchmarks.parse_suite [options]")
+    option_parser.add_option('-n', '--rounds', type='int', default=1000, help="pages parsed per benchmark")
+    option_parser.add_option('-o', '--output', help="write the JSON result into this file instead of stdout")
+    option_parser.add_option('-c', '--compare', help="print the changes against a previous JSON result")
+    options, args = option_parser.parse_args(argv)
+
+    result = run_suite(options.rounds)
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if options.output:
+        f = open(options.output, 'wb')
+        f.write(output + "\n")
+        f.close()
+    else:
+        print output
+
+    if options.compare:
+        f = open(options.compare, 'rb')
+        previous = json.load(f)
+        f.close()
+        compare(previous, result)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#######################################
+### Key/value extraction benchmark
+#######################################
+
+# Python imports
+import re
+import sys
+import time
+
+# Custom imports
+from fatech_production.items import Car
+from fatech_production.misc.spiderutil import doors_tostring
+from fatech_production.parsers import carlocate
+from fatech_production.parsers import autotrader
+from fatech_production.parsers.schema import SchemaExtractor
+
+# labels and values as extracted from the recorded pages
+CARLOCATE_LEFT = ([u'Stock #:', u'VIN:', u'Color:', u'Interior Color:', u'Body Style:'],
+                  [u' H12345A', u' 19XFB2F58CE012345', u' Polished Metal Metallic', u' Gray', u' Sedan'])
+CARLOCATE_MIDDLE = ([u'Mileage:', u'Engine:', u'Transmission:', u'Doors:', u'Drivetrain:'],
+                    [u' 23,456', u' 1.8L 4 Cyl.', u' Automatic', u' 4', u' FWD'])
+AUTOTRADER_DETAILS = ([u'Mileage', u'Body Style', u'Exterior Color', u'Interior Color', u'Engine', u'Transmission',
+                       u'Drive Type', u'Doors', u'Fuel Type', u'Stock #', u'VIN'],
+                      [u'34,521', u'Crew Cab Pickup', u'Summit White', u'Ebony', u'8-Cylinder Flexible Fuel 5.3L',
+                       u'6-Speed Automatic', u'4 wheel drive', u'4', u'Flexible Fuel', u'C4521', u'3GCPKSE73CG123456'])
+
+def carlocate_loops(car):
+    """ before: the key/value loops of the carlocate parser """
+
+    key_list, text_list = CARLOCATE_LEFT
+    for i in xrange(len(key_list)):
+        key = key_list[i]
+        key = re.sub(r' #', '_id', key)
+        key = re.sub(r' ', '_', key)
+        key = re.sub(r':', '', key).strip().lower()
+        text = text_list[i].strip()
+        if key.encode('utf-8') == 'color':
+            car['exterior_color'] = text
+        else:
+            car[key.encode('utf-8')] = text
+
+    key_list, text_list = CARLOCATE_MIDDLE
+    for i in xrange(len(key_list)):
+        key = key_list[i]
+        key = re.sub(r' ', '_', key)
+        key = re.sub(r':', '', key).strip().lower()
+        text = text_list[i].strip()
+        if key.encode('utf-8') == 'mileage':
+            car['mileage'] = text.replace(',', '')
+        elif key.encode('utf-8') == 'doors':
+            car['doors'] = doors_tostring(text)
+        elif key.encode('utf-8') == 'drivetrain':
+            car['drive_type'] = text
+        else:
+            car[key.encode('utf-8')] = text
+
+def autotrader_loops(car):
+    """ before: the key/value loop of the autotrader parser """
+
+    key_list, text_list = AUTOTRADER_DETAILS
+    for i in xrange(len(key_list)):
+        key = key_list[i].strip()
+        text = text_list[i].strip()
+        key = re.sub(r' ', '_', key).lower()
+        if key.encode('utf-8') == 'doors':
+            car['doors'] = doors_tostring(text)
+        elif 'stock' in key:
+            car['stock_id'] = text
+        else:
+            car[key.encode('utf-8')] = text
+
+def carlocate_tables(car, tables=SchemaExtractor(carlocate.SCHEMA).tables):
+    """ after: the compiled tables of the carlocate schema """
+
+    tables[0].fill(car, *CARLOCATE_LEFT)
+    tables[1].fill(car, *CARLOCATE_MIDDLE)
+
+def autotrader_tables(car, tables=SchemaExtractor(autotrader.SCHEMA).tables):
+    """ after: the compiled table of the autotrader schema """
+
+    tables[0].fill(car, *AUTOTRADER_DETAILS)
+
+def timeit(func, rounds):
+    """ returns the mean time of a call in microseconds """
+
+    started = time.time()
+    for i in xrange(rounds):
+        func(Car())
+    return (time.time() - started) * 1000000.0 / rounds
+
+def main(rounds=20000):
+    for site, before_func, after_func in (('carlocate', carlocate_loops, carlocate_tables),
+                                          ('autotrader', autotrader_loops, autotrader_tables)):
+        # both ways must fill the same car
+        before_car, after_car = Car(), Car()
+        before_func(before_car)
+        after_func(after_car)
+        assert dict(before_car) == dict(after_car), (dict(before_car), dict(after_car))
+
+        before = timeit(before_func, rounds)
+        after = timeit(after_func, rounds)
+        print "%-12s before %.1f us/page  after %.1f us/page  speedup x%.2f" % (site, before, after, before / after)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+#######################################
+### Crawl-and-store benchmark
+#######################################
+
+# Python imports
+import os
+import sys
+import tempfile
+from optparse import OptionParser
+from timeit import default_timer
+
+# Custom imports
+from fatech_production.items import Car
+from fatech_production.parsers.carlocate import CarlocateParser
+from fatech_production.pipelines import MySQLPipeline
+from fatech_production.storage.sqlite import SQLiteBackend
+from fatech_production.settings import *
+from benchmarks.parse_suite import install_stub_catalog
+from benchmarks.parse_suite import build_responses
+from benchmarks.parse_suite import percentile
+
+FIXTURE = ('carlocate_detail.html', 'http://www.carlocate.com/Pages/VehicleDetail.aspx?id=41234567')
+
+def parsed_items(count, first_id):
+    """ the Car and Link of the recorded page, parsed once and copied under count url_ids with distinct vins """
+
+    install_stub_catalog()
+    fixture, url = FIXTURE
+    response = build_responses(fixture, url, 200, 1)[0]
+    template = CarlocateParser().parse(response)
+
+    items = []
+    for i in xrange(count):
+        for item in template:
+            item = item.copy()
+            item['url_id'] = first_id + i
+            if isinstance(item, Car):
+                item['vin'] = '%s%06d' % ((item.get('vin') or 'BENCHMARKVIN')[:11], i)
+            items.append(item)
+    return items
+
+def store(backend, items, group_size):
+    """ write the items in groups through MySQLPipeline.write_group, one transaction per group.
+        returns (seconds, sorted commit latencies)
+    """
+
+    pipeline = MySQLPipeline(backend=backend)
+    latencies = []
+    started = default_timer()
+    for start in xrange(0, len(items), group_size):
+        buffers = {}
+        for item in items[start:start + group_size]:
+            if isinstance(item, Car):
+                item = pipeline.sanitized(item)
+                item['found_by'] = 'benchmark'
+                buffers.setdefault(('cars', item['site']), []).append(item)
+            else:
+                buffers.setdefault(('urls', item['site']), []).append(item)
+
+        begin = default_timer()
+        connection = backend.connect()
+        cursor = connection.cursor()
+        pipeline.write_group(cursor, buffers)
+        connection.commit()
+        pipeline.vin_index.commit()
+        pipeline.make_models.commit()
+        cursor.close()
+        connection.close()
+        latencies.append(default_timer() - begin)
+    elapsed = default_timer() - started
+
+    latencies.sort()
+    return elapsed, latencies
+
+def main(argv):
+    option_parser = OptionParser(usage="python -m benchmarks.store_benchmark [options]")
+    option_parser.add_option('-b', '--backend', choices=('sqlite', 'mysql'), default='sqlite',
+                             help="sqlite (a temporary file unless --sqlite-path) or mysql (the DATABASE_* settings)")
+    option_parser.add_option('-n', '--cars', type='int', default=10000, help="cars stored, each one with its link")
+    option_parser.add_option('-g', '--group', type='int', default=PIPELINE_COMMIT_ITEMS, help="items per transaction")
+    option_parser.add_option('--first-id', type='int', default=900000000,
+                             help="url_id of the first car, ids already stored take the duplicate path")
+    option_parser.add_option('--sqlite-path', help="keep the sqlite database in this file")
+    options, args = option_parser.parse_args(argv)
+
+    items = parsed_items(options.cars, options.first_id)
+
+    temporary = None
+    if options.backend == 'sqlite':
+        path = options.sqlite_path
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix='.sqlite')
+            os.close(handle)
+            temporary = path
+        backend = SQLiteBackend(path)
+    else:
+        from fatech_production.storage.mysql import MySQLBackend
+        backend = MySQLBackend()
+    backend.initialize_settings(items[0]['site'])
+
+    try:
+        elapsed, latencies = store(backend, items, options.group)
+    finally:
+        if temporary is not None:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(temporary + suffix):
+                    os.remove(temporary + suffix)
+
+    print "%-8s %d items in %d groups: %.1f items/sec, commit p50 %.2f ms, p99 %.2f ms" % (
+        backend.name, len(items), len(latencies), len(items) / elapsed,
+        percentile(latencies, 0.50) * 1000.0, percentile(latencies, 0.99) * 1000.0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
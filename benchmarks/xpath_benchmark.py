@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+#######################################
+### XPath extraction benchmark
+#######################################
+
+# Python imports
+import os
+import sys
+import time
+
+# Scrapy imports
+from scrapy.http import HtmlResponse
+from scrapy.selector import HtmlXPathSelector
+
+# Custom imports
+from fatech_production.parsers import carlocate
+from fatech_production.parsers import autotrader
+from fatech_production.parsers.schema import SchemaExtractor
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# (parser module, fixture file, url of the recorded page)
+PAGES = (
+    (carlocate, 'carlocate_detail.html', 'http://www.carlocate.com/Pages/VehicleDetail.aspx?id=41234567'),
+    (autotrader, 'autotrader_highlights.html',
+     'http://www.autotrader.com/cars-for-sale/popup/vehiclehighlights.xhtml?listingId=338123456'),
+)
+
+def load_response(fixture, url):
+    """ build a response from a recorded page """
+
+    f = open(os.path.join(FIXTURES_DIR, fixture), 'rb')
+    body = f.read()
+    f.close()
+    return HtmlResponse(url, body=body, encoding='utf-8')
+
+def extract_with_selector(response, xpaths):
+    """ before: a new selector per response and every xpath string parsed again """
+
+    hxs = HtmlXPathSelector(response)
+    return [hxs.select(xpath).extract() for xpath in xpaths.itervalues()]
+
+def extract_with_engine(response, engine):
+    """ after: one tree per response and precompiled xpaths """
+
+    tree = engine.parse_tree(response)
+    return [engine.select(tree, name) for name in engine.xpaths]
+
+def timeit(func, response, arg, rounds):
+    """ returns the mean time of a call in milliseconds """
+
+    # Scrapy caches the parsed document per response, so every round gets its own copy built beforehand
+    responses = [response.replace() for i in xrange(rounds)]
+    started = time.time()
+    for each in responses:
+        func(each, arg)
+    return (time.time() - started) * 1000.0 / rounds
+
+def main(rounds=500):
+    for module, fixture, url in PAGES:
+        response = load_response(fixture, url)
+        before = timeit(extract_with_selector, response, module.SCHEMA['xpaths'], rounds)
+        after = timeit(extract_with_engine, response, SchemaExtractor(module.SCHEMA).engine, rounds)
+        print "%-28s before %.3f ms/page  after %.3f ms/page  speedup x%.2f" % (fixture, before, after, before / after)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
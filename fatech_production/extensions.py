@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+#######################################
+### Scrapy extensions
+#######################################
+
+# Scrapy imports
+from scrapy import log
+from scrapy import signals
+from scrapy.xlib.pydispatch import dispatcher
+
+# Custom imports
+from fatech_production.misc import spiderutil
+from fatech_production.settings import *
+from fatech_production.storage import get_backend
+from fatech_production.misc.querystats import query_stats
+from fatech_production.parsers import siteparser
+
+class SpiderUtilStats(object):
+    """
+        Publish the in-process counters of spiderutil, of the site parsers, of the connection pool and of the database queries
+        into Scrapy stats when a spider is closed
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        dispatcher.connect(self.spider_closed, signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def spider_closed(self, spider):
+        cache = spiderutil.ymmt_cache
+        self.stats.set_value('ymmt_cache/hits', cache.hits, spider=spider)
+        self.stats.set_value('ymmt_cache/misses', cache.misses, spider=spider)
+        self.stats.set_value('ymmt_cache/size', len(cache), spider=spider)
+
+        # responses answered before building any DOM against fully parsed ones
+        for (site, name), value in siteparser.counters.iteritems():
+            self.stats.set_value('parser/%s/%s' % (site, name), value, spider=spider)
+
+        # usage of the connection pool of DatabaseUtil, ProxiesUtil and the settings classes
+        for name, value in get_backend().connection_stats().iteritems():
+            self.stats.set_value('dbpool/%s' % name, value, spider=spider)
+
+        # latencies of the labeled queries of the pipelines and DatabaseUtil, the slowest paths in total are logged
+        query_stats.publish(self.stats, spider)
+        for label, path in query_stats.top(QUERY_STATS_TOP):
+            log.msg('[DB TIME] %s - %.1f ms in %s queries, avg %.3f ms, max %.1f ms' % (
+                label, path.total, path.count, path.total / path.count, path.max), level=log.INFO)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#######################################
+### In-process catalog of makes & models
+#######################################
+
+# Python imports
+import time
+
+# Custom imports
+from fatech_production.settings import *
+from dbutil import DatabaseUtil
+
+class ModelCatalog(object):
+    """ Process-wide catalog of the year_make_model table grouped by make.
+        It is loaded once from the DB and then refreshed when its ttl expires or on demand,
+        so extracting YMMT never touches the DB on the hot path.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL):
+        # seconds before the catalog is reloaded, 0 or less means never
+        self.ttl = ttl
+        # dict of lowercased make -> tuple of models
+        self.models = None
+        # dict of lowercased make -> frozenset of normalized models for hash lookups
+        self.model_index = None
+        # timestamp of the last load
+        self.loaded_at = 0
+
+    def load(self):
+        """ load all (make, model) pairs from the DB and group them by make """
+
+        self.load_pairs(DatabaseUtil().get_year_make_model())
+
+    def load_pairs(self, pairs):
+        """ build the catalog from an iterable of (make, model) pairs """
+
+        models = {}
+        for make, model in pairs:
+            if not make or not model:
+                continue
+            models.setdefault(make.strip().lower(), []).append(model)
+
+        # tuples for saving memory
+        self.models = dict((make, tuple(make_models)) for make, make_models in models.iteritems())
+        self.model_index = dict((make, frozenset(normalize_model(model) for model in make_models))
+                                for make, make_models in models.iteritems())
+        self.loaded_at = time.time()
+
+    def refresh(self):
+        """ reload the catalog on demand """
+
+        self.load()
+
+    def is_expired(self):
+        """ returns True if the catalog has to be (re)loaded """
+
+        if self.models is None:
+            return True
+        return self.ttl > 0 and time.time() - self.loaded_at > self.ttl
+
+    def get_models(self, make):
+        """ get all models of the make (case-insensitive).
+            return: a tuple of models, empty if the make is unknown
+        """
+
+        if self.is_expired():
+            self.load()
+        return self.models.get(make.strip().lower(), tuple())
+
+    def match_model(self, make, ngrams):
+        """ look for the longest gram which is a model of the make, the earliest one wins among grams of the same length.
+            parameters:
+                make: the make found in the description
+                ngrams: a tuple of grams generated by generate_ngrams
+
+            return: the matched gram as written in the description, or None
+        """
+
+        if self.is_expired():
+            self.load()
+        index = self.model_index.get(make.strip().lower())
+        if not index:
+            return None
+
+        best = None
+        best_length = 0
+        for gram in ngrams:
+            length = gram.count(' ') + 1
+            if length > best_length and normalize_model(gram) in index:
+                best = gram
+                best_length = length
+        return best
+
+def normalize_model(model):
+    """ normalize a model (or a gram) to be used as a lookup key """
+
+    return " ".join(model.split()).lower()
+
+# the catalog shared by every spider in the process
+catalog = ModelCatalog()
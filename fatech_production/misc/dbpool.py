@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+#######################################
+### Process-wide MySQL connection pool
+#######################################
+
+# Python imports
+import threading
+from timeit import default_timer
+import MySQLdb
+import MySQLdb.cursors
+
+# Custom imports
+from fatech_production.settings import *
+
+class PoolTimeout(Exception):
+    """ no connection was released within the timeout of the pool """
+
+class PooledConnection(object):
+    """ A connection borrowed from the pool, close() gives it back instead of closing it """
+
+    def __init__(self, pool, connection):
+        self.pool = pool
+        self.connection = connection
+
+    def __getattr__(self, name):
+        # cursor(), commit(), rollback()... of the MySQLdb connection
+        return getattr(self.connection, name)
+
+    def close(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            self.pool.release(connection)
+
+    def __del__(self):
+        # a method which raised before close() still returns its connection
+        self.close()
+
+class ConnectionPool(object):
+    """ A thread-safe pool of at most maxsize MySQL connections.
+
+        Connections are opened on demand and kept idle once released. An idle connection is pinged
+        before it is reused when it has been idle for more than ping_after seconds, a dead one is replaced.
+        Released connections are rolled back, so nobody gets the transaction or the snapshot of the previous user.
+    """
+
+    def __init__(self, maxsize=DATABASE_POOL_SIZE, timeout=DATABASE_POOL_TIMEOUT, ping_after=DATABASE_POOL_PING_AFTER):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.ping_after = ping_after
+        # list of (connection, released at)
+        self.idle = []
+        # connections opened and not closed, idle or borrowed
+        self.size = 0
+        self.condition = threading.Condition()
+        # counters to size the pool
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'broken': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'max_in_use': 0,
+        }
+
+    def connect(self):
+        """ open a new MySQL connection """
+
+        return MySQLdb.connect(
+            host=DATABASE_HOST,
+            port=DATABASE_PORT,
+            db=DATABASE_NAME,
+            user=DATABASE_USER,
+            passwd=DATABASE_PASSWORD,
+            cursorclass=MySQLdb.cursors.DictCursor,
+            charset='utf8',
+            use_unicode=True
+        )
+
+    def get_connection(self):
+        """ borrow a connection, close() it to give it back """
+
+        return PooledConnection(self, self.acquire())
+
+    def acquire(self):
+        """ take an idle connection, open a new one, or wait until one is released """
+
+        started = default_timer()
+        waited = False
+        with self.condition:
+            while not self.idle and self.size >= self.maxsize:
+                remaining = self.timeout - (default_timer() - started)
+                if remaining <= 0:
+                    raise PoolTimeout('no MySQL connection released within %s seconds' % self.timeout)
+                waited = True
+                self.condition.wait(remaining)
+
+            if waited:
+                wait_time = default_timer() - started
+                self.stats['waits'] += 1
+                self.stats['wait_time'] += wait_time
+                self.stats['max_wait_time'] = max(self.stats['max_wait_time'], wait_time)
+
+            if self.idle:
+                connection, released_at = self.idle.pop()
+            else:
+                # take the slot, the connection is opened out of the lock
+                connection, released_at = None, None
+                self.size += 1
+            self.stats['max_in_use'] = max(self.stats['max_in_use'], self.size - len(self.idle))
+
+        if connection is not None:
+            if default_timer() - released_at < self.ping_after or self.is_alive(connection):
+                self.stats['reused'] += 1
+                return connection
+            # the slot of the dead connection is kept for the new one
+            self.close_quietly(connection)
+
+        try:
+            connection = self.connect()
+        except:
+            self.forget()
+            raise
+        self.stats['created'] += 1
+        return connection
+
+    def is_alive(self, connection):
+        """ health check of an idle connection """
+
+        try:
+            connection.ping()
+            return True
+        except MySQLdb.Error:
+            return False
+
+    def release(self, connection):
+        """ give a connection back, a connection which cannot be rolled back is closed """
+
+        try:
+            connection.rollback()
+        except MySQLdb.Error:
+            self.discard(connection)
+            return
+
+        with self.condition:
+            self.idle.append((connection, default_timer()))
+            self.condition.notify()
+
+    def discard(self, connection):
+        """ close a broken connection, a new one may take its place """
+
+        self.close_quietly(connection)
+        self.forget()
+
+    def close_quietly(self, connection):
+        """ close a connection, ignoring the errors of a dead one """
+
+        self.stats['broken'] += 1
+        try:
+            connection.close()
+        except MySQLdb.Error:
+            pass
+
+    def forget(self):
+        """ free the slot of a closed connection """
+
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def get_stats(self):
+        """ counters of the pool, with the current number of open and idle connections """
+
+        with self.condition:
+            stats = dict(self.stats, size=self.size, idle=len(self.idle))
+        return stats
+
+# the pool shared by DatabaseUtil, ProxiesUtil and the settings classes
+pool = ConnectionPool()
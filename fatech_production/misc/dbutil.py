@@ -8,77 +8,34 @@
 from __future__ import with_statement
 from datetime import datetime
 from datetime import timedelta
-import MySQLdb
-import MySQLdb.cursors
-from array import array
-import random
 
 # Custom imports
 from fatech_production.settings import *
+from fatech_production.storage import get_backend
 
 class DatabaseUtil(object):
-    """ DatabaseUtil class """
+    """ DatabaseUtil class, the queries are run by the storage backend of STORAGE_BACKEND """
 
     def __init__(self, site=None, spider=None):
         # name of the website
         self.site = site
         # name of the spider
         self.spider = spider
+        self.backend = get_backend()
 
     def get_mysql_connection(self):
-        """ get MySQL connection.
-            return: A MySQL connection object
+        """ get a connection of the storage backend.
+            return: A connection object, closing it gives it back to the pool
         """
 
-        connection = MySQLdb.connect(
-            host=DATABASE_HOST,
-            port=DATABASE_PORT,
-            db=DATABASE_NAME,
-            user=DATABASE_USER,
-            passwd=DATABASE_PASSWORD,
-            cursorclass=MySQLdb.cursors.DictCursor,
-            charset='utf8',
-            use_unicode=True
-        )
-        return connection
+        return self.backend.connect()
 
     def initialize_settings(self):
-        """ initialize all default master_settings for a new website if needed """
-
-        # Get a mysql connnection and a cursor to make queries 
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
-
-        # Concatenating sql string, join is faster than "+"
-        sql = "".join(("select id from master_settings use index(idx_site) where site = %s;"))
-        parameters = (self.site)
-        # execution
-        cursor.execute(sql, parameters)
-        result = cursor.fetchone()
-
-        if result is None:
-            # the website is new, creating new tables for the website, 
-            # including a new in master_settings table and three new tables of _cars, _urls, and _history. 
-
-            # insert a new row for the website of the master_settings
-            sql = "".join(("insert into master_settings(site) values(%s);"))
-            parameters = (self.site)
-            cursor.execute(sql, parameters)
-            
-            # create three new tables: _cars, _urls, _history 
-            sql = "".join(("create table ", self.site, "_cars like template_cars;"))
-            cursor.execute(sql)
-            sql = "".join(("create table ", self.site, "_history like template_cars;"))
-            cursor.execute(sql)
-            sql = "".join(("create table ", self.site, "_urls like template_urls;"))
-            cursor.execute(sql)
-
-            # For making transactions affected
-            cursor.execute("commit;")
-
-        # Close connection for releasing resources                
-        cursor.close()
-        connection.close()  
+        """ initialize all default master_settings for a new website if needed,
+            including a new row in master_settings table and three new tables of _cars, _urls, and _history
+        """
+
+        self.backend.initialize_settings(self.site)
 
     def write_settings(self, field, value):
         """ Update a new value for the field in the master_settings tables.
@@ -87,18 +44,19 @@ class DatabaseUtil(object):
                 value: a new value
         """
 
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
+        self.backend.write_settings(self.site, field, value)
+
+    def save_settings(self, changes, expected):
+        """ Update several fields of the master_settings row of the site in one statement,
+            only if the row still holds the expected values.
+            parameters:
+                changes: a dict of field -> new value
+                expected: a dict of field -> value read before, the fields of changes at least
 
-        # concatenating update query
-        sql = "".join(("update master_settings use index(idx_site) set ", field , "=%s where site = %s;"))
-        parameters = (value, self.site)
-        cursor.execute(sql, parameters)
-        
-        cursor.execute("commit;")
+            returns True if the row was updated, False if another process changed it meanwhile
+        """
 
-        cursor.close()
-        connection.close()
+        return self.backend.save_settings(self.site, changes, expected)
 
     def load_settings(self, fields):
         """ Load specific fields in the master_settings table.
@@ -112,138 +70,35 @@ class DatabaseUtil(object):
                 output: {"active": 'F', "cycles": 1}
         """
 
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
-
-        # Concatenating the query string
-        sql = "".join(("select ", fields, " from master_settings use index(idx_site) where site = %s;"))
-        parameters = (self.site)
-        
-        cursor.execute(sql, parameters)
-        result = cursor.fetchone()
-
-        cursor.close()
-        connection.close()
-        
-        return result
-    
-    def get_checking_urls(self, old_days, block_size, offset, status, new_status):
-        
-        """ get a block_size of url_ids of the status(E or H)
-
-            for each selected url_id
-                if inserted_at is older than old_days then
-                    update url_id status to H if status is E, otherwise update status to D 
-                otherwise,
-                    append url_ids into result_set
-
-            return: a arrays of rechecking url_ids
+        return self.backend.load_settings(self.site, fields)
+
+    def get_checking_page(self, old_days, block_size, last_id, status):
+        """ get a page of block_size url_ids of the status (E or H) inserted in the last old_days,
+            the ids after last_id in id order (keyset pagination, no offset to skip)
 
+            return: an array of url_ids, empty after the last page
         """
 
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
-
-        # Convert old_days to datetime
-        old_days = int(old_days)
-        #old_time = datetime.now() - timedelta(days=old_days)
-
-        # initialize result array
-        url_ids = array('i')
-
-        sql = "".join(("select count(*) as quantity from ", self.site, "_urls use index(idx_status, idx_inserted_at) where status = %s and \
-            inserted_at between DATE_SUB(NOW(), INTERVAL %s DAY) and NOW();"))
-        parameters = (status, old_days)
-        cursor.execute(sql, parameters)
-        quantity = cursor.fetchone()['quantity']
-        offset = 0
-        while offset < quantity:
-            # Concatenating query
-            sql = "".join(("select id from ", self.site, "_urls use index(idx_status, idx_inserted_at) where status = %s and \
-                inserted_at between DATE_SUB(NOW(), INTERVAL %s DAY) and NOW() limit %s, %s;"))
-            parameters = (status, old_days, offset, block_size)
-            # Execution
-            cursor.execute(sql, parameters)
-            rows = cursor.fetchall()
-
-            for row in rows:
-                url_ids.insert(-1, row['id'])
-
-            offset += len(rows)
-
-        # for row in rows:
-        #     # if the id is newer than old_days
-        #     if row['inserted_at'] > old_time:
-        #         # add to result array
-        #         url_ids.insert(-1, row['id'])
-        #     else:
-        #         # update the id with new status
-        #         sql = "".join(("update ", self.site, "_urls set status = %s where id = %s limit 1;"))
-        #         parameters = (new_status, int(row['id']))                    
-        #         cursor.execute(sql, parameters)
-    
-        # cursor.execute('commit;')
-        
-        cursor.close()
-        connection.close()
-
-        # Shuffle the result array
-        random.shuffle(url_ids)
-
-        return url_ids
+        return self.backend.get_checking_page(self.site, old_days, block_size, last_id, status)
 
     def get_ids_for_vin(self, block_size):
-        """ get url_ids to get vins """
+        """ get url_ids to get vins, the ids of failed attempts only once their retry_after is passed """
 
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
-
-        sql = "".join(("select id from ", self.site, "_cars use index(idx_vin) where vin is NULL limit %s;"))
-        parameters = (block_size)
-        cursor.execute(sql, parameters)
-        rows = cursor.fetchall()
-        url_ids = array('i')
-        for row in rows:
-            url_ids.insert(-1, row['id']) 
-
-        cursor.close()
-        connection.close()
-
-        return url_ids
+        return self.backend.get_ids_for_vin(self.site, block_size, VIN_MAX_ATTEMPTS)
 
     def get_all_models(self, make):
         """ retrieve all models of the make from the year_make_model table.
             return: a tuple of models
         """
 
-        # result tuple
-        all_models = tuple()
-
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
-
-        ### count the number of models of the make
-        sql = "select count(*) as quantity from year_make_model use index(idx_make) where make = %s;"
-        parameters = (make)
-        cursor.execute(sql, parameters)
-        quantity = cursor.fetchone()['quantity']
-        offset = 0
-        ### Make queries to get all expected models
-        while  offset < quantity:
-            sql = "select model from year_make_model use index(idx_make) where make= %s limit %s, 100;"
-            parameters = (make, offset)
-            cursor.execute(sql, parameters)
-            rows = cursor.fetchall()
-            # concatenating models into the result tuple
-            all_models += tuple(row['model'] for row in rows)
-
-            # update new offset value
-            offset += len(rows)
-
-        cursor.close()
-        connection.close()
-
-        return all_models
+        return self.backend.get_all_models(make)
+
+    def get_year_make_model(self):
+        """ retrieve every (make, model) pair of the year_make_model table in a single query.
+            return: a tuple of (make, model) tuples
+        """
+
+        return self.backend.get_year_make_model()
 
     # def get_standard_makes(self):
     #     all_makes = tuple()
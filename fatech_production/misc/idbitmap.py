@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+#######################################
+### Paged bitmap of url_ids
+#######################################
+
+# Python imports
+import os
+import fcntl
+import struct
+
+# Custom imports
+from fatech_production.settings import *
+
+# ids per page, a page is 8KB and only allocated once one of its ids is added
+PAGE_SHIFT = 16
+PAGE_MASK = (1 << PAGE_SHIFT) - 1
+PAGE_BYTES = 1 << (PAGE_SHIFT - 3)
+
+# file layout: MAGIC, then (page number, PAGE_BYTES bytes) per page
+MAGIC = 'IDBM1'
+PAGE_HEADER = struct.Struct('<I')
+
+# number of bits set of every byte
+POPCOUNT = tuple(bin(byte).count('1') for byte in xrange(256))
+
+class IdBitmap(object):
+    """ A set of non-negative integer ids stored one bit each.
+        ids of a site are dense, so pages of 65536 ids cost 8KB instead of megabytes of a python set.
+    """
+
+    def __init__(self):
+        # page number -> bytearray
+        self.pages = {}
+        self.count = 0
+
+    def add(self, url_id):
+        """ add an id, returns False if it was already in the bitmap """
+
+        url_id = int(url_id)
+        page = self.pages.get(url_id >> PAGE_SHIFT)
+        if page is None:
+            page = self.pages[url_id >> PAGE_SHIFT] = bytearray(PAGE_BYTES)
+        offset = url_id & PAGE_MASK
+        bit = 1 << (offset & 7)
+        if page[offset >> 3] & bit:
+            return False
+        page[offset >> 3] |= bit
+        self.count += 1
+        return True
+
+    def __contains__(self, url_id):
+        url_id = int(url_id)
+        page = self.pages.get(url_id >> PAGE_SHIFT)
+        if page is None:
+            return False
+        offset = url_id & PAGE_MASK
+        return bool(page[offset >> 3] & (1 << (offset & 7)))
+
+    def __len__(self):
+        return self.count
+
+    def merge(self, other):
+        """ add every id of another bitmap """
+
+        for number, other_page in other.pages.iteritems():
+            page = self.pages.get(number)
+            if page is None:
+                self.pages[number] = bytearray(other_page)
+                self.count += sum(POPCOUNT[byte] for byte in other_page)
+                continue
+            for index, byte in enumerate(other_page):
+                if byte:
+                    merged = page[index] | byte
+                    self.count += POPCOUNT[merged] - POPCOUNT[page[index]]
+                    page[index] = merged
+
+    @classmethod
+    def load(cls, path):
+        """ read a bitmap written by save(), a missing file is an empty bitmap """
+
+        bitmap = cls()
+        if not os.path.exists(path):
+            return bitmap
+
+        f = open(path, 'rb')
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not an id bitmap' % path)
+            while True:
+                header = f.read(PAGE_HEADER.size)
+                if not header:
+                    break
+                number = PAGE_HEADER.unpack(header)[0]
+                page = bytearray(f.read(PAGE_BYTES))
+                if len(page) != PAGE_BYTES:
+                    raise ValueError('%s is truncated' % path)
+                bitmap.pages[number] = page
+                bitmap.count += sum(POPCOUNT[byte] for byte in page)
+        finally:
+            f.close()
+        return bitmap
+
+    def save(self, path):
+        """ merge the bitmap into the file of path.
+            processes saving the same path are serialized by a lock on path.lock, so ids saved by
+            another process are kept, the file is replaced atomically
+        """
+
+        lock = open(path + '.lock', 'ab')
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            merged = IdBitmap.load(path)
+            merged.merge(self)
+
+            tmp_path = "%s.%s.tmp" % (path, os.getpid())
+            f = open(tmp_path, 'wb')
+            try:
+                f.write(MAGIC)
+                for number in sorted(merged.pages):
+                    f.write(PAGE_HEADER.pack(number))
+                    f.write(merged.pages[number])
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+            os.rename(tmp_path, path)
+        finally:
+            # closing the file releases the lock
+            lock.close()
+
+def stored_ids_path(site):
+    """ file of the ids stored with status S of a site, None when DUPLICATES_DIR is not set """
+
+    if not DUPLICATES_DIR:
+        return None
+    return os.path.join(DUPLICATES_DIR, "%s_stored.bitmap" % site)
+
+def load_stored_ids(site):
+    """ ids of a site already stored with status S by previous runs """
+
+    path = stored_ids_path(site)
+    if path is None:
+        return IdBitmap()
+    return IdBitmap.load(path)
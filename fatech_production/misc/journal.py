@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+#######################################
+### Crash journal of the item pipeline
+#######################################
+
+# Python imports
+import os
+import glob
+import time
+import fcntl
+import heapq
+import struct
+import zlib
+import cPickle
+
+# segment layout: MAGIC, first sequence number, then records of (length, crc32 of the payload, payload)
+MAGIC = 'JRNL1'
+SEGMENT_HEADER = struct.Struct('<Q')
+RECORD_HEADER = struct.Struct('<II')
+# payload of an ack: 'A', first and last + 1 sequence numbers acknowledged
+ACK = struct.Struct('<QQ')
+ENTRY = 'E'
+ACKED = 'A'
+
+def read_segment(path):
+    """ (first sequence number, list of entries, list of ack ranges) of a segment.
+        a record cut by a crash ends the segment, like the end of the file
+    """
+
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+
+    if not data.startswith(MAGIC):
+        return None, [], []
+    pos = len(MAGIC)
+    first_seq = SEGMENT_HEADER.unpack_from(data, pos)[0]
+    pos += SEGMENT_HEADER.size
+
+    entries = []
+    acks = []
+    while len(data) - pos >= RECORD_HEADER.size:
+        length, crc = RECORD_HEADER.unpack_from(data, pos)
+        payload = data[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) & 0xffffffff != crc:
+            break
+        pos += RECORD_HEADER.size + length
+        if payload[0] == ENTRY:
+            entries.append(payload[1:])
+        else:
+            acks.append(ACK.unpack_from(payload, 1))
+    return first_seq, entries, acks
+
+class Journal(object):
+    """ An append-only log of the items handed to the database, written before they are sent.
+
+        Every entry gets a sequence number, ack() records a range of entries committed by the database.
+        Entries are written to the OS at once, so a crash of the crawler loses none of them, and fsync()ed
+        by sync() before their group is committed. Segments are rotated once they hold max_bytes, and
+        deleted oldest first once all their entries are acknowledged. At each rotation, the few entries
+        an old segment still holds (a failed group) are journaled again in the current one, so they do not
+        keep the old segments: ack() takes the sequence numbers they were given first.
+        The unacknowledged entries of a journal left by a crash are given back by recover_journals().
+    """
+
+    def __init__(self, directory, name, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # prefix of the segment files, the lock file keeps other processes from recovering a live journal
+        self.prefix = os.path.join(directory, "%s.%s-%s" % (name, time.strftime("%Y%m%d%H%M%S"), os.getpid()))
+        self.lock = open(self.prefix + '.lock', 'wb')
+        fcntl.flock(self.lock.fileno(), fcntl.LOCK_EX)
+        self.next_seq = 0
+        # every entry before it is acknowledged
+        self.watermark = 0
+        # heap of the ack ranges above the watermark, merged as soon as they touch it
+        self.acked = []
+        # first sequence number of an entry journaled again -> its current one, and back
+        self.moved = {}
+        self.origin = {}
+        # (path, first sequence number) of the segments, the last one is written
+        self.segments = []
+        self.segment_number = 0
+        self.fd = None
+        self.size = 0
+        self.synced = True
+        self.open_segment()
+
+    def open_segment(self):
+        path = "%s.%06d.journal" % (self.prefix, self.segment_number)
+        self.segment_number += 1
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0644)
+        header = MAGIC + SEGMENT_HEADER.pack(self.next_seq)
+        os.write(self.fd, header)
+        self.size = len(header)
+        self.segments.append((path, self.next_seq))
+
+    def write(self, payload):
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + payload
+        os.write(self.fd, record)
+        self.size += len(record)
+        self.synced = False
+
+    def append(self, entry):
+        """ journal an entry, returns its sequence number """
+
+        self.write(ENTRY + cPickle.dumps(entry, cPickle.HIGHEST_PROTOCOL))
+        seq = self.next_seq
+        self.next_seq += 1
+        if self.size >= self.max_bytes:
+            self.rotate()
+        return seq
+
+    def rotate(self):
+        """ close the current segment and start the next one """
+
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.open_segment()
+        self.synced = True
+        self.retire()
+
+    def unacked(self, first, last):
+        """ sequence numbers of [first, last) not acknowledged """
+
+        seqs = []
+        seq = max(first, self.watermark)
+        for start, end in sorted(r for r in self.acked if r[0] < last and r[1] > seq):
+            seqs.extend(xrange(seq, start))
+            seq = max(seq, end)
+        seqs.extend(xrange(seq, last))
+        return seqs
+
+    def retire(self):
+        """ journal again in the current segment the entries left in the oldest ones, when they are a few """
+
+        while len(self.segments) > 1:
+            path, first = self.segments[0]
+            last = self.segments[1][1]
+            seqs = self.unacked(first, last)
+            if len(seqs) * 2 > last - first:
+                # mostly pending, left until its entries are acknowledged
+                break
+            entries = read_segment(path)[1]
+            for seq in seqs:
+                self.write(ENTRY + entries[seq - first])
+                origin = self.origin.pop(seq, seq)
+                self.moved[origin] = self.next_seq
+                self.origin[self.next_seq] = origin
+                self.next_seq += 1
+            # the entries are on disk before their old segment is deleted
+            self.sync()
+            self.record(seqs)
+            if self.segments[0][0] == path:
+                break
+
+    def sync(self):
+        """ fsync the entries written since the last sync """
+
+        if not self.synced:
+            os.fsync(self.fd)
+            self.synced = True
+
+    def ack(self, seqs):
+        """ acknowledge entries by sequence number, written as ranges. the segments fully acknowledged are deleted """
+
+        current = []
+        for seq in seqs:
+            if seq in self.moved:
+                seq = self.moved.pop(seq)
+                del self.origin[seq]
+            current.append(seq)
+        self.record(current)
+
+    def record(self, seqs):
+        ranges = []
+        for seq in sorted(seqs):
+            if ranges and ranges[-1][1] == seq:
+                ranges[-1][1] = seq + 1
+            else:
+                ranges.append([seq, seq + 1])
+        for first, last in ranges:
+            self.write(ACKED + ACK.pack(first, last))
+            heapq.heappush(self.acked, (first, last))
+        while self.acked and self.acked[0][0] <= self.watermark:
+            self.watermark = max(self.watermark, heapq.heappop(self.acked)[1])
+
+        # a segment is done once the next one starts at or below the watermark
+        while len(self.segments) > 1 and self.segments[1][1] <= self.watermark:
+            os.remove(self.segments.pop(0)[0])
+
+    def pending(self):
+        """ number of entries not acknowledged """
+
+        return self.next_seq - self.watermark - sum(last - first for first, last in self.acked)
+
+    def close(self):
+        """ close the journal, it is deleted when every entry is acknowledged, otherwise kept for replay """
+
+        if self.fd is None:
+            return
+        self.sync()
+        os.close(self.fd)
+        self.fd = None
+        if self.pending() == 0:
+            for path, first_seq in self.segments:
+                os.remove(path)
+            self.segments = []
+            os.remove(self.prefix + '.lock')
+        # unlocked, the next run recovers it
+        self.lock.close()
+
+def recover_journals(journal, replay):
+    """ hand replay() the unacknowledged entries of the journals left by processes which are gone, oldest first,
+        returns their number. replay() journals them again into journal, which is synced before the old files are deleted
+    """
+
+    replayed = 0
+    for lock_path in sorted(glob.glob(os.path.join(journal.directory, '*.lock')), key=os.path.getmtime):
+        if lock_path == journal.prefix + '.lock':
+            continue
+        lock = open(lock_path, 'ab')
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            # a live process
+            lock.close()
+            continue
+        if os.fstat(lock.fileno()).st_nlink == 0:
+            # recovered meanwhile by another process
+            lock.close()
+            continue
+
+        prefix = lock_path[:-len('.lock')]
+        paths = sorted(glob.glob(prefix + '.*.journal'))
+        entries = {}
+        acks = []
+        for path in paths:
+            first_seq, segment_entries, segment_acks = read_segment(path)
+            if first_seq is None:
+                continue
+            for offset, entry in enumerate(segment_entries):
+                entries[first_seq + offset] = entry
+            acks.extend(segment_acks)
+        for first, last in acks:
+            for seq in xrange(first, last):
+                entries.pop(seq, None)
+
+        for seq in sorted(entries):
+            replay(cPickle.loads(entries[seq]))
+        replayed += len(entries)
+        journal.sync()
+
+        for path in paths:
+            os.remove(path)
+        os.remove(lock_path)
+        lock.close()
+
+    return replayed
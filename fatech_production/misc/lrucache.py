@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+#######################################
+### Bounded LRU cache
+#######################################
+
+# Python imports
+from collections import OrderedDict
+
+class LRUCache(object):
+    """ A dict-like cache which evicts the least recently used entry when it holds more than maxsize entries """
+
+    def __init__(self, maxsize):
+        # the maximum number of entries
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        # free tag of the data the entries were computed from, owners clear the cache when it changes
+        self.generation = None
+        # counters of lookups
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """ return the cached value of the key and mark it as the most recently used one """
+
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ cache a value, evicting the least recently used entry if the cache is full """
+
+        if key in self.entries:
+            del self.entries[key]
+        elif len(self.entries) >= self.maxsize:
+            self.entries.popitem(last=False)
+        self.entries[key] = value
+
+    def clear(self):
+        """ drop all entries, counters are kept """
+
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
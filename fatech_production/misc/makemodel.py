@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+#######################################
+### Make/Model variations cache
+#######################################
+
+# Python imports
+from collections import OrderedDict
+import threading
+
+# Custom imports
+from fatech_production.misc.querystats import query_stats
+
+def normalize(name):
+    """ key of a make or model, compared case-insensitively like the collation of the tables """
+
+    return name.strip().lower()
+
+class MakeModelCache(object):
+    """ A write-through cache of master_makes_variations, master_makes_hold,
+        master_models_variations and master_models_hold, loaded once per run.
+
+        Cars only look the cache up, the unseen makes and models are collected into a HoldBatch
+        and inserted into the _hold tables with one statement per table.
+        The holds claimed by the running transaction are kept until commit() or dropped by rollback().
+    """
+
+    def __init__(self):
+        # normalized make -> id
+        self.make_variations = {}
+        self.make_holds = {}
+        # normalized models
+        self.model_variations = set()
+        self.model_holds = set()
+        # normalized makes and models held by the running transaction
+        self.claimed_makes = set()
+        self.claimed_models = set()
+        # guards the holds, batches of concurrent interactions claim their keys under it
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load_from_cursor(self, cursor):
+        """ load the four tables, runs in an interaction of the pipeline """
+
+        make_variations = {}
+        query_stats.execute(cursor, 'makemodel.load', "select id, make from master_makes_variations;")
+        for row in cursor.fetchall():
+            make_variations.setdefault(normalize(row['make']), row['id'])
+
+        make_holds = {}
+        query_stats.execute(cursor, 'makemodel.load', "select id, make from master_makes_hold;")
+        for row in cursor.fetchall():
+            make_holds.setdefault(normalize(row['make']), row['id'])
+
+        query_stats.execute(cursor, 'makemodel.load', "select model from master_models_variations;")
+        model_variations = set(normalize(row['model']) for row in cursor.fetchall())
+
+        query_stats.execute(cursor, 'makemodel.load', "select model from master_models_hold;")
+        model_holds = set(normalize(row['model']) for row in cursor.fetchall())
+
+        with self.lock:
+            self.make_variations = make_variations
+            self.make_holds.update(make_holds)
+            self.model_variations = model_variations
+            self.model_holds.update(model_holds)
+            self.loaded = True
+        return len(make_variations) + len(make_holds) + len(model_variations) + len(model_holds)
+
+    def batch(self):
+        """ start collecting the unseen makes and models of a flush """
+
+        return HoldBatch(self)
+
+    def commit(self):
+        """ the transaction of the claimed holds is committed, they stay held """
+
+        with self.lock:
+            self.claimed_makes = set()
+            self.claimed_models = set()
+
+    def rollback(self):
+        """ the transaction of the claimed holds is rolled back, they are unseen again """
+
+        with self.lock:
+            for key in self.claimed_makes:
+                self.make_holds.pop(key, None)
+            for key in self.claimed_models:
+                self.model_holds.discard(key)
+            self.claimed_makes = set()
+            self.claimed_models = set()
+
+class HoldBatch(object):
+    """ the unseen makes and models of one flush, written by flush() in the interaction of the flush """
+
+    def __init__(self, cache):
+        self.cache = cache
+        # normalized make -> make
+        self.makes = OrderedDict()
+        # normalized model -> (model, make id or normalized make of self.makes)
+        self.models = OrderedDict()
+
+    def make(self, make):
+        """ look up a make, returns (status, make reference) where status is one of:
+                FOUND: the make is a known variation, the reference is its id
+                UNFOUND: the make is new and will be held, the reference resolves after flush()
+                HELD: the make is already held, the reference is None
+        """
+
+        cache = self.cache
+        key = normalize(make)
+        make_id = cache.make_variations.get(key)
+        if make_id is not None:
+            return 'FOUND', make_id
+
+        with cache.lock:
+            if key in cache.make_holds:
+                return 'HELD', None
+            # claimed until the batch is flushed, a second car of the make finds it held
+            cache.make_holds[key] = None
+            cache.claimed_makes.add(key)
+        self.makes[key] = make
+        return 'UNFOUND', key
+
+    def model(self, model, make_ref):
+        """ look up a model of a make reference given by make(), returns FOUND, UNFOUND or HELD """
+
+        cache = self.cache
+        key = normalize(model)
+        if key in cache.model_variations:
+            return 'FOUND'
+
+        with cache.lock:
+            if key in cache.model_holds:
+                return 'HELD'
+            cache.model_holds.add(key)
+            cache.claimed_models.add(key)
+        self.models[key] = (model, make_ref)
+        return 'UNFOUND'
+
+    def flush(self, cursor):
+        """ insert the unseen makes, read their ids back, then insert the unseen models """
+
+        cache = self.cache
+        if self.makes:
+            names = self.makes.values()
+            sql = "".join(("insert into master_makes_hold(make) values ", ", ".join(["(%s)"] * len(names)), ";"))
+            query_stats.execute(cursor, 'holds.make_insert', sql, names)
+
+            sql = "".join(("select id, make from master_makes_hold use index (idx_make) where make in (",
+                           ", ".join(["%s"] * len(names)), ");"))
+            query_stats.execute(cursor, 'holds.make_select', sql, names)
+            with cache.lock:
+                for row in cursor.fetchall():
+                    key = normalize(row['make'])
+                    if cache.make_holds.get(key) is None:
+                        cache.make_holds[key] = row['id']
+
+        if self.models:
+            parameters = []
+            for model, make_ref in self.models.itervalues():
+                if make_ref in self.makes:
+                    make_ref = cache.make_holds.get(make_ref)
+                parameters.extend((model, str(make_ref)))
+            sql = "".join(("insert into master_models_hold(model, fk_make) values ",
+                           ", ".join(["(%s, %s)"] * len(self.models)), ";"))
+            query_stats.execute(cursor, 'holds.model_insert', sql, parameters)
+
+        self.makes.clear()
+        self.models.clear()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+#######################################
+### Per-query latency counters
+#######################################
+
+# Python imports
+from __future__ import with_statement
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+from twisted.internet import defer
+
+# Custom imports
+from fatech_production.settings import *
+
+# upper bounds of the latency histogram in milliseconds, slower queries fall in the last bucket
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+def bucket_name(index):
+    """ name of a histogram bucket in the stats, le_<bound>ms or gt_<last bound>ms """
+
+    if index < len(BUCKETS_MS):
+        return 'le_%sms' % BUCKETS_MS[index]
+    return 'gt_%sms' % BUCKETS_MS[-1]
+
+class QueryPath(object):
+    """ count, total and histogram of the latencies of one labeled query """
+
+    __slots__ = ('count', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def record(self, seconds):
+        milliseconds = seconds * 1000.0
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+        for index, bound in enumerate(BUCKETS_MS):
+            if milliseconds <= bound:
+                break
+        else:
+            index = len(BUCKETS_MS)
+        self.histogram[index] += 1
+
+class QueryStats(object):
+    """ Latencies of the database queries by label, like urls.upsert or settings.load.
+        Recorded from the adbapi threads of the pipelines and from the synchronous connections of DatabaseUtil,
+        published into the Scrapy stats when a spider is closed.
+    """
+
+    def __init__(self):
+        # label -> QueryPath
+        self.paths = {}
+        self.lock = threading.Lock()
+
+    def record(self, label, seconds):
+        with self.lock:
+            path = self.paths.get(label)
+            if path is None:
+                path = self.paths[label] = QueryPath()
+            path.record(seconds)
+
+    @contextmanager
+    def timed(self, label):
+        """ time a block under a label, for a query whose rows are fetched in several calls """
+
+        started = default_timer()
+        try:
+            yield
+        finally:
+            self.record(label, default_timer() - started)
+
+    def execute(self, cursor, label, sql, parameters=None):
+        """ execute a statement on a cursor and record its latency under the label.
+            a statement of the non-blocking client returns a Deferred, it is timed until its answer
+        """
+
+        started = default_timer()
+        try:
+            if parameters is None:
+                result = cursor.execute(sql)
+            else:
+                result = cursor.execute(sql, parameters)
+        except:
+            self.record(label, default_timer() - started)
+            raise
+
+        if isinstance(result, defer.Deferred):
+            result.addBoth(self.answered, label, started)
+        else:
+            self.record(label, default_timer() - started)
+        return result
+
+    def answered(self, result, label, started):
+        self.record(label, default_timer() - started)
+        return result
+
+    def top(self, count):
+        """ the count labels of the highest total time, as (label, QueryPath) """
+
+        with self.lock:
+            paths = self.paths.items()
+        return sorted(paths, key=lambda (label, path): path.total, reverse=True)[:count]
+
+    def publish(self, stats, spider):
+        """ set db/<label>/* values of the Scrapy stats """
+
+        with self.lock:
+            paths = [(label, path.count, path.total, path.max, list(path.histogram)) for label, path in self.paths.iteritems()]
+
+        for label, count, total, maximum, histogram in paths:
+            prefix = 'db/%s/' % label
+            stats.set_value(prefix + 'count', count, spider=spider)
+            stats.set_value(prefix + 'total_ms', round(total, 1), spider=spider)
+            stats.set_value(prefix + 'avg_ms', round(total / count, 3), spider=spider)
+            stats.set_value(prefix + 'max_ms', round(maximum, 1), spider=spider)
+            for index, hits in enumerate(histogram):
+                if hits:
+                    stats.set_value(prefix + bucket_name(index), hits, spider=spider)
+
+# the counters of the process, shared by the storage backends, the pipelines and the caches
+query_stats = QueryStats()
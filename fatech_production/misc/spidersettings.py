@@ -7,28 +7,113 @@
 # Python import
 from __future__ import with_statement
 import os
+import random
+
+# Scrapy imports
+from scrapy import log
 
 # Custom imports
 from fatech_production.settings import *
 from dbutil import DatabaseUtil
 
+class SettingsSnapshot(object):
+    """ The master_settings row of a site, read once.
+        Writes only mark fields dirty, save() writes them back in a single UPDATE which only applies
+        if the row still holds the values read before (optimistic versioning).
+    """
+
+    def __init__(self, site, spider, row):
+        self.site = site
+        self.spider = spider
+        # values read from the database
+        self.original = dict(row)
+        # current values, dirty ones included
+        self.values = dict(row)
+        self.dirty = set()
+
+    def __getitem__(self, field):
+        return self.values[field]
+
+    def set(self, field, value):
+        self.values[field] = value
+        self.dirty.add(field)
+
+    def save(self):
+        """ write the dirty fields back.
+            returns False on a conflict: the fields changed by another process keep their new value,
+            the other dirty fields are written over the reloaded row
+        """
+
+        changes = dict((field, self.values[field]) for field in self.dirty if self.values[field] != self.original[field])
+        if not changes:
+            self.dirty.clear()
+            return True
+
+        util = DatabaseUtil(self.site, self.spider)
+        if util.save_settings(changes, self.original):
+            self.original.update(changes)
+            self.dirty.clear()
+            return True
+
+        # another process wrote the row since it was read
+        current = util.load_settings(fields="*")
+        for field, value in changes.items():
+            if current[field] != self.original[field]:
+                log.msg('[SETTINGS CONFLICT] %s.%s - keeping %s, dropping %s' % (self.site, field, current[field], value),
+                        level=log.WARNING)
+                del changes[field]
+
+        self.original = dict(current)
+        self.values = dict(current)
+        self.values.update(changes)
+        self.dirty = set(changes)
+        if changes and util.save_settings(changes, self.original):
+            self.original.update(changes)
+            self.dirty.clear()
+        return False
+
 class SpiderSettings(object):
-    """ Base class for Spider Settings """
-    
+    """ Base class for Spider Settings.
+        The settings of a run are read once from master_settings, write_* methods only change
+        the snapshot until save() is called.
+    """
+
     def __init__(self, site, spider):
         # name of the website
         self.site = site
         # name of the spider
         self.spider = spider
-        
+        # the master_settings row of the site, read on first use
+        self.snapshot = None
+
     def initialize_settings(self):
         """ initial settings for a new site """
-        
+
         DatabaseUtil(self.site, self.spider).initialize_settings()
 
+    def get_snapshot(self):
+        """ read the whole master_settings row of the site once """
+
+        if self.snapshot is None:
+            row = DatabaseUtil(self.site, self.spider).load_settings(fields="*")
+            self.snapshot = SettingsSnapshot(self.site, self.spider, row)
+        return self.snapshot
+
     def load_settings(self):
         pass
 
+    def write_settings(self, field, value):
+        """ change a field of the snapshot, it is written by save() """
+
+        self.get_snapshot().set(field, value)
+
+    def save(self):
+        """ write the changed fields back in a single update """
+
+        if self.snapshot is not None:
+            return self.snapshot.save()
+        return True
+
     def write_active(self, setting):
         """ write status of activating """
 
@@ -39,8 +124,7 @@ class SpiderSettings(object):
             # spder is recon or main
             active_field = 'active'
 
-        # Call write_settings method to make transaction 
-        DatabaseUtil(self.site, self.spider).write_settings(field=active_field, value=setting)
+        self.write_settings(active_field, setting)
 
 class ReconSpiderSettings(SpiderSettings):
     """ Settings for Recon Spider, inherited from default SpiderSettings """
@@ -54,20 +138,20 @@ class ReconSpiderSettings(SpiderSettings):
 
         """
 
-        settings = DatabaseUtil(self.site, self.spider).load_settings(fields="active, block_size, cycles, main_startid, recon_startid")
+        settings = self.get_snapshot()
         return {'active': settings['active'], 'block_size': int(settings['block_size']), 'cycles': int(settings['cycles']), \
             'main_startid': int(settings['main_startid']), 'recon_startid': int(settings['recon_startid'])}
-        
+
     def write_cycles(self, setting):
         """ Write the cycles setting for this run of the spider """
 
-        DatabaseUtil(self.site, self.spider).write_settings(field="cycles", value=setting)
-            
+        self.write_settings("cycles", setting)
+
     def write_startid(self, setting):
         """ Write the new startid setting for this run of the spider """
 
-        DatabaseUtil(self.site, self.spider).write_settings(field="recon_startid", value=setting)
-    
+        self.write_settings("recon_startid", setting)
+
 class MainSpiderSettings(SpiderSettings):
     """ Settings for Main Spider, inherited from default SpiderSettings """
 
@@ -79,93 +163,99 @@ class MainSpiderSettings(SpiderSettings):
         Grab defaults if none are present, returns a dict of settings
         """
 
-        settings = DatabaseUtil(self.site, self.spider).load_settings(fields="active, block_size, main_startid, recon_startid")
+        settings = self.get_snapshot()
         return {'active': settings['active'], 'block_size': int(settings['block_size']), 'main_startid': int(settings['main_startid']),\
             'recon_startid': int(settings['recon_startid'])}
 
     def write_startid(self, setting):
         """ Write the new startid setting for this run of the spider """
 
-        DatabaseUtil(self.site, self.spider).write_settings(field="main_startid", value=setting)
-    
+        self.write_settings("main_startid", setting)
+
+class CheckingUrls(object):
+    """ The url_ids of a status streamed page by page after a cursor, the last id of the previous run.
+        Only one page is held in memory, each one is shuffled before its ids are requested.
+        The cursor moves once every id of a page is taken, and goes back to 0 when all ids are taken.
+    """
+
+    def __init__(self, settings, field, old_days, block_size, status):
+        # the spider settings holding the cursor in field
+        self.settings = settings
+        self.field = field
+        self.old_days = old_days
+        self.block_size = block_size
+        self.status = status
+        # last id of the fully taken pages
+        self.cursor = int(settings.get_snapshot()[field])
+        self.page = None
+        self.exhausted = False
+
+    def next_page(self):
+        """ fetch the page after the cursor """
+
+        return DatabaseUtil(self.settings.site, self.settings.spider).get_checking_page(
+            self.old_days, self.block_size, self.cursor, self.status)
+
+    def is_empty(self):
+        """ True if no id is left after the cursor, the first page is kept for iterating """
+
+        if self.page is None:
+            self.page = self.next_page()
+        if len(self.page) == 0:
+            self.exhausted = True
+        return self.exhausted
+
+    def __iter__(self):
+        page = self.page if self.page is not None else self.next_page()
+        self.page = None
+        while len(page) > 0:
+            last_id = page[-1]
+            random.shuffle(page)
+            for url_id in page:
+                yield url_id
+            self.cursor = last_id
+            page = self.next_page()
+        self.exhausted = True
+
+    def write_cursor(self):
+        """ write the cursor for the next run, 0 to start over once every id was taken """
+
+        self.settings.write_settings(self.field, 0 if self.exhausted else self.cursor)
+
 class RecheckSpiderSettings(SpiderSettings):
     """ Settings for Recheck Spider, inherited from default SpiderSettings """
 
     def __init__(self, site, spider='recheck'):
         super(RecheckSpiderSettings, self).__init__(site, spider)
-     
+
     def load_settings(self):
         """ Load settings (recheck_active, recheck_olddays, block_size) from last spider run. \
         Grab defaults if none are present, return a dict of settings
         """
 
-        settings = DatabaseUtil(self.site, self.spider).load_settings(fields="recheck_active, recheck_olddays, block_size")
+        settings = self.get_snapshot()
         return {'active': settings['recheck_active'], 'block_size': settings['block_size'], 'url_ids': self.get_recheck_urls(settings['recheck_olddays'], settings['block_size'])}
 
     def get_recheck_urls(self, old_days, block_size):
-        """ Get a block_size of rechecking URLs which adapt old_days constrain, returns an array of url_ids """
-
-        def get_recheck_offset():
-            """ Get the recheck offset from the last spider run """
+        """ Get the rechecking URLs which adapt old_days constrain after recheck_offset, the last rechecked id """
 
-            settings = DatabaseUtil(self.site, self.spider).load_settings(fields="recheck_offset")
-            return int(settings['recheck_offset'])
-
-        def write_recheck_offset(setting):
-            """ Write the recheck offset for this run of the spider """
-
-            DatabaseUtil(self.site, self.spider).write_settings(field="recheck_offset", value=setting)
-
-        # call inner method to get recheck_offset
-        recheck_offset = get_recheck_offset()
-        url_ids = DatabaseUtil(self.site, self.spider).get_checking_urls(old_days, block_size, recheck_offset, 'E', 'H')
-        # if any accepted url_id
-        if len(url_ids) > 0:
-            # call inner method update a new recheck offset
-            write_recheck_offset(recheck_offset + len(url_ids))
-        else:
-            # call inner method to reset recheck offset
-            write_recheck_offset(0)
-
-        return url_ids
+        return CheckingUrls(self, 'recheck_offset', old_days, block_size, 'E')
 
 class FinalcheckSpiderSettings(SpiderSettings):
     """ Settings for Finalcheck Spider, inherited from default SpiderSettings """
 
     def __init__(self, site, spider='finalcheck'):
         super(FinalcheckSpiderSettings, self).__init__(site, spider)
-     
+
     def load_settings(self):
         """ Load settings (recheck_active, finalcheck_olddays, block_size) from last finalcheck spider run. \
         Grab defaults if none are present, returns a dict of settings 
         """
 
-        settings = DatabaseUtil(self.site, self.spider).load_settings(fields="recheck_active, finalcheck_olddays, block_size")
+        settings = self.get_snapshot()
         return {'active': settings['recheck_active'], 'url_ids': self.get_finalcheck_urls(settings['finalcheck_olddays'], settings['block_size'])}
 
     def get_finalcheck_urls(self, old_days, block_size):
-        """ Get a block_size of rechecking URLs which adapt old_days constrain, returns an array of url_ids """
-
-        def get_finalcheck_offset():
-            """ Get the finalcheck offset from the last spider run """
-
-            settings = DatabaseUtil(self.site, self.spider).load_settings(fields="finalcheck_offset")
-            return int(settings['finalcheck_offset'])
-
-        def write_finalcheck_offset(setting):
-            """ Write the finalcheck offset for this run of the spider """
-
-            DatabaseUtil(self.site, self.spider).write_settings(field="finalcheck_offset", value=setting)
-
-        # call inner method to get finalcheck_offset
-        finalcheck_offset = get_finalcheck_offset()
-        url_ids = DatabaseUtil(self.site, self.spider).get_checking_urls(old_days, block_size, finalcheck_offset, 'H', 'D')
-        # if any accepted url_id
-        if len(url_ids) > 0:
-            # call inner method update a new finalcheck offset
-            write_finalcheck_offset(finalcheck_offset + len(url_ids))
-        else:
-            # call inner method to reset finalcheck offset
-            write_finalcheck_offset(0)
+        """ Get the finalchecking URLs which adapt old_days constrain after finalcheck_offset, the last finalchecked id """
 
-        return url_ids
+        return CheckingUrls(self, 'finalcheck_offset', old_days, block_size, 'H')
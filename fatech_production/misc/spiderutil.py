@@ -8,14 +8,55 @@
 # Python imports
 import re
 from dbutil import DatabaseUtil
-
-def generate_ids(site):
-    """ Generate ids for recon spider """
+from catalog import catalog
+from lrucache import LRUCache
+from fatech_production.settings import YMMT_CACHE_SIZE
+
+# a hard-coded list of makes to match make in description
+STANDARD_MAKES = (
+    'Acura', 'Alfa Romeo', 'AMC', 'Aston Martin',
+    'Audi', 'Avanti', 'Bentley', 'BMW', 'Buick',
+    'Cadillac', 'Chevrolet', 'Chrysler', 'Daewoo',
+    'Daihatsu', 'Datsun', 'DeLorean', 'Dodge', 'Eagle',
+    'Ferrari', 'Fiat', 'Fisker', 'Ford', 'Freightliner',
+    'Geo', 'GMC', 'Honda', 'Hummer', 'Hyundai',
+    'Infiniti', 'Isuzu', 'Jaguar', 'Jeep', 'Kia',
+    'Lamborghini', 'Lancia', 'Land Rover', 'Lexus',
+    'Lincoln', 'Lotus', 'Maserati', 'Maybach', 'Mazda',
+    'McLaren', 'Mercedes-Benz', 'Mercury', 'Merkur',
+    'Mini', 'Mitsubishi', 'Nissan', 'Oldsmobile',
+    'Peugeot', 'Plymouth', 'Pontiac', 'Porsche',
+    'Renault', 'Rolls-Royce', 'Saab', 'Saturn', 'Scion',
+    'Smart', 'SRT', 'Sterling', 'Subaru', 'Suzuki',
+    'Tesla', 'Toyota', 'Triumph', 'Volkswagen', 'Volvo', 
+    'Yugo', 'Ram',
+)
+
+# lowercased make -> make as written in STANDARD_MAKES
+MAKES_LOOKUP = dict((make.lower(), make) for make in STANDARD_MAKES)
+
+# one alternation over all makes, compiled once at import and shared by all spiders.
+# Longer makes are tried first so the leftmost match is also the longest one at its position,
+# and a make must not be glued to letters or digits ("Mini" does not match "Minivan")
+MAKE_PATTERN = re.compile(
+    r'(?<!\w)(' + '|'.join(re.escape(make) for make in sorted(STANDARD_MAKES, key=len, reverse=True)) + r')(?!\w)',
+    re.IGNORECASE | re.UNICODE)
+
+# the first number of the description is the year
+YEAR_PATTERN = re.compile(r'(\d+)')
+
+# results of extract_YMMT keyed by the normalized description, dealers repost the same titles over and over
+ymmt_cache = LRUCache(YMMT_CACHE_SIZE)
+
+def generate_ids(site_settings):
+    """ Generate ids for recon spider.
+        site_settings: the ReconSpiderSettings of the run, a new overs is written to its snapshot and saved with it
+    """
 
     from array import array
     
     # Load settings of recon_startid, block_size, cycles, cycles_limit, overs
-    settings = DatabaseUtil(site).load_settings(fields="recon_startid, block_size, cycles, cycles_limit, overs")
+    settings = site_settings.get_snapshot()
     # pass settings to variables
     old_startid = int(settings['recon_startid']) + 1
     cycles = int(settings['cycles'])
@@ -65,7 +106,7 @@ def generate_ids(site):
     if overs != int(settings['overs']):
         if overs > 10:
             overs = 0
-        DatabaseUtil(site).write_settings(field="overs", value=overs)
+        site_settings.write_settings("overs", overs)
 
 
     return recon_list
@@ -125,75 +166,59 @@ def generate_ngrams(data):
     return ngrams
 
 def extract_YMMT(data):
+    """
+        get year, make, model and trim from the description, results are memoized in ymmt_cache
+        returns a dict of them or -1 if not found any make
+    """
+
+    # cached results depend on the catalog, drop them when it has been reloaded
+    if ymmt_cache.generation != catalog.loaded_at:
+        ymmt_cache.clear()
+        ymmt_cache.generation = catalog.loaded_at
+
+    key = " ".join(data.split())
+    result = ymmt_cache.get(key)
+    if result is None:
+        result = parse_YMMT(key)
+        ymmt_cache.put(key, result)
+
+    # callers may modify the dict, never hand out the cached one
+    return dict(result) if result != -1 else -1
+
+def parse_YMMT(data):
     """
         parse description to get year, make, model and trim from the description
         returns a dict of them or -1 if not found any make
     """
 
-    # a hard-coded list of makes to match make in description
-    standard_makes = (
-        'Acura', 'Alfa Romeo', 'AMC', 'Aston Martin',
-        'Audi', 'Avanti', 'Bentley', 'BMW', 'Buick',
-        'Cadillac', 'Chevrolet', 'Chrysler', 'Daewoo',
-        'Daihatsu', 'Datsun', 'DeLorean', 'Dodge', 'Eagle',
-        'Ferrari', 'Fiat', 'Fisker', 'Ford', 'Freightliner',
-        'Geo', 'GMC', 'Honda', 'Hummer', 'Hyundai',
-        'Infiniti', 'Isuzu', 'Jaguar', 'Jeep', 'Kia',
-        'Lamborghini', 'Lancia', 'Land Rover', 'Lexus',
-        'Lincoln', 'Lotus', 'Maserati', 'Maybach', 'Mazda',
-        'McLaren', 'Mercedes-Benz', 'Mercury', 'Merkur',
-        'Mini', 'Mitsubishi', 'Nissan', 'Oldsmobile',
-        'Peugeot', 'Plymouth', 'Pontiac', 'Porsche',
-        'Renault', 'Rolls-Royce', 'Saab', 'Saturn', 'Scion',
-        'Smart', 'SRT', 'Sterling', 'Subaru', 'Suzuki',
-        'Tesla', 'Toyota', 'Triumph', 'Volkswagen', 'Volvo', 
-        'Yugo', 'Ram',
-
-    )
-    
     # looking for the year in the description
-    year = re.search(r'(\d+)', data).group(1)
-
-    make = None
-    # looking for make in the manual list
-    for m in standard_makes:
-        if m in data:
-            make = m
-            break
-        elif m.upper() in data:
-            make = m.upper()
-            break
-    if not make:
+    year = YEAR_PATTERN.search(data).group(1)
+    data = data.replace(year, '', 1)
+
+    # looking for the make in one pass over the description
+    found = MAKE_PATTERN.search(data)
+    if not found:
         # Can't found any make, exit the method here
         return -1
+    make = MAKES_LOOKUP[found.group(1).lower()]
 
-    data = data.replace(year, '', 1)
-    data = data.replace(make, '', 1).strip()
+    # removing the year and the make leaves double spaces, the grams are single spaced
+    data = " ".join("".join((data[:found.start(1)], data[found.end(1):])).split())
 
     model = ""
     trim = ""
     # Generate all ngrams from the description to match make and model pair
     ngrams = generate_ngrams(data)
 
-    # Load all models of the make from the DB
-    all_models = DatabaseUtil().get_all_models(make)
-    
-    for gram in ngrams:
-        found = False
-        for each in all_models:
-            # try to match make from the description with one of them in the DB
-            if each.lower().strip() == gram.lower().strip():
-                model = gram
-                # Extract trim after model's place
-                try:
-                    trim = re.search(model + r'(.+)', data).group(1).strip()
-                except:
-                    pass
-                found = True
-                break
-        if found:
-            break
-        
+    # Look up the longest gram which is a known model of the make
+    gram = catalog.match_model(make, ngrams)
+    if gram is not None:
+        model = gram
+        # Extract trim after model's place
+        position = data.find(model)
+        if position != -1:
+            trim = data[position + len(model):]
+
     return {'year': year, 'make': make.strip(), 'model': model.strip(), 'trim': trim.strip()}
 
 def extract_price(data):
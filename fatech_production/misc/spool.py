@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+#######################################
+### TSV spool files for LOAD DATA
+#######################################
+
+# Python imports
+import os
+import glob
+import time
+import errno
+import fcntl
+
+# a spool being written, renamed to READY_SUFFIX once rotated
+OPEN_SUFFIX = '.tsv.part'
+READY_SUFFIX = '.tsv'
+# a recovered spool is renamed with CLAIMED and the pid of the process which loads it
+CLAIMED = '~'
+
+def escape(value):
+    """ a value in the default format of LOAD DATA: tab separated, \\N for NULL, backslash escapes """
+
+    if value is None:
+        return '\\N'
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def parse_name(path):
+    """ (site, table) of a spool file """
+
+    site, table = os.path.basename(path).split('.')[:2]
+    return site, table
+
+def owner_pid(path):
+    """ pid of the process loading a ready spool: the one which claimed it, otherwise the one which wrote it """
+
+    name = os.path.basename(path)[:-len(READY_SUFFIX)]
+    if CLAIMED in name:
+        return int(name.rsplit(CLAIMED, 1)[1])
+    return int(name.split('.')[2].split('-')[1])
+
+def is_alive(pid):
+    """ True if a process of the pid runs on this host """
+
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno == errno.EPERM
+    return True
+
+def claim(path):
+    """ rename a ready spool to the current process, returns the new path or None when another process claimed it first """
+
+    name = os.path.basename(path)[:-len(READY_SUFFIX)].split(CLAIMED)[0]
+    claimed = os.path.join(os.path.dirname(path), "%s%s%s%s" % (name, CLAIMED, os.getpid(), READY_SUFFIX))
+    try:
+        os.rename(path, claimed)
+    except OSError, e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    return claimed
+
+class SpoolWriter(object):
+    """ Rows of a site table appended to a local TSV file, rotated once it holds max_bytes.
+        A rotated file is complete and ready to be loaded, a failed load leaves it in place to be replayed.
+        The file being written is flock()ed, so recover_spools() of another process leaves it alone.
+    """
+
+    def __init__(self, directory, site, table, max_bytes):
+        self.directory = directory
+        self.site = site
+        self.table = table
+        self.max_bytes = max_bytes
+        self.sequence = 0
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.rows = 0
+
+    def open(self):
+        self.sequence += 1
+        name = "%s.%s.%s-%s-%s" % (self.site, self.table, time.strftime("%Y%m%d%H%M%S"), os.getpid(), self.sequence)
+        self.path = os.path.join(self.directory, name)
+        self.file = open(self.path + OPEN_SUFFIX, 'wb')
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        self.size = 0
+        self.rows = 0
+
+    def write(self, values):
+        """ append a row, returns the path of the rotated spool when it is full, otherwise None """
+
+        if self.file is None:
+            self.open()
+        line = "\t".join(escape(value) for value in values) + "\n"
+        self.file.write(line)
+        self.size += len(line)
+        self.rows += 1
+        if self.size >= self.max_bytes:
+            return self.rotate()
+        return None
+
+    def rotate(self):
+        """ close the current spool and make it ready, returns its path or None if nothing was written """
+
+        if self.file is None:
+            return None
+        # renamed while locked, closing the file releases the lock
+        self.file.flush()
+        path = self.path + READY_SUFFIX
+        os.rename(self.path + OPEN_SUFFIX, path)
+        self.file.close()
+        self.file = None
+        return path
+
+def recover_spools(directory):
+    """ spools left by processes which are gone: interrupted ones are cut after their last complete row and made ready.
+        the spools of a live process are left to it. returns the paths of the ready spools claimed, oldest first
+    """
+
+    for path in glob.glob(os.path.join(directory, '*' + OPEN_SUFFIX)):
+        try:
+            f = open(path, 'rb+')
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                # rotated or recovered meanwhile
+                continue
+            raise
+        try:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                # still written by a live process
+                continue
+            if not os.path.exists(path) or os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                # rotated or recovered while the lock was waited for
+                continue
+            data = f.read()
+            f.truncate(data.rfind("\n") + 1)
+            os.rename(path, path[:-len(OPEN_SUFFIX)] + READY_SUFFIX)
+        finally:
+            f.close()
+
+    claimed = []
+    for path in glob.glob(os.path.join(directory, '*' + READY_SUFFIX)):
+        if is_alive(owner_pid(path)):
+            continue
+        path = claim(path)
+        if path is not None:
+            claimed.append(path)
+    return sorted(claimed, key=os.path.getmtime)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+#######################################
+### In-memory VIN index
+#######################################
+
+# Python imports
+from array import array
+from bisect import bisect_left
+import heapq
+import zlib
+
+# Custom imports
+from fatech_production.misc.querystats import query_stats
+
+# rows fetched at once while loading master_vin
+LOAD_CHUNK = 10000
+# hashes sorted at once while the index is built, the runs are then merged
+SORT_RUN = 256 * 1024
+
+def normalize_vin(vin):
+    """ VINs are compared case-insensitively, like the collation of master_vin does """
+
+    return (vin or "").strip().upper()
+
+def vin_hash(vin):
+    """ unsigned 32 bits hash of a normalized vin """
+
+    return zlib.crc32(vin.encode('utf-8')) & 0xffffffff
+
+def sorted_hashes(hashes):
+    """ the hashes of an iterable as a sorted array.
+        only SORT_RUN hashes are sorted as python ints at once, so the peak memory stays about
+        twice the array instead of a list of every hash
+    """
+
+    runs = []
+    run = array('I')
+    for key in hashes:
+        run.append(key)
+        if len(run) == SORT_RUN:
+            runs.append(array('I', sorted(run)))
+            run = array('I')
+    if run:
+        runs.append(array('I', sorted(run)))
+    if len(runs) == 1:
+        return runs[0]
+    merged = array('I')
+    merged.extend(heapq.merge(*runs))
+    return merged
+
+def fetch_vins(cursor):
+    """ the vins of an executed select, fetched LOAD_CHUNK rows at a time """
+
+    while True:
+        rows = cursor.fetchmany(LOAD_CHUNK)
+        if not rows:
+            break
+        for row in rows:
+            yield row['VIN']
+
+class VinIndex(object):
+    """ A compact membership index of the VINs of master_vin.
+
+        master_vin is kept as a sorted array of 4 bytes hashes, a lookup is a binary search.
+        A hash hit is only a maybe: positives are confirmed against the database, all of a batch in one query.
+        VINs of the cars inserted during this run are remembered exactly and need no confirmation,
+        those of the running transaction are pending until commit() or rollback().
+    """
+
+    def __init__(self):
+        # sorted hashes of master_vin
+        self.hashes = array('I')
+        # normalized vins added during this run
+        self.added = set()
+        # normalized vins added by the running transaction
+        self.pending = set()
+        self.loaded = False
+
+    def load(self, vins):
+        """ build the index from an iterable of vins """
+
+        self.hashes = sorted_hashes(vin_hash(normalize_vin(vin)) for vin in vins)
+        self.loaded = True
+
+    def load_from_cursor(self, cursor):
+        """ build the index from master_vin, runs in an interaction of the pipeline """
+
+        with query_stats.timed('vin.load'):
+            cursor.execute("select VIN from master_vin;")
+            self.load(fetch_vins(cursor))
+        return len(self.hashes)
+
+    def might_contain(self, vin):
+        """ False when the normalized vin is surely not in master_vin """
+
+        key = vin_hash(vin)
+        index = bisect_left(self.hashes, key)
+        return index < len(self.hashes) and self.hashes[index] == key
+
+    def add(self, vin):
+        """ remember the vin of an inserted car until its transaction ends, empty vins are never added """
+
+        vin = normalize_vin(vin)
+        if vin:
+            self.pending.add(vin)
+
+    def commit(self):
+        """ the transaction of the pending vins is committed """
+
+        self.added.update(self.pending)
+        self.pending = set()
+
+    def rollback(self):
+        """ the transaction of the pending vins is rolled back, its cars are not stored """
+
+        self.pending = set()
+
+    def known(self, vins, confirm):
+        """ return the normalized vins of vins which are known.
+            confirm is called once with the list of the candidates hit by a hash and returns
+            the vins of them which really are in master_vin. Until the index is loaded every vin is a candidate.
+        """
+
+        known = set()
+        candidates = set()
+        for vin in vins:
+            vin = normalize_vin(vin)
+            if vin in self.added or vin in self.pending:
+                known.add(vin)
+            elif not self.loaded or self.might_contain(vin):
+                candidates.add(vin)
+
+        if candidates:
+            known.update(normalize_vin(vin) for vin in confirm(list(candidates)))
+        return known
+
+    def __len__(self):
+        return len(self.hashes) + len(self.added)
@@ -0,0 +1,4 @@
+# This package contains the per-site parsers shared by the spiders of a site.
+#
+# A parser turns an html response into scraped items without being a spider,
+# so it can be used by recon, main, recheck and finalcheck spiders alike.
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+#######################################
+### Autotrader Parser
+#######################################
+
+# Scrapy imports
+from scrapy import log
+
+# Custom imports
+from fatech_production.items import Car
+from fatech_production.items import Vin
+from fatech_production.misc.spiderutil import *
+from fatech_production.parsers.siteparser import SiteParser
+from fatech_production.parsers.schema import SchemaExtractor
+from fatech_production.parsers.xpathengine import XPathEngine
+
+# schema of a vehicle highlights page
+SCHEMA = {
+    'site': 'autotrader',
+    'xpaths': {
+        'description': '//span[@class="listing-title"]/text()',
+        'price': '//span[@class="primary-price"]/text()',
+        'detail_keys': '//div[@class="atcui atcui-container atcui-quinary atcui-gradient atcui-small atcui-clearfix vehicle-details "]/table/tr/td[1]/text()',
+        'detail_texts': '//div[@class="atcui atcui-container atcui-quinary atcui-gradient atcui-small atcui-clearfix vehicle-details "]/table/tr/td[2]/text()',
+        'dealer': '//span[@class="owner-name"]/text()',
+        'street': '//span[@class="address1"]/text()',
+        'city': '//span[@class="cityStateZip"]/text()',
+        'phone': '//div[@class="atcui atcui-container atcui-quinary atcui-gradient atcui-small atcui-clearfix dealer-information "]//div[@class="atcui-block"]/text()',
+    },
+    'fields': {
+        'price': ('price', extract_price, "-1"),
+        'dealer': ('dealer', None, None),
+    },
+    'tables': (
+        # Mileage, Body Style, Exterior Color, Stock #, Doors...
+        {
+            'keys': 'detail_keys',
+            'values': 'detail_texts',
+            'replacements': ((' ', '_'),),
+            'contains': (('stock', 'stock_id'),),
+            'converters': {'doors': doors_tostring},
+        },
+    ),
+}
+
+class AutoTraderParser(SiteParser):
+    """ Autotrader parser which inherites SiteParser template """
+
+    site = 'autotrader'
+    base_url = "http://www.autotrader.com/cars-for-sale/popup/vehiclehighlights.xhtml?listingId="
+
+    # the title of a listing, pages of unknown ids do not have it
+    hit_marker = 'listing-title'
+
+    # compiled once for all responses
+    extractor = SchemaExtractor(SCHEMA)
+
+    def parse_page(self, response):
+        """
+            parse html response of a vehicle highlights page, returns a list of scraped items
+        """
+
+        items = []
+
+        extractor = self.extractor
+        engine = extractor.engine
+        tree = extractor.parse_tree(response)
+
+        car = Car()
+
+        car['site'] = self.site
+        car['source_url'] = response.url
+        car['url_id'] = response.request.meta['url_id']
+
+        try:
+            ### Extracting description, and then call extract_YMMT from spiderutil to get year, make, model, trim
+            car['description'] = engine.select(tree, 'description')[0].strip()
+        except:
+            items.append(self.get_link(response.request.meta['url_id'], 'E'))
+            return items
+
+        result = extract_YMMT(car['description'])
+        if result != - 1:
+            car['year'] = result['year']
+            car['make'] = result['make']
+            car['model'] = result['model']
+            car['trim'] = result['trim']
+        else:
+            # Drop the item when unable to extract year, make, model, trim
+            log.msg('[WARNING] Unable to extract YearMakeModelTrim!', level=log.INFO)
+            return items
+
+        ### Extracting price, dealer and the fields of the vehicle details table
+        extractor.fill(tree, car)
+
+        try:
+            # Extracting street info
+            street_info = engine.select(tree, 'street')[0]
+            street_info = street_info.strip()
+            street_info = extract_street(street_info)
+            car['street_number'] = street_info['street_number']
+            car['street_name'] = street_info['street_name']
+
+            # Extracting city info
+            city_info = engine.select(tree, 'city')[0]
+            city_info = extract_CSZ(city_info)
+            car['city'] = city_info['city']
+            car['zip_code'] = city_info['zip_code']
+            car['state'] = city_info['state']
+        except:
+            pass
+
+        # Extracting phone number
+        try:
+            phone = engine.select(tree, 'phone')[0].strip()
+            car['phone'] = extract_phone(phone)
+        except:
+            car['phone'] = None
+
+        items.append(car)
+        items.append(self.get_link(response.request.meta['url_id'], 'S'))
+
+        return items
+
+class AutoTraderVinParser(SiteParser):
+    """ Autotrader parser of mobile vehicle detail pages which only carry the vin """
+
+    site = 'autotrader'
+    base_url = "http://m.autotrader.com/vdp.html?id="
+
+    # compiled once for all responses
+    engine = XPathEngine({'vin': '//div[@id="vdp-main-vin"]/div[@class="value ui-block-b"]/text()'})
+
+    def parse(self, response):
+        """
+            parse html response of a mobile vehicle detail page, returns a list of scraped items
+        """
+
+        vin = Vin()
+
+        vin['site'] = self.site
+        vin['url_id'] = response.request.meta['url_id']
+        try:
+            vin['vin'] = self.engine.first(self.engine.parse_tree(response), 'vin').strip()
+        except:
+            pass
+        return [vin]
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+#######################################
+### Carlocate Parser
+#######################################
+
+# Scrapy imports
+from scrapy import log
+
+# Custom imports
+from fatech_production.items import Car
+from fatech_production.misc.spiderutil import *
+from fatech_production.parsers.siteparser import SiteParser
+from fatech_production.parsers.schema import SchemaExtractor
+
+def strip_commas(data):
+    """ remove thousands separators """
+
+    return data.replace(',', '')
+
+# schema of a vehicle detail page
+SCHEMA = {
+    'site': 'carlocate',
+    'xpaths': {
+        'description': '//div[@class="detHeadInnerL blue"]/h1/text()',
+        'price': '//div[@class="detHeadInnerR"]/text()',
+        'left_keys': '//ul[@class="detDescripInfoL"]/li/span/text()',
+        'left_texts': '//ul[@class="detDescripInfoL"]/li/text()',
+        'middle_keys': '//ul[@class="detDescripInfoM"]/li/span/text()',
+        'middle_texts': '//ul[@class="detDescripInfoM"]/li/text()',
+        'dealer': '//div[@class="detSelInfoL"]/ul/li[1]/span/a/text()',
+        'street': '//div[@class="detSelInfoL"]/ul/li[2]/text()',
+        'city': '//div[@class="detSelInfoL"]/ul/li[3]/text()',
+        'phone': '//div[@class="detSelInfoL"]/ul/li[4]/span/text()',
+        'phone_ctc': '//div[@class="detPhoneCTC"]/a/b/text()',
+    },
+    'fields': {
+        'price': ('price', extract_price, "-1"),
+        'dealer': ('dealer', None, None),
+    },
+    'tables': (
+        # Stock #, VIN, Color, Interior Color, Body Style...
+        {
+            'keys': 'left_keys',
+            'values': 'left_texts',
+            'replacements': ((' #', '_id'), (' ', '_'), (':', '')),
+            'aliases': {'color': 'exterior_color'},
+        },
+        # Mileage, Engine, Transmission, Doors, Drivetrain...
+        {
+            'keys': 'middle_keys',
+            'values': 'middle_texts',
+            'replacements': ((' ', '_'), (':', '')),
+            'aliases': {'drivetrain': 'drive_type'},
+            'converters': {'mileage': strip_commas, 'doors': doors_tostring},
+        },
+    ),
+}
+
+class CarlocateParser(SiteParser):
+    """ Carlocate parser which inherites SiteParser template """
+
+    site = 'carlocate'
+    base_url = "http://www.carlocate.com/Pages/VehicleDetail.aspx?id="
+
+    # the title of a vehicle detail page
+    hit_marker = 'detHeadInnerL'
+
+    # compiled once for all responses
+    extractor = SchemaExtractor(SCHEMA)
+
+    def is_miss(self, response):
+        """ carlocate redirects unknown ids to the search page """
+
+        if response.url == 'http://www.carlocate.com/SearchCars.aspx':
+            return True
+        return super(CarlocateParser, self).is_miss(response)
+
+    def is_probe_miss(self, response):
+        """ an unknown id is answered by a redirect to the search page """
+
+        if 300 <= response.status < 400 and 'SearchCars.aspx' in response.headers.get('Location', ''):
+            return True
+        return super(CarlocateParser, self).is_probe_miss(response)
+
+    def parse_page(self, response):
+        """
+            parse html response of a vehicle detail page, returns a list of scraped items
+        """
+
+        items = []
+
+        extractor = self.extractor
+        engine = extractor.engine
+        tree = extractor.parse_tree(response)
+
+        car = Car()
+
+        car['site'] = self.site
+        car['source_url'] = response.url
+        car['url_id'] = response.request.meta['url_id']
+
+        ### Extracting description, and then call extract_YMMT from spiderutil to get year, make, model, trim
+        car['description'] = engine.select(tree, 'description')[0].strip()
+        result = extract_YMMT(car['description'])
+        if result != - 1:
+            car['year'] = result['year']
+            car['make'] = result['make']
+            car['model'] = result['model']
+            car['trim'] = result['trim']
+        else:
+            # Drop the item when unable to extract year, make, model, trim
+            log.msg('[WARNING] Unable to extract YearMakeModelTrim!', level=log.INFO)
+            return items
+
+        ### Extracting price, dealer and the fields of the detail lists
+        extractor.fill(tree, car)
+
+        # Extracting street info
+        street_info = engine.select(tree, 'street')[0]
+        street_info = street_info.strip()
+        street_info = extract_street(street_info)
+        car['street_number'] = street_info['street_number']
+        car['street_name'] = street_info['street_name']
+
+        # Extracting city info
+        city_info = engine.select(tree, 'city')[0]
+        city_info = extract_CSZ(city_info)
+        car['city'] = city_info['city']
+        car['zip_code'] = city_info['zip_code']
+        car['state'] = city_info['state']
+
+        # Extracting phone number
+        phone = engine.select(tree, 'phone')
+        if not phone:
+            phone = engine.select(tree, 'phone_ctc')
+        car['phone'] = phone[0].strip()
+
+        items.append(car)
+        items.append(self.get_link(response.request.meta['url_id'], 'S'))
+
+        return items
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+#######################################
+### Declarative site schemas
+#######################################
+
+# Custom imports
+from fatech_production.items import Car
+from fatech_production.parsers.xpathengine import XPathEngine
+
+# the maximum number of distinct labels remembered per table, labels of a site are a handful
+MAX_LABELS = 1000
+
+class SchemaExtractor(object):
+    """ A site schema compiled into a fast extractor.
+
+        A schema is a dict of:
+            xpaths: a dict of name -> xpath string of every selector of the site
+            fields: a dict of car field -> (xpath name, converter or None, default) of single value fields
+            tables: a tuple of key/value tables, see CompiledTable
+    """
+
+    def __init__(self, schema):
+        self.site = schema['site']
+        self.engine = XPathEngine(schema['xpaths'])
+        self.fields = tuple((field, name, converter, default)
+                            for field, (name, converter, default) in schema.get('fields', {}).iteritems())
+        self.tables = tuple(CompiledTable(table) for table in schema.get('tables', ()))
+
+    def parse_tree(self, response):
+        """ parse the body of a response once """
+
+        return self.engine.parse_tree(response)
+
+    def fill(self, tree, car):
+        """ fill the car with the single value fields and the key/value tables of the tree """
+
+        engine = self.engine
+        for field, name, converter, default in self.fields:
+            value = engine.first(tree, name)
+            if value is None:
+                if default is not None:
+                    car[field] = default
+                continue
+            value = value.strip()
+            car[field] = converter(value) if converter else value
+
+        for table in self.tables:
+            table.fill(car, engine.select(tree, table.keys), engine.select(tree, table.values))
+
+        return car
+
+class CompiledTable(object):
+    """ A key/value table of a schema, described by a dict of:
+            keys: the xpath name of the labels
+            values: the xpath name of the values
+            replacements: a tuple of (old, new) applied to a stripped label before lowercasing it
+            aliases: a dict of normalized label -> car field
+            contains: a tuple of (part, car field), the field of any label containing the part
+            converters: a dict of car field -> converter of the stripped value
+
+        Every distinct label is normalized once and remembered in a lookup table,
+        rows then cost a dict lookup. Labels which are not Car fields are skipped.
+    """
+
+    def __init__(self, table):
+        self.keys = table['keys']
+        self.values = table['values']
+        self.replacements = table.get('replacements', ())
+        self.aliases = table.get('aliases', {})
+        self.contains = table.get('contains', ())
+        self.converters = table.get('converters', {})
+        # raw label -> (car field, converter) or None
+        self.labels = {}
+
+    def compile_label(self, label):
+        """ normalize a raw label, returns (car field, converter) or None if it is not a Car field """
+
+        key = label.strip()
+        for old, new in self.replacements:
+            key = key.replace(old, new)
+        key = key.strip().lower().encode('utf-8')
+
+        field = self.aliases.get(key)
+        if field is None:
+            for part, aliased in self.contains:
+                if part in key:
+                    field = aliased
+                    break
+            else:
+                field = key
+
+        if field not in Car.fields:
+            return None
+        return (field, self.converters.get(field))
+
+    def lookup(self, label):
+        """ get (car field, converter) of a raw label """
+
+        try:
+            return self.labels[label]
+        except KeyError:
+            entry = self.compile_label(label)
+            if len(self.labels) < MAX_LABELS:
+                self.labels[label] = entry
+            return entry
+
+    def fill(self, car, key_list, text_list):
+        """ assign the value of each known label to the car """
+
+        lookup = self.lookup
+        for label, text in zip(key_list, text_list):
+            entry = lookup(label)
+            if entry is None:
+                continue
+            field, converter = entry
+            text = text.strip()
+            car[field] = converter(text) if converter else text
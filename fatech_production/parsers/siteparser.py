@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+#######################################
+### Site Parser Template
+#######################################
+
+# Custom imports
+from fatech_production.items import Link
+
+# counters of the parsed responses shared by all parsers of the process, (site, name) -> count
+# fast_miss: responses classified as a miss without parsing the DOM
+# parsed: responses which went through the full parse
+# probe_miss, probe_hit: ids checked by a recon spider in probe mode
+counters = {}
+
+def count(site, name):
+    """ increase the counter of a site """
+
+    counters[(site, name)] = counters.get((site, name), 0) + 1
+
+class SiteParser(object):
+    """ site parser template which parses html responses of a website into scraped items.
+        Parsers hold no spider state and never touch the database, so spiders share them freely.
+    """
+
+    # name of the target website
+    site = ''
+    # base url to add id to
+    base_url = ''
+    # bytes every page of a found car contains, a response without them is a miss
+    hit_marker = None
+
+    def is_miss(self, response):
+        """ classify a response as a miss from its status, url or bytes, without parsing the DOM """
+
+        if response.status != 200:
+            return True
+        if self.hit_marker is not None and self.hit_marker not in response.body:
+            return True
+        return False
+
+    def is_probe_miss(self, response):
+        """ classify the response of a probe (HEAD or ranged GET, redirects not followed) as a miss.
+            Only a clear 'not found' is a miss, anything else is fetched in full and left to parse.
+        """
+
+        return response.status in (404, 410)
+
+    def parse(self, response):
+        """
+            parse html response, returns a list of scraped items.
+            misses are answered with an E link before any DOM is built
+        """
+
+        if self.is_miss(response):
+            count(self.site, 'fast_miss')
+            return [self.get_link(response.request.meta['url_id'], 'E')]
+
+        count(self.site, 'parsed')
+        return self.parse_page(response)
+
+    def parse_page(self, response):
+        """
+            a custom method to parse html response of a found car, returns a list of scraped items
+        """
+        # Place custom code here
+        raise NotImplementedError
+
+    def get_link(self, url_id, status):
+        """ build the Link item of an url_id with the status (S or E) """
+
+        link = Link()
+        link['url'] = self.base_url + str(url_id)
+        link['url_id'] = url_id
+        link['status'] = status
+        link['site'] = self.site
+        return link
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+#######################################
+### Precompiled XPath extraction engine
+#######################################
+
+# Python imports
+from lxml import etree
+
+class XPathEngine(object):
+    """ Compile the xpaths of a site once and run them against a single parsed tree per response.
+        HtmlXPathSelector parses every xpath string again on each select() call, lxml.etree.XPath objects do not.
+    """
+
+    def __init__(self, xpaths):
+        """
+            parameters:
+                xpaths: a dict of name -> xpath string
+        """
+
+        # plain strings instead of smart strings, results never need to go back to their parent element
+        self.xpaths = dict((name, etree.XPath(xpath, smart_strings=False)) for name, xpath in xpaths.iteritems())
+        # html parsers by encoding, building one is not free
+        self.parsers = {}
+
+    def get_parser(self, encoding):
+        """ get the html parser of the encoding """
+
+        parser = self.parsers.get(encoding)
+        if parser is None:
+            parser = etree.HTMLParser(encoding=encoding)
+            self.parsers[encoding] = parser
+        return parser
+
+    def parse_tree(self, response):
+        """ parse the body of a response once, returns the root element or None for an empty body """
+
+        if not response.body.strip():
+            return None
+        encoding = getattr(response, 'encoding', None) or 'utf-8'
+        return etree.fromstring(response.body, parser=self.get_parser(encoding))
+
+    def select(self, tree, name):
+        """ evaluate the compiled xpath on the tree, returns a list of unicode strings """
+
+        if tree is None:
+            return []
+        return [unicode(value) for value in self.xpaths[name](tree)]
+
+    def first(self, tree, name, default=None):
+        """ evaluate the compiled xpath on the tree, returns the first result or default """
+
+        results = self.select(tree, name)
+        return results[0] if results else default
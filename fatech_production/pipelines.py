@@ -13,231 +13,807 @@ from fatech_production.settings import *
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.items import Vin
+from fatech_production.misc.vinindex import VinIndex
+from fatech_production.misc.vinindex import normalize_vin
+from fatech_production.misc.makemodel import MakeModelCache
+from fatech_production.misc.idbitmap import IdBitmap
+from fatech_production.misc.idbitmap import stored_ids_path
+from fatech_production.misc.spool import SpoolWriter
+from fatech_production.misc.spool import recover_spools
+from fatech_production.misc.spool import parse_name
+from fatech_production.misc.journal import Journal
+from fatech_production.misc.journal import recover_journals
+from fatech_production.misc.querystats import query_stats
+from fatech_production.storage import get_backend
+from fatech_production.storage.base import placeholders
 
 # Python imports
-from twisted.enterprise import adbapi
-import MySQLdb.cursors
-import MySQLdb as mdb
+from twisted.internet import defer
+from twisted.internet import reactor
+from timeit import default_timer
+from collections import deque
+import os
 from datetime import datetime
 from pytz import timezone
 import urllib
+import json
 import re
 
 class DuplicatesPipeline(object):
     """
         DuplicatesPipeline to avoid duplicating scraped items.
-        Saving all IDs have seen, and then use them to check if an incoming item is scraped.
+        Saving all IDs have seen per site in a bitmap, and then use them to check if an incoming Car is scraped.
+        It runs before MySQLPipeline, so a duplicated Car costs no database write.
+        IDs stored with status S are saved into DUPLICATES_DIR when it is set, spiders skip them on the next runs.
     """
 
     def __init__(self):
-        self.ids_seen = set()
+        # site -> IdBitmap of the ids seen during this run
+        self.ids_seen = {}
+        # site -> IdBitmap of the ids stored with status S during this run
+        self.ids_stored = {}
 
     def process_item(self, item, spider):
 
-        if isinstance(item, Car) and item['url_id'] in self.ids_seen:
+        ids_seen = self.ids_seen.get(item['site'])
+        if ids_seen is None:
+            ids_seen = self.ids_seen[item['site']] = IdBitmap()
+
+        if not ids_seen.add(item['url_id']) and isinstance(item, Car):
             raise DropItem('[DUPLICATED] - %s' % str(item['url_id']))
-        else:
-            self.ids_seen.add(item['url_id'])
-            return item
-            
 
+        if isinstance(item, Link) and item['status'] == 'S':
+            self.ids_stored.setdefault(item['site'], IdBitmap()).add(item['url_id'])
+        return item
+
+    def close_spider(self, spider):
+        """ merge the stored ids into the files of their sites """
+
+        for site, ids_stored in self.ids_stored.iteritems():
+            path = stored_ids_path(site)
+            if path is not None:
+                ids_stored.save(path)
+                log.msg('[STORED IDS] %s - %s saved' % (site, len(ids_stored)), level=log.INFO)
+
+
+# Car fields in the order of the columns of the _cars and _history tables
+CAR_COLUMNS = (
+    ('id', 'url_id'), ('description', 'description'), ('`year`', 'year'), ('make', 'make'), ('trim', 'trim'),
+    ('model', 'model'), ('price', 'price'), ('bodystyle', 'body_style'), ('exterior_color', 'exterior_color'),
+    ('interior_color', 'interior_color'), ('`engine`', 'engine'), ('stock_id', 'stock_id'), ('vin', 'vin'),
+    ('mileage', 'mileage'), ('transmission', 'transmission'), ('drive_type', 'drive_type'), ('doors', 'doors'),
+    ('fuel', 'fuel_type'), ('cab', 'cab_type'), ('stereo', 'stereo'), ('dealer', 'dealer'),
+    ('street_number', 'street_number'), ('street_name', 'street_name'), ('city', 'city'), ('state', 'state'),
+    ('zip_code', 'zip_code'), ('phone', 'phone'), ('source_url', 'source_url'), ('found_by', 'found_by'),
+)
+
+def sanitized(item):
+    """ Get sanitized some fields of Cars """
+
+    item['source_url'] = urllib.quote_plus(item.get('source_url'))
+    item['dealer'] = re.sub('&', '%26', item.get('dealer', ""))
+    item['description'] = re.sub('&', '%26', item.get('description', ""))
+    item['trim'] = re.sub('&', '%26', item.get('trim', ""))
+    item['make'] = re.sub('&', '%26', item.get('make', ""))
+    item['model'] = re.sub('&', '%26', item.get('model', ""))
+    item['price'] = re.sub(r',', '', item.get('price', "-1"))
+    item['mileage'] = re.sub(r',', '', item.get('mileage', "-1"))
+    return item
+
+def merge_cars_statements(site, staging, columns):
+    """ set-based merge of a staging table of Cars: the new ones go into _cars, or _history when their vin is
+        in master_vin, then the unseen makes and models are held. No statement reads a result back.
+        returns a list of (label, statement, log message of its affected rows or None)
+    """
+
+    # Cars already stored are not inserted again
+    statements = [('cars.merge_existing', "".join(("delete s from ", staging, " s join ", site, "_cars c on c.id = s.id;")),
+                   "[WARNING] Multiple Checking - %s cars of " + staging)]
+
+    known_vin = "exists (select 1 from master_vin m where m.VIN = coalesce(s.vin, ''))"
+    selected = ", ".join("s." + column for column in columns.split(", "))
+    for target_table, condition in (("_history", known_vin), ("_cars", "not " + known_vin)):
+        target = site + target_table
+        statements.append((target_table.strip('_') + '.merge',
+                           "".join(("insert into ", target, " (", columns, ") select ", selected, " from ", staging,
+                                    " s where ", condition, " order by s.id on duplicate key update ",
+                                    target, ".id = ", target, ".id;")),
+                           '[MERGED] ' + target + ' - %s cars'))
+
+    # hold the unseen makes, then the unseen models of the known makes and of the makes just held
+    statements.append(('holds.merge', "set @last_hold_id = (select coalesce(max(id), 0) from master_makes_hold);", None))
+    make = "replace(s.make, '%26', '&')"
+    model = "replace(s.model, '%26', '&')"
+    statements.append(('holds.merge', "".join((
+        "insert into master_makes_hold(make) select distinct ", make, " from ", staging,
+        " s where s.make <> '' and not exists (select 1 from master_makes_variations v where v.make = ",
+        make, ") and not exists (select 1 from master_makes_hold h where h.make = ", make, ");")), None))
+    # a temporary table can only be opened once per statement, so one statement per kind of make
+    for makes, held in (("master_makes_variations", ""), ("master_makes_hold", " and k.id > @last_hold_id")):
+        statements.append(('holds.merge', "".join((
+            "insert into master_models_hold(model, fk_make) select ", model, " as held_model, min(k.id) from ",
+            staging, " s join ", makes, " k on k.make = ", make, held, " where s.model <> ''",
+            " and not exists (select 1 from master_models_variations v where v.model = ", model, ")",
+            " and not exists (select 1 from master_models_hold h where h.model = ", model, ")",
+            " group by held_model;")), None))
+    return statements
+
+def split_group(buffers, sequences, count):
+    """ the two halves of a group, as (buffers, sequences, count), the buffers keep their order """
+
+    entries = []
+    for key in sorted(buffers):
+        items = buffers[key]
+        seqs = sequences.get(key) or [None] * len(items)
+        entries.extend((key, item, seq) for item, seq in zip(items, seqs))
+
+    halves = []
+    for part in (entries[:count // 2], entries[count // 2:]):
+        part_buffers = {}
+        part_sequences = {}
+        for key, item, seq in part:
+            part_buffers.setdefault(key, []).append(item)
+            if seq is not None:
+                part_sequences.setdefault(key, []).append(seq)
+        halves.append((part_buffers, part_sequences, len(part)))
+    return halves
+
+def now_est():
+    """ current time in US/Eastern, used by the log messages """
+
+    return datetime.now(timezone('US/Eastern')).strftime("%Y-%m-%d %H:%M:%S")
 
 class MySQLPipeline(object):
-    """ Pipeline to sanitize items and also handle mysql transactions """
+    """ Pipeline to sanitize items and also handle mysql transactions.
 
-    def __init__(self):
-        """ initialize a MySQL connection object """
-
-        self.dbpool = adbapi.ConnectionPool('MySQLdb',
-                                            host=DATABASE_HOST,
-                                            port=DATABASE_PORT,
-                                            db=DATABASE_NAME,
-                                            user=DATABASE_USER,
-                                            passwd=DATABASE_PASSWORD,
-                                            cursorclass=MySQLdb.cursors.DictCursor,
-                                            charset='utf8',
-                                            use_unicode=True
-                                            )
+        Items are not written one by one: they are buffered per (kind, site) and committed in groups.
+        A group commit writes every buffer as multi-row statements of at most PIPELINE_BATCH_SIZE rows
+        in a single transaction. It starts once PIPELINE_COMMIT_ITEMS items are buffered, at the latest
+        PIPELINE_COMMIT_INTERVAL milliseconds after the first one, and when the spider is closed.
+        One group is committed at a time, the next one is buffered meanwhile.
+        The statements are built by the storage backend of STORAGE_BACKEND.
+
+        A group failing on a statement is committed again in halves, down to single items, so a bad row
+        only holds itself back: an item failing alone is quarantined. A transient error of the backend
+        (a lost connection, a deadlock...) is not split, the items are kept for a retry.
+
+        Once PIPELINE_MAX_PENDING items are buffered or committing, process_item answers with a Deferred
+        fired after the next group commit, so Scrapy stops scheduling downloads until MySQL catches up.
+
+        Every buffered item is first appended to a journal in PIPELINE_JOURNAL_DIR, fsync()ed before its
+        group commit and acknowledged once the group is committed. A failed group stays in the journal,
+        the items a run did not commit are buffered again by the next one.
+    """
+
+    # item class of each kind, for the items replayed from a journal
+    ITEM_KINDS = {'urls': Link, 'cars': Car, 'vins': Vin, 'vin_failures': Vin}
+
+    def __init__(self, stats=None, backend=None):
+        """ initialize a connection pool of the storage backend """
+
+        self.backend = backend if backend is not None else get_backend()
+        self.dbpool = self.connection_pool()
+        self.stats = stats
+        # (kind, site) -> list of buffered items, kind is one of urls, cars, vins, vin_failures
+        self.buffers = {}
+        # (kind, site) -> journal sequence numbers of the buffered items
+        self.sequences = {}
+        # number of buffered items
+        self.buffered = 0
+        # deferred of the running group commit and its number of items
+        self.committing = None
+        self.in_flight = 0
+        # (deferred, item) of the items held back until the pending items drop under PIPELINE_MAX_PENDING
+        self.waiting = deque()
+        # the buffers are committed right after the running group
+        self.commit_wanted = False
+        # bounds how long a buffered item waits for its commit
+        self.commit_timer = None
+        # fired once everything is committed after the spider is closed
+        self.closing = None
+        # crash journal of the buffered items, opened with the spider
+        self.journal = None
+        # totals of the group commits, for the averages
+        self.commits = 0
+        self.committed_items = 0
+        self.commit_time = 0.0
+        # VINs of master_vin, routes the new cars between _cars and _history
+        self.vin_index = VinIndex()
+        # make & model variations and holds
+        self.make_models = MakeModelCache()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def connection_pool(self):
+        """ the pool running the interactions of the pipeline """
+
+        return self.backend.connection_pool()
+
+    def open_spider(self, spider):
+        """ load the VIN index and the make & model cache, the spider starts once they are loaded """
+
+        self.spider = spider
+        # master_vin_attempts of process_vin_failures
+        self.backend.migrate()
+
+        vins = self.dbpool.runInteraction(self.vin_index.load_from_cursor)
+        vins.addCallback(self.vin_index_loaded)
+        vins.addErrback(self.handle_error)
+
+        make_models = self.dbpool.runInteraction(self.make_models.load_from_cursor)
+        make_models.addErrback(self.handle_error)
+
+        # the replayed cars are routed by the loaded VIN index
+        loaded = defer.DeferredList([vins, make_models])
+        loaded.addCallback(self.open_journal)
+        return loaded
+
+    def open_journal(self, result=None):
+        """ open the journal of the run and buffer again the items the previous runs did not commit """
+
+        if PIPELINE_JOURNAL_DIR is None:
+            return result
+        if not os.path.isdir(PIPELINE_JOURNAL_DIR):
+            os.makedirs(PIPELINE_JOURNAL_DIR)
+        self.journal = Journal(PIPELINE_JOURNAL_DIR, self.spider.name, PIPELINE_JOURNAL_MAX_BYTES)
+
+        replayed = recover_journals(self.journal, self.replay)
+        if replayed:
+            log.msg('[JOURNAL] %s items of previous runs replayed' % replayed, level=log.INFO)
+            if self.stats is not None:
+                self.stats.set_value('journal/replayed', replayed, spider=self.spider)
+        return result
+
+    def replay(self, entry):
+        kind, values = entry
+        self.buffer(kind, self.ITEM_KINDS[kind](values))
+
+    def close_journal(self):
+        """ close the journal, it is kept for the next run while some items are not committed """
+
+        if self.journal is None:
+            return
+        pending = self.journal.pending()
+        self.journal.close()
+        self.journal = None
+        if pending:
+            log.msg('[JOURNAL] %s items not committed, kept in %s for the next run' % (pending, PIPELINE_JOURNAL_DIR),
+                    level=log.WARNING)
+            if self.stats is not None:
+                self.stats.set_value('journal/pending', pending, spider=self.spider)
+
+    def vin_index_loaded(self, count):
+        log.msg('[VIN INDEX] %s vins loaded' % count, level=log.INFO)
+        if self.stats is not None:
+            self.stats.set_value('pipeline/vin_index_size', count, spider=self.spider)
+
+    def close_spider(self, spider):
+        """ commit everything still buffered, the spider is closed once it is stored """
+
+        self.closing = defer.Deferred()
+        self.commit()
+        self.check_closed()
+        return self.closing
 
     def sanitized(self, item):
         """ Get sanitized some fields of Cars """
 
-        item['source_url'] = urllib.quote_plus(item.get('source_url'))
-        item['dealer'] = re.sub('&', '%26', item.get('dealer', ""))
-        item['description'] = re.sub('&', '%26', item.get('description', ""))
-        item['trim'] = re.sub('&', '%26', item.get('trim', ""))
-        item['make'] = re.sub('&', '%26', item.get('make', ""))
-        item['model'] = re.sub('&', '%26', item.get('model', ""))
-        item['price'] = re.sub(r',', '', item.get('price', "-1"))
-        item['mileage'] = re.sub(r',', '', item.get('mileage', "-1"))
-        return item
+        return sanitized(item)
 
     def process_item(self, item, spider):
         """ default pipeline's method to process scraped items """
 
         if isinstance(item, Link):
-            query = self.dbpool.runInteraction(self.process_url, item)
-            query.addErrback(self.handle_error)
-            return item
+            self.buffer('urls', item)
         elif isinstance(item, Car):
             item = self.sanitized(item)
             item['found_by'] = spider.name
-            query = self.dbpool.runInteraction(self.process_car, item)
-            query.addErrback(self.handle_error)
-            return item
+            self.buffer('cars', item)
         elif isinstance(item, Vin):
-            query = self.dbpool.runInteraction(self.process_vin, item)
-            query.addErrback(self.handle_error)
-            return item
-
-    def process_url(self, cursor, item):
-        """ insert & update URLs into the database """
-
-        # check if URL's ID is existed
-        sql = "".join(("select id from ", item.get('site'), "_urls where id = %s limit 1;"))
-        parameters = (item.get('url_id'))
-        cursor.execute(sql, parameters)
-        result = cursor.fetchone()
-        if not result:
-            # insert a new URL 
-            sql = "".join(("insert into ", item.get('site'), "_urls (id, url, status) values (%s, %s, %s);"))
-            parameters = (item.get('url_id'), item.get('url'), item.get('status'))
-            cursor.execute(sql, parameters)
-        else:
-            # check if URL needs to be updated
-            if item.get('status') == 'S':
-                sql = "".join(("update ", item.get('site'), "_urls set status = 'S' where id = %s limit 1;"))
-                parameters = (item.get('url_id'))
-                cursor.execute(sql, parameters)
-
-        if item['status'] == 'S':
-            log.msg("[SUCCESS] %s at %s EST" % (item['url_id'], datetime.now(timezone('US/Eastern')).strftime(
-                "%Y-%m-%d %H:%M:%S")), level=log.INFO)
-        else:
-            log.msg("[ERROR] %s at %s EST" % (item['url_id'], datetime.now(timezone('US/Eastern')).strftime(
-                "%Y-%m-%d %H:%M:%S")), level=log.INFO)
-
-    def process_car(self, cursor, item):
-        """ insert & update Cars """
-
-        def process_make(cursor, make):
-            """ check if the make & model exist in the _variations, if they do not, inserting it into _hold to manually process later """
-
-            # make
-            make = urllib.unquote_plus(make)
-            sql = "select id from master_makes_variations use index(idx_make) where make = %s;"
-            parameters = (make)
-            cursor.execute(sql, parameters)
-            result = cursor.fetchone()
-            make_id = None
-            if not result:
-                sql = "select id from master_makes_hold use index (idx_make) where make = %s;"
-                parameters = (make)
-                cursor.execute(sql, parameters)
-                result = cursor.fetchone()
-                if not result:
-                    sql = "insert into master_makes_hold(make) values (%s);"
-                    parameters = (make)
-                    cursor.execute(sql, parameters)
-                    cursor.execute('commit;')
-                    log.msg('[UNFOUND] make - %s' % make, level=log.INFO)
-                    return cursor.lastrowid
-                else:
-                    return None
+            if item.get('vin'):
+                self.buffer('vins', item)
             else:
-                log.msg('[FOUND] make - %s' % make, level=log.INFO)
-                return result['id']
-
-        def process_model(cursor, model, make_id):
-            """ check if the model exists in the _variations, if it does not, inserting it into _hold to manually process later """            
-
-            model = urllib.unquote_plus(model)
-
-            sql = "select id from master_models_variations use index (idx_model) where model = %s;"
-            parameters = (model)
-            cursor.execute(sql, parameters)
-            result = cursor.fetchone()
-            if not result:
-                sql = "select id from master_models_hold use index (idx_model) where model = %s;"
-                parameters = (model)
-                cursor.execute(sql, parameters)
-                result = cursor.fetchone()
-                if not result:
-                    sql = "insert into master_models_hold(model, fk_make) values (%s, %s);"
-                    parameters = (model, str(make_id))
-                    cursor.execute(sql, parameters)
-                    cursor.execute('commit;')
-                    log.msg('[UNFOUND] model - %s' % model, level=log.INFO)
+                # nothing found, the id is retried later
+                self.buffer('vin_failures', item)
+
+        # backpressure, the item is buffered but Scrapy waits for it
+        pending = self.buffered + self.in_flight
+        if pending >= PIPELINE_MAX_PENDING:
+            waiter = defer.Deferred()
+            self.waiting.append((waiter, item))
+            if self.stats is not None:
+                self.stats.inc_value('pipeline/backpressure_waits', spider=spider)
+                self.stats.max_value('pipeline/queue_depth_max', pending, spider=spider)
+            return waiter
+        return item
+
+    def buffer(self, kind, item):
+        """ journal an item and add it to the buffer of its table, commit the buffers once they hold a group """
+
+        key = (kind, item.get('site'))
+        if self.journal is not None:
+            self.sequences.setdefault(key, []).append(self.journal.append((kind, dict(item))))
+        self.buffers.setdefault(key, []).append(item)
+        self.buffered += 1
+        if self.buffered >= PIPELINE_COMMIT_ITEMS:
+            self.commit()
+        elif self.commit_timer is None:
+            self.commit_timer = reactor.callLater(PIPELINE_COMMIT_INTERVAL / 1000.0, self.commit)
+
+    def commit(self):
+        """ commit every buffer as one group, or right after the running group """
+
+        if self.commit_timer is not None:
+            if self.commit_timer.active():
+                self.commit_timer.cancel()
+            self.commit_timer = None
+
+        if self.committing is not None:
+            self.commit_wanted = True
+            return
+        if not self.buffered:
+            return
+
+        buffers, sequences, count = self.buffers, self.sequences, self.buffered
+        self.buffers, self.sequences, self.buffered = {}, {}, 0
+        self.in_flight = count
+        self.commit_wanted = False
+        # the items of the group are on disk before they are sent
+        if self.journal is not None:
+            self.journal.sync()
+
+        self.committing = self.write(buffers, sequences, count)
+        self.committing.addErrback(self.handle_error)
+        self.committing.addBoth(self.commit_done)
+
+    def write(self, buffers, sequences, count):
+        """ commit a group, returns a Deferred fired once it is committed, split or kept """
+
+        d = self.dbpool.runInteraction(self.write_group, buffers)
+        d.addCallbacks(self.group_committed, self.group_failed,
+                       callbackArgs=(buffers, sequences, count, default_timer()), errbackArgs=(buffers, sequences, count))
+        return d
+
+    def write_group(self, cursor, buffers):
+        """ write every buffer in the transaction of the interaction, committed by adbapi at the end """
+
+        for kind, site in sorted(buffers):
+            items = buffers[(kind, site)]
+            for start in xrange(0, len(items), PIPELINE_BATCH_SIZE):
+                getattr(self, 'process_' + kind)(cursor, site, items[start:start + PIPELINE_BATCH_SIZE])
+
+    def group_committed(self, result, buffers, sequences, count, started):
+        """ acknowledge the journal entries of a group commit, report its size and its latency """
+
+        self.vin_index.commit()
+        self.make_models.commit()
+        self.acknowledge(sequences)
+
+        latency = (default_timer() - started) * 1000.0
+        self.commits += 1
+        self.committed_items += count
+        self.commit_time += latency
+        if self.stats is not None:
+            stats, spider = self.stats, self.spider
+            stats.inc_value('pipeline/commits', spider=spider)
+            stats.max_value('pipeline/commit_items_max', count, spider=spider)
+            stats.set_value('pipeline/commit_items_avg', round(float(self.committed_items) / self.commits, 1), spider=spider)
+            stats.max_value('pipeline/commit_latency_ms_max', int(latency), spider=spider)
+            stats.set_value('pipeline/commit_latency_ms_avg', round(self.commit_time / self.commits, 1), spider=spider)
+            for (kind, site), items in buffers.iteritems():
+                stats.inc_value('pipeline/%s_written' % kind, len(items), spider=spider)
+
+    def group_failed(self, failure, buffers, sequences, count):
+        """ commit the halves of a failed group one after the other, quarantine a single item failing alone.
+            the items of a transient error are not acknowledged, the next run replays them
+        """
+
+        self.vin_index.rollback()
+        self.make_models.rollback()
+
+        if self.backend.transient(failure.value):
+            if self.journal is not None:
+                log.msg('[JOURNAL] group of %s items failed, kept for the next run' % count, level=log.ERROR)
+            if self.stats is not None:
+                self.stats.inc_value('pipeline/failed_items', count, spider=self.spider)
+            self.handle_error(failure)
+            return
+
+        if count > 1:
+            log.msg('[SPLIT] group of %s items failed (%s), committing it in halves' % (count, failure.getErrorMessage()),
+                    level=log.WARNING)
+            if self.stats is not None:
+                self.stats.inc_value('pipeline/split_groups', spider=self.spider)
+            first, second = split_group(buffers, sequences, count)
+            d = self.write(*first)
+            d.addCallback(lambda ignored: self.write(*second))
+            return d
+
+        self.quarantine(buffers, failure)
+        self.acknowledge(sequences)
+
+    def quarantine(self, buffers, failure):
+        """ set aside an item which fails on its own, it is logged and appended to the quarantine file of the journal """
+
+        for (kind, site), items in buffers.iteritems():
+            for item in items:
+                log.msg('[QUARANTINE] %s - %s - %s: %r' % (kind, site, failure.getErrorMessage(), dict(item)), level=log.ERROR)
+                if self.journal is not None:
+                    f = open(os.path.join(PIPELINE_JOURNAL_DIR, self.spider.name + '.quarantine'), 'ab')
+                    try:
+                        f.write(json.dumps({'kind': kind, 'error': failure.getErrorMessage(), 'item': dict(item)},
+                                           default=unicode) + '\n')
+                    finally:
+                        f.close()
+                if self.stats is not None:
+                    self.stats.inc_value('pipeline/quarantined', spider=self.spider)
+
+    def acknowledge(self, sequences):
+        """ acknowledge the journal entries of committed or quarantined items """
+
+        if self.journal is not None:
+            for seqs in sequences.itervalues():
+                self.journal.ack(seqs)
+
+    def commit_done(self, result):
+        """ start the next group if it is due """
+
+        self.committing = None
+        self.in_flight = 0
+        if self.buffered and (self.commit_wanted or self.closing is not None or self.buffered >= PIPELINE_COMMIT_ITEMS):
+            self.commit()
+        elif self.buffered and self.commit_timer is None:
+            self.commit_timer = reactor.callLater(PIPELINE_COMMIT_INTERVAL / 1000.0, self.commit)
+        self.release_waiting()
+        self.check_closed()
+
+    def release_waiting(self):
+        """ give the held back items to Scrapy while the pending items are under the cap """
+
+        pending = self.buffered + self.in_flight
+        if self.stats is not None:
+            self.stats.set_value('pipeline/queue_depth', pending, spider=self.spider)
+        while self.waiting and pending < PIPELINE_MAX_PENDING:
+            waiter, item = self.waiting.popleft()
+            waiter.callback(item)
+            pending = self.buffered + self.in_flight
+
+    def check_closed(self):
+        """ fire closing once the spider is closed and everything is committed """
+
+        if self.closing is not None and self.committing is None and not self.buffered and not self.closing.called:
+            # nothing is pending, every held back item goes
+            while self.waiting:
+                waiter, item = self.waiting.popleft()
+                waiter.callback(item)
+            self.close_journal()
+            self.closing.callback(None)
+
+    def process_urls(self, cursor, site, items):
+        """ insert & update URLs into the database, a known URL only ever moves from E to S """
+
+        # one row per id, S wins over E like in the table, rows sorted by id so that transactions lock in the same order
+        links = {}
+        for item in items:
+            url_id = item.get('url_id')
+            if url_id not in links or item.get('status') == 'S':
+                links[url_id] = item
+        ids = sorted(links)
+
+        self.backend.write_urls(cursor, site, [(url_id, links[url_id].get('url'), links[url_id].get('status')) for url_id in ids])
+
+        for url_id in ids:
+            if links[url_id]['status'] == 'S':
+                log.msg("[SUCCESS] %s at %s EST" % (url_id, now_est()), level=log.INFO)
             else:
-                log.msg('[FOUND] model - %s' % model, level=log.INFO)
+                log.msg("[ERROR] %s at %s EST" % (url_id, now_est()), level=log.INFO)
 
-        # Check if Car's Vin is existed
-        sql = "select RowNum from master_vin use index(Idx_VIN) where VIN = %s limit 1;"
-        if item.get('vin') is not None:
-            parameters = (item.get('vin'))
-        else:
-            parameters = ("")
-        cursor.execute(sql, parameters)
-        result = cursor.fetchone()
-        if result:
-            # Vin is duplicated, then set target table is _history
-            target_table = "_history"
-        else:
-            # Vin is new, then set target table is _cars
-            target_table = "_cars"
-
-        # check if Car's ID is existed
-        sql = "".join(("select id from ", item.get('site'), "_cars where id = %s limit 1;"))
-        parameters = (item.get('url_id'))
-        cursor.execute(sql, parameters)
-        result = cursor.fetchone()
-        if not result:
-            
-            # joining site and target_table to choose correct data table and then insert a new Car
-            sql = "".join(("insert into ", item.get('site'), target_table ,"(id, description, `year`, make, trim, model, price, bodystyle,\
-                exterior_color, interior_color, `engine`, stock_id, vin, mileage, transmission, drive_type, doors, fuel, cab, stereo, dealer, street_number, \
-                street_name, city, state, zip_code, phone, source_url, found_by) \
-                values(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"))
-            parameters = (
-                item.get('url_id'), item.get('description'), item.get('year'), item.get('make'), item.get('trim'),
-                item.get('model'), item.get('price'), item.get('body_style'), item.get('exterior_color'), item.get('interior_color'),
-                item.get('engine'), item.get('stock_id'), item.get('vin'), item.get('mileage'), item.get('transmission'), item.get('drive_type'),
-                item.get('doors'), item.get('fuel_type'), item.get('cab_type'), item.get('stereo'), item.get('dealer'), item.get('street_number'), 
-                item.get('street_name'), item.get('city'), item.get('state'), item.get('zip_code'), item.get('phone'), item.get('source_url'),
-                item.get('found_by')
-
-            )
-            cursor.execute(sql, parameters)
-            log.msg('[ADDED] %s at %s EST' % (item['description'], datetime.now(timezone('US/Eastern'))
-                    .strftime("%Y-%m-%d %H:%M:%S")), level=log.INFO)
-
-            # call make post-processing
-            make_id = None
+    def process_cars(self, cursor, site, items):
+        """ insert Cars """
+
+        # one car per id, the first one wins like the first insert did
+        cars = {}
+        for item in items:
+            if item.get('url_id') in cars:
+                log.msg("[WARNING] Multiple Checking - %s" % item['url_id'], level=log.INFO)
+            else:
+                cars[item.get('url_id')] = item
+
+        # check which Car's IDs are existed
+        for url_id in self.backend.existing_car_ids(cursor, site, list(cars)):
+            log.msg("[WARNING] Multiple Checking - %s" % url_id, level=log.INFO)
+            del cars[url_id]
+        if not cars:
+            return
+
+        # check which Car's Vins are existed, a car without vin is checked as an empty vin.
+        # the index answers, only vins hit by a hash are confirmed, all in one query
+        def confirm(vins):
+            return self.backend.find_vins(cursor, vins)
+
+        known_vins = self.vin_index.known([item.get('vin') for item in cars.itervalues()], confirm)
+
+        # Vin is duplicated, then the target table is _history, otherwise _cars
+        targets = {'_cars': [], '_history': []}
+        for url_id in sorted(cars):
+            item = cars[url_id]
+            vin = normalize_vin(item.get('vin'))
+            if vin in known_vins:
+                targets['_history'].append(item)
+            else:
+                targets['_cars'].append(item)
+                # a later car of the same vin is a duplicate of this one
+                if vin:
+                    known_vins.add(vin)
+
+        columns = [column for column, field in CAR_COLUMNS]
+        for target_table, rows in targets.iteritems():
+            if not rows:
+                continue
+            # joining site and target_table to choose correct data table and then insert the new Cars
+            self.backend.insert_cars(cursor, site, target_table, columns,
+                                     [[item.get(field) for column, field in CAR_COLUMNS] for item in rows])
+
+        for item in targets['_cars']:
+            self.vin_index.add(item.get('vin'))
+
+        # make & model post-processing, the unseen ones are held to manually process later
+        holds = self.make_models.batch()
+        for url_id in sorted(cars):
+            item = cars[url_id]
+            log.msg('[ADDED] %s at %s EST' % (item['description'], now_est()), level=log.INFO)
+
+            make_ref = None
             if item.get('make') != "":
-                make_id = process_make(cursor, item.get('make'))
+                make = urllib.unquote_plus(item.get('make'))
+                status, make_ref = holds.make(make)
+                if status != 'HELD':
+                    log.msg('[%s] make - %s' % (status, make), level=log.INFO)
 
-            if item.get('model') != "" and make_id is not None:
-                process_model(cursor, item.get('model'), make_id)
-        else:
-            log.msg("[WARNING] Multiple Checking - %s" % item['url_id'], level=log.INFO)    
+            # like before, the model of an already held make is not processed
+            if item.get('model') != "" and make_ref is not None:
+                model = urllib.unquote_plus(item.get('model'))
+                status = holds.model(model, make_ref)
+                if status != 'HELD':
+                    log.msg('[%s] model - %s' % (status, model), level=log.INFO)
 
-    def process_vin(self, cursor, item):
-        """ update vin """
+        holds.flush(cursor)
 
-        if item.get('vin', None) is not None: 
-            sql = "".join(("update ", item.get('site'), "_cars use index(idx_vin) set vin = %s where id = %s limit 1;"))
-            parameters = (item.get('vin'), item.get('url_id'))
+    def process_vins(self, cursor, site, items):
+        """ update vins """
 
-            cursor.execute(sql, parameters)
-            cursor.execute("commit;")
+        vins = dict((item.get('url_id'), item.get('vin')) for item in items)
+        ids = sorted(vins)
 
-            log.msg('[UPDATED VIN] %s - %s - %s at %s EST' % (item.get('site'), item.get('url_id'), item.get('vin'), datetime.now(timezone('US/Eastern'))
-                        .strftime("%Y-%m-%d %H:%M:%S")), level=log.INFO)
-        else:
-            print item
+        self.backend.update_vins(cursor, site, [(url_id, vins[url_id]) for url_id in ids])
+
+        for url_id in ids:
+            log.msg('[UPDATED VIN] %s - %s - %s at %s EST' % (site, url_id, vins[url_id], now_est()), level=log.INFO)
+
+    def process_vin_failures(self, cursor, site, items):
+        """ record the failed vin lookups, their ids are handed out again after VIN_RETRY_HOURS per attempt """
+
+        ids = sorted(set(item.get('url_id') for item in items))
+        self.backend.record_vin_failures(cursor, site, ids, VIN_RETRY_HOURS)
+
+        for url_id in ids:
+            log.msg('[NO VIN] %s - %s at %s EST' % (site, url_id, now_est()), level=log.INFO)
 
     def handle_error(self, e):
         """
             rasing errors
         """
         log.err(e)
+
+
+class AsyncMySQLPipeline(MySQLPipeline):
+    """ MySQLPipeline on a non-blocking MySQL client running in the reactor, enabled in place of it in ITEM_PIPELINES.
+
+        The statements of a group commit are sent back to back on one connection, without waiting for the
+        previous answers and without any thread hop. No statement of a group reads a result back: Cars go
+        to a staging table and are merged by set-based statements like SpoolPipeline does, so the VIN index
+        and the make & model cache are not loaded. MySQL only, the pipeline ignores STORAGE_BACKEND.
+    """
+
+    def __init__(self, stats=None):
+        # the MySQL modules are only imported by the pipelines using them, MySQLdb is not needed with sqlite
+        from fatech_production.storage.mysql import MySQLBackend
+        super(AsyncMySQLPipeline, self).__init__(stats, MySQLBackend())
+
+    def connection_pool(self):
+        from fatech_production.storage.mysqlprotocol import MySQLProtocolPool
+        return MySQLProtocolPool()
+
+    def open_spider(self, spider):
+        self.spider = spider
+        self.backend.migrate()
+        self.open_journal()
+
+    def process_cars(self, cursor, site, items):
+        """ insert Cars through a staging table, the first car of an id wins """
+
+        staging = "".join(("staging_", site, "_cars"))
+        columns = [column for column, field in CAR_COLUMNS]
+        query_stats.execute(cursor, 'cars.staging', "".join(("create temporary table if not exists ", staging, " like ", site, "_cars;")))
+        query_stats.execute(cursor, 'cars.staging', "".join(("delete from ", staging, ";")))
+
+        sql = self.backend.insert_ignore(staging, ", ".join(columns), "values " + placeholders(len(items), len(columns))) + ";"
+        parameters = []
+        for item in items:
+            parameters.extend(item.get(field) for column, field in CAR_COLUMNS)
+        query_stats.execute(cursor, 'cars.staging', sql, parameters)
+
+        for label, sql, message in merge_cars_statements(site, staging, ", ".join(columns)):
+            d = query_stats.execute(cursor, label, sql)
+            if message is not None:
+                d.addCallback(self.merged, message)
+
+    def merged(self, result, message):
+        if result.rowcount:
+            log.msg(message % result.rowcount, level=log.INFO)
+        return result
+
+
+class SpoolPipeline(object):
+    """ Bulk mode of MySQLPipeline for high-volume runs, enabled in place of it in ITEM_PIPELINES.
+
+        Links and Cars are appended to local TSV spools per site table, which never waits for MySQL.
+        A spool holding PIPELINE_SPOOL_MAX_BYTES is rotated and loaded in the background with
+        LOAD DATA LOCAL INFILE into a staging table, then merged into <site>_urls, <site>_cars and
+        <site>_history by set-based statements, one spool at a time.
+        A spool is deleted once merged. A failed one stays in PIPELINE_SPOOL_DIR and is replayed by the next run.
+        Vins are not spooled, the vin spider keeps MySQLPipeline.
+        LOAD DATA is MySQL only, the pipeline ignores STORAGE_BACKEND.
+    """
+
+    def __init__(self, stats=None):
+        """ initialize a MySQL connection object allowed to load local files """
+
+        from fatech_production.storage.mysql import MySQLBackend
+        self.dbpool = MySQLBackend().connection_pool(local_infile=1)
+        self.stats = stats
+        # (site, table) -> SpoolWriter
+        self.writers = {}
+        # paths of the spools ready to be loaded
+        self.ready = deque()
+        # deferred of the running load
+        self.loading = None
+        # fired once every spool is loaded after the spider is closed
+        self.closing = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def open_spider(self, spider):
+        """ replay the spools left by previous runs """
+
+        self.spider = spider
+        if not os.path.isdir(PIPELINE_SPOOL_DIR):
+            os.makedirs(PIPELINE_SPOOL_DIR)
+        for path in recover_spools(PIPELINE_SPOOL_DIR):
+            log.msg('[SPOOL REPLAY] %s' % path, level=log.INFO)
+            self.enqueue(path)
+
+    def close_spider(self, spider):
+        """ rotate and load every spool, the spider is closed once they are merged """
+
+        for writer in self.writers.itervalues():
+            path = writer.rotate()
+            if path is not None:
+                self.enqueue(path)
+
+        self.closing = defer.Deferred()
+        self.check_closed()
+        return self.closing
+
+    def process_item(self, item, spider):
+        """ default pipeline's method to process scraped items """
+
+        if isinstance(item, Link):
+            self.spool(item.get('site'), 'urls', (item.get('url_id'), item.get('url'), item.get('status')))
+        elif isinstance(item, Car):
+            item = sanitized(item)
+            item['found_by'] = spider.name
+            self.spool(item.get('site'), 'cars', [item.get(field) for column, field in CAR_COLUMNS])
+        return item
+
+    def spool(self, site, table, values):
+        """ append a row to the spool of its site table """
+
+        writer = self.writers.get((site, table))
+        if writer is None:
+            writer = self.writers[(site, table)] = SpoolWriter(PIPELINE_SPOOL_DIR, site, table, PIPELINE_SPOOL_MAX_BYTES)
+        path = writer.write(values)
+        if self.stats is not None:
+            self.stats.inc_value('spool/%s_rows' % table, spider=self.spider)
+        if path is not None:
+            self.enqueue(path)
+
+    def enqueue(self, path):
+        self.ready.append(path)
+        self.load_next()
+
+    def load_next(self):
+        """ load the oldest ready spool unless one is loading """
+
+        if self.loading is not None or not self.ready:
+            return
+        path = self.ready.popleft()
+        self.loading = self.dbpool.runInteraction(self.load_spool, path)
+        self.loading.addCallbacks(self.spool_loaded, self.spool_failed, callbackArgs=(path, default_timer()),
+                                  errbackArgs=(path,))
+        self.loading.addBoth(self.load_done)
+
+    def spool_loaded(self, result, path, started):
+        os.remove(path)
+        log.msg('[SPOOL LOADED] %s' % path, level=log.INFO)
+        if self.stats is not None:
+            self.stats.inc_value('spool/loaded', spider=self.spider)
+            self.stats.inc_value('spool/load_ms', int((default_timer() - started) * 1000.0), spider=self.spider)
+
+    def spool_failed(self, failure, path):
+        log.msg('[SPOOL FAILED] %s - kept to be replayed by the next run' % path, level=log.ERROR)
+        log.err(failure)
+        if self.stats is not None:
+            self.stats.inc_value('spool/failed', spider=self.spider)
+
+    def load_done(self, result):
+        self.loading = None
+        self.load_next()
+        self.check_closed()
+
+    def check_closed(self):
+        """ fire closing once the spider is closed and every spool is loaded """
+
+        if self.closing is not None and self.loading is None and not self.ready and not self.closing.called:
+            self.closing.callback(None)
+
+    def load_spool(self, cursor, path):
+        """ load a spool into a staging table and merge it, in one transaction """
+
+        site, table = parse_name(path)
+        staging = "".join(("staging_", site, "_", table))
+
+        if table == 'urls':
+            # no key, every status of an id is kept until the merge
+            cursor.execute("".join(("create temporary table if not exists ", staging,
+                                    " (id int not null, url varchar(255), status char(1));")))
+            columns = "id, url, status"
+            duplicates = ""
+        else:
+            cursor.execute("".join(("create temporary table if not exists ", staging, " like ", site, "_cars;")))
+            columns = ", ".join(column for column, field in CAR_COLUMNS)
+            # the first car of an id wins, like the first insert did
+            duplicates = "ignore "
+        cursor.execute("".join(("truncate table ", staging, ";")))
+
+        sql = "".join(("load data local infile %s ", duplicates, "into table ", staging, " character set utf8 (", columns, ");"))
+        query_stats.execute(cursor, 'spool.load_' + table, sql, (os.path.abspath(path),))
+
+        with query_stats.timed('spool.merge_' + table):
+            if table == 'urls':
+                self.merge_urls(cursor, site, staging)
+            else:
+                self.merge_cars(cursor, site, staging, columns)
+        cursor.execute("".join(("drop temporary table ", staging, ";")))
+
+    def merge_urls(self, cursor, site, staging):
+        """ insert & update URLs from the staging table, a known URL only ever moves from E to S """
+
+        urls = site + "_urls"
+        cursor.execute("".join(("insert into ", urls, " (id, url, status) select id, min(url), max(status) from ", staging,
+                                " group by id order by id on duplicate key update status = if(values(status) = 'S', 'S', ",
+                                urls, ".status);")))
+        log.msg('[MERGED] %s - %s rows' % (urls, cursor.rowcount), level=log.INFO)
+
+    def merge_cars(self, cursor, site, staging, columns):
+        """ insert the new Cars of the staging table into _cars, or _history when their vin is in master_vin """
+
+        for label, sql, message in merge_cars_statements(site, staging, columns):
+            query_stats.execute(cursor, label, sql)
+            if message is not None and cursor.rowcount:
+                log.msg(message % cursor.rowcount, level=log.INFO)
+
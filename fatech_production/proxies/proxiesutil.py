@@ -5,14 +5,13 @@
 #######################################
 
 # Python imports
-import MySQLdb
-import MySQLdb.cursors
 import sys
 from datetime import datetime
 from datetime import timedelta
 
 # Custom imports
 from fatech_production.settings import *
+from fatech_production.storage import get_backend
 
 class ProxiesUtil(object):
 
@@ -20,19 +19,9 @@ class ProxiesUtil(object):
         pass
 
     def get_mysql_connection(self):
-        """ return a mysql connection """
-
-        connection = MySQLdb.connect(
-            host=DATABASE_HOST,
-            port=DATABASE_PORT,
-            db=DATABASE_NAME,
-            user=DATABASE_USER,
-            passwd=DATABASE_PASSWORD,
-            cursorclass=MySQLdb.cursors.DictCursor,
-            charset='utf8',
-            use_unicode=True
-        )
-        return connection
+        """ return a connection of the storage backend """
+
+        return get_backend().connect()
 
     def get_third_octet(self, proxy):
         """
@@ -124,7 +113,7 @@ class ProxiesUtil(object):
         for row in rows:
             if row['updated_at'] < old_time:
                 cursor.execute(\
-                    "update third_octets set status = 'A' where id = %s limit 1;", (str(row['id']))
+                    "update third_octets set status = 'A' where id = %s;", (str(row['id']))
                 )
         cursor.execute("commit;")
         cursor.close()
@@ -147,17 +136,9 @@ class ProxiesUtil(object):
         connection.close()
 
     def get_proxy(self):
-        connection = self.get_mysql_connection()
-        cursor = connection.cursor()
-        cursor.execute("select proxy from master_proxies order by rand() limit 1;")
-        try:
-            proxy = cursor.fetchone()['proxy']
-        except:
-            proxy = ""
-        cursor.close()
-        connection.close()
+        """ a random proxy, an empty string if there is none """
 
-        return proxy
+        return get_backend().get_proxy()
 
 if __name__ == "__main__":
     argv = sys.argv
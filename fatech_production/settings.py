@@ -6,6 +6,8 @@
 #     http://doc.scrapy.org/en/latest/topics/settings.html
 #
 
+import os
+
 BOT_NAME = 'fatech_production'
 # delay time
 #DOWNLOAD_DELAY = 0.5
@@ -28,7 +30,7 @@ SPIDER_MODULES = ['fatech_production.spiders']
 NEWSPIDER_MODULE = 'fatech_production.spiders'
 
 # Scrapy's pipelines to process scraped items among spiders
-ITEM_PIPELINES = ['fatech_production.pipelines.MySQLPipeline', 'fatech_production.pipelines.DuplicatesPipeline']
+ITEM_PIPELINES = ['fatech_production.pipelines.DuplicatesPipeline', 'fatech_production.pipelines.MySQLPipeline']
 
 # production database info
 DATABASE_HOST = 'localhost'
@@ -37,6 +39,61 @@ DATABASE_NAME = 'spiderweb01'
 DATABASE_USER = 'root'
 DATABASE_PASSWORD = 'root'
 
+# database of the crawler: 'mysql' in production, 'sqlite' for local runs and benchmarks without a server
+STORAGE_BACKEND = 'mysql'
+# database file of the sqlite backend
+SQLITE_PATH = 'spiderweb01.sqlite'
+
+# connections of the process-wide pool of DatabaseUtil, ProxiesUtil and the settings classes
+DATABASE_POOL_SIZE = 5
+# seconds to wait for a released connection when the pool is exhausted
+DATABASE_POOL_TIMEOUT = 30
+# seconds a connection may stay idle before it is pinged on reuse
+DATABASE_POOL_PING_AFTER = 60
+# seconds the non-blocking MySQL client of AsyncMySQLPipeline waits for the server before it drops the connection
+DATABASE_QUERY_TIMEOUT = 60
+
+# seconds before the in-process make/model catalog is reloaded from year_make_model
+CATALOG_TTL = 6 * 3600
+# maximum number of descriptions whose year, make, model, trim are memoized
+YMMT_CACHE_SIZE = 50000
+
+# maximum rows of a multi-row statement of MySQLPipeline
+PIPELINE_BATCH_SIZE = 500
+# items buffered by MySQLPipeline before they are committed in one transaction
+PIPELINE_COMMIT_ITEMS = 1000
+# durability bound: milliseconds an item may stay buffered before its group commit starts
+PIPELINE_COMMIT_INTERVAL = 2000
+# items buffered or committing before MySQLPipeline holds the next items back, keep it above PIPELINE_COMMIT_ITEMS
+PIPELINE_MAX_PENDING = 5000
+# crash journal of MySQLPipeline: items are journaled before they are sent, the unacknowledged ones are replayed
+# by the next run, from the journal directory of the project whatever the working directory of the crawl.
+# None to disable it. Size at which a journal segment is rotated
+PIPELINE_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'journal')
+PIPELINE_JOURNAL_MAX_BYTES = 64 * 1024 * 1024
+
+# SpoolPipeline, the bulk mode of MySQLPipeline: directory of the TSV spools and size at which they are loaded
+PIPELINE_SPOOL_DIR = 'spool'
+PIPELINE_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+# directory of the bitmaps of the ids stored with status S, which spiders skip on the next runs.
+# None to not persist them: DuplicatesPipeline then only drops the duplicated Cars of a run and no id is skipped
+DUPLICATES_DIR = None
+
+# hours before the id of a failed vin lookup is handed out again, multiplied by its number of failed attempts
+VIN_RETRY_HOURS = 24
+# failed vin lookups after which an id is not handed out anymore
+VIN_MAX_ATTEMPTS = 5
+
+# query labels of the highest total time logged when a spider is closed
+QUERY_STATS_TOP = 10
+
+# Scrapy's extensions
+EXTENSIONS = {
+    # publish spiderutil counters into Scrapy stats
+    'fatech_production.extensions.SpiderUtilStats': 500,
+    }
+
 # which spider should use WEBKIT
 #SELENIUM_DOWNLOADER =['autotrader_recon,']
 
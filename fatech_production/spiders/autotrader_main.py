@@ -26,6 +26,7 @@ from scrapy.http import Request
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.misc.spiderutil import *
+from fatech_production.parsers.autotrader import AutoTraderParser
 from fatech_production.templates.mainspider import MainSpider
 
 class AutoTraderMainSpider(MainSpider):
@@ -33,6 +34,7 @@ class AutoTraderMainSpider(MainSpider):
 
     name = 'autotrader_main'
     allowed_domains = ['www.autotrader.com']
+    parser = AutoTraderParser()
 
     def __init__(self, **kwargs):
         """
@@ -49,12 +51,3 @@ class AutoTraderMainSpider(MainSpider):
 
         #self.driver = webdriver.PhantomJS()
         #self.driver = webdriver.Firefox()
-
-    def parse(self, response):
-        """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
-        """
-        # Reuse the method of Carlocate Recon Spider
-        from autotrader_recon import AutoTraderReconSpider
-        return AutoTraderReconSpider().parse(response)
-    
\ No newline at end of file
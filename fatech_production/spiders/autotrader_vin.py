@@ -9,6 +9,7 @@ from __future__ import with_statement
 import re
 import sys
 import time
+from functools import partial
 from datetime import datetime
 from pytz import timezone
 from array import array
@@ -27,16 +28,21 @@ from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.items import Vin
 from fatech_production.misc.spiderutil import *
+from fatech_production.parsers.autotrader import AutoTraderVinParser
 from fatech_production.misc.spidersettings import RecheckSpiderSettings
 from fatech_production.templates.recheckspider import RecheckSpider
 
 from fatech_production.misc.dbutil import DatabaseUtil
 
+# statuses of a vin page whose listing is gone
+VIN_MISSING_STATUSES = (404, 410)
+
 class AutoTraderVinSpider(RecheckSpider):
     """ Vin spider class which inherites ReconSpider template """
 
     name = 'autotrader_vin'
     allowed_domains = ['www.autotrader.com']
+    parser = AutoTraderVinParser()
 
     def __init__(self, **kwargs):
         """
@@ -67,25 +73,25 @@ class AutoTraderVinSpider(RecheckSpider):
         
         # Send URL requests
         for id in url_ids:
-            req = Request("".join((self.base_url, str(id))), dont_filter=True, callback=self.parse)
+            req = Request("".join((self.base_url, str(id))), dont_filter=True, callback=self.parse,
+                          errback=partial(self.vin_failed, url_id=id))
             # save url_id for calling back
             req.meta['url_id'] = id
             yield req
 
-    def parse(self, response):
-        """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
+    def vin_failed(self, failure, url_id):
+        """ a vin page answered as gone is a failed attempt, like a page without vin. a download error
+            (timeout, dns, refused connection, proxy) is not: the id is handed out again by the next run
         """
 
-        hxs = HtmlXPathSelector(response)
+        # the HttpError of a status outside handle_httpstatus_list carries its response
+        response = getattr(failure.value, 'response', None)
+        if response is None or response.status not in VIN_MISSING_STATUSES:
+            log.msg('[VIN ERROR] %s - %s' % (url_id, failure.getErrorMessage()), level=log.INFO)
+            return []
 
+        log.msg('[VIN FAILED] %s - %s' % (url_id, failure.getErrorMessage()), level=log.INFO)
         vin = Vin()
-
         vin['site'] = self.site
-        vin['url_id'] = response.request.meta['url_id']
-        try:
-            vin['vin'] = hxs.select('//div[@id="vdp-main-vin"]/div[@class="value ui-block-b"]/text()').extract()[0].strip()
-        except:
-            pass
-        return vin
-        
\ No newline at end of file
+        vin['url_id'] = url_id
+        return [vin]
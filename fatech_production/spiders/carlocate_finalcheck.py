@@ -26,6 +26,7 @@ from scrapy.http import Request
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.misc.spiderutil import *
+from fatech_production.parsers.carlocate import CarlocateParser
 from fatech_production.templates.finalcheckspider import FinalcheckSpider
 
 class CarlocateFinalcheckSpider(FinalcheckSpider):
@@ -33,6 +34,7 @@ class CarlocateFinalcheckSpider(FinalcheckSpider):
 
     name = 'carlocate_finalcheck'
     allowed_domains = ['www.carlocate.com']
+    parser = CarlocateParser()
 
     def __init__(self, **kwargs):
         """
@@ -45,12 +47,3 @@ class CarlocateFinalcheckSpider(FinalcheckSpider):
         self.base_url = "http://www.carlocate.com/Pages/VehicleDetail.aspx?id="
 
         super(CarlocateFinalcheckSpider, self).__init__(site=self.site, base_url=self.base_url)
-        
-    def parse(self, response):
-        """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
-        """
-        # Reuse the method of Carlocate Recon Spider
-        from carlocate_recon import CarlocateReconSpider
-        return CarlocateReconSpider().parse(response)
-    
\ No newline at end of file
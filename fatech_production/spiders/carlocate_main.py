@@ -26,6 +26,7 @@ from scrapy.http import Request
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.misc.spiderutil import *
+from fatech_production.parsers.carlocate import CarlocateParser
 from fatech_production.templates.mainspider import MainSpider
 
 class CarlocateMainSpider(MainSpider):
@@ -33,6 +34,7 @@ class CarlocateMainSpider(MainSpider):
 
     name = 'carlocate_main'
     allowed_domains = ['www.carlocate.com']
+    parser = CarlocateParser()
 
     def __init__(self, **kwargs):
         """
@@ -46,12 +48,3 @@ class CarlocateMainSpider(MainSpider):
         self.base_url = "http://www.carlocate.com/Pages/VehicleDetail.aspx?id="
 
         super(CarlocateMainSpider, self).__init__(site=self.site, base_url=self.base_url)
-
-    def parse(self, response):
-        """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
-        """
-        # Reuse the method of Carlocate Recon Spider
-        from carlocate_recon import CarlocateReconSpider
-        return CarlocateReconSpider().parse(response)
-    
\ No newline at end of file
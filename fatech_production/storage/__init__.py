@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+#######################################
+### Storage backends
+#######################################
+
+# Custom imports
+from fatech_production.settings import *
+
+# the backend of the process, created on first use
+backend = None
+
+def get_backend():
+    """ the storage backend named by STORAGE_BACKEND, shared by the pipelines and the utilities """
+
+    global backend
+    if backend is None:
+        if STORAGE_BACKEND == 'sqlite':
+            from fatech_production.storage.sqlite import SQLiteBackend
+            backend = SQLiteBackend()
+        elif STORAGE_BACKEND == 'mysql':
+            from fatech_production.storage.mysql import MySQLBackend
+            backend = MySQLBackend()
+        else:
+            raise ValueError('unknown STORAGE_BACKEND %r' % STORAGE_BACKEND)
+    return backend
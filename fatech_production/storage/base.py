@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+
+#######################################
+### Storage backend interface
+#######################################
+
+# Python imports
+from array import array
+
+# Custom imports
+from fatech_production.misc.querystats import query_stats
+
+class StorageBackend(object):
+    """ Every read and write of the crawler to its database.
+
+        Operations which get a cursor run inside a transaction of their caller (the interactions of the
+        pipelines), the other ones borrow a connection of connect() and commit their own writes.
+        Statements are written with %s markers and the MySQL index hints, a backend of another
+        dialect translates them in its cursors and overrides the dialect hooks below.
+    """
+
+    # name of the backend in STORAGE_BACKEND
+    name = ''
+    # most parameters of a statement, None when only the packet size bounds it
+    max_parameters = None
+    # the tables added over the original schema are created, see migrate()
+    migrated = False
+
+    ### connections
+
+    def connect(self):
+        """ a connection for synchronous use, close() it when done """
+
+        raise NotImplementedError
+
+    def connection_pool(self, **kwargs):
+        """ a twisted adbapi ConnectionPool for the pipelines """
+
+        raise NotImplementedError
+
+    def migrate(self):
+        """ create the tables added over the original schema, once per process.
+            DDL commits implicitly in MySQL, so it never runs inside the transactions of the pipelines
+        """
+
+        if self.migrated:
+            return
+        connection = self.connect()
+        cursor = connection.cursor()
+        self.create_vin_attempts(cursor)
+        connection.commit()
+        cursor.close()
+        connection.close()
+        self.migrated = True
+
+    def connection_stats(self):
+        """ counters of the connections of connect(), published as dbpool/* stats """
+
+        return {}
+
+    def transient(self, error):
+        """ True for an error the same statements may not hit again: a lost connection, a deadlock...
+            a group failing with it is not split, its items are kept for a retry
+        """
+
+        return False
+
+    ### dialect hooks
+
+    def hint(self, index):
+        """ index hint following a table name """
+
+        return " use index(%s)" % index
+
+    def same(self, field):
+        """ null-safe equality of a field and a parameter """
+
+        return field + " <=> %s"
+
+    def recent(self, column):
+        """ condition of a datetime column within the last %s days """
+
+        return column + " between DATE_SUB(NOW(), INTERVAL %s DAY) and NOW()"
+
+    def random(self):
+        """ random order function """
+
+        return "rand()"
+
+    def upsert_urls_suffix(self, table):
+        """ on conflict clause of the insert of URLs: a known URL only ever moves from E to S """
+
+        return " on duplicate key update status = if(values(status) = 'S', 'S', status)"
+
+    def insert_ignore(self, table, columns, values):
+        """ insert skipping the rows whose id is already in the table """
+
+        return "".join(("insert into ", table, " (", columns, ") ", values, " on duplicate key update ", table, ".id = ", table, ".id"))
+
+    def now(self):
+        """ current datetime of the database """
+
+        return "NOW()"
+
+    def hours_later(self, hours):
+        """ datetime hours from now """
+
+        return "DATE_ADD(NOW(), INTERVAL %d HOUR)" % int(hours)
+
+    def update_vins_from_staging(self, site):
+        """ set the vin of the Cars of the staging table in one joined update """
+
+        return "".join(("update ", site, "_cars c join staging_vins s on s.id = c.id set c.vin = s.vin;"))
+
+    def upsert_vin_attempts_suffix(self, hours):
+        """ on conflict clause of a failed vin attempt: count it and push retry_after back by hours per attempt.
+            MySQL assigns left to right, attempts is the new count in retry_after
+        """
+
+        return "".join((" on duplicate key update attempts = attempts + 1, retry_after = DATE_ADD(NOW(), INTERVAL ",
+                        str(int(hours)), " * attempts HOUR)"))
+
+    def create_vin_attempts(self, cursor):
+        """ create master_vin_attempts if needed, the failed vin lookups of every site """
+
+        query_stats.execute(cursor, 'vins.create_attempts', "".join((
+            "create table if not exists master_vin_attempts (site varchar(64) not null, id int not null, ",
+            "attempts int not null default 0, retry_after datetime not null, primary key (site, id), ",
+            "key idx_retry_after (site, retry_after)) engine=InnoDB default charset=utf8;")))
+
+    def create_site_tables(self, cursor, site):
+        """ create the _cars, _history, _urls tables of a new website from the templates """
+
+        query_stats.execute(cursor, 'settings.create_tables', "".join(("create table ", site, "_cars like template_cars;")))
+        query_stats.execute(cursor, 'settings.create_tables', "".join(("create table ", site, "_history like template_cars;")))
+        query_stats.execute(cursor, 'settings.create_tables', "".join(("create table ", site, "_urls like template_urls;")))
+
+    def batches(self, rows, width):
+        """ split rows of width parameters into statements within max_parameters """
+
+        if self.max_parameters is None:
+            return [rows]
+        size = max(1, self.max_parameters // width)
+        return [rows[start:start + size] for start in xrange(0, len(rows), size)]
+
+    ### url, car, history & vin writes
+
+    def write_urls(self, cursor, site, rows):
+        """ insert & update URLs, rows of (id, url, status) """
+
+        table = site + "_urls"
+        for batch in self.batches(rows, 3):
+            sql = "".join(("insert into ", table, " (id, url, status) values ", placeholders(len(batch), 3),
+                           self.upsert_urls_suffix(table), ";"))
+            parameters = []
+            for row in batch:
+                parameters.extend(row)
+            query_stats.execute(cursor, 'urls.upsert', sql, parameters)
+
+    def existing_car_ids(self, cursor, site, ids):
+        """ the ids of ids which are already in _cars """
+
+        existing = set()
+        for batch in self.batches(list(ids), 1):
+            sql = "".join(("select id from ", site, "_cars where id in (", ", ".join(["%s"] * len(batch)), ");"))
+            query_stats.execute(cursor, 'cars.exists', sql, batch)
+            existing.update(row['id'] for row in cursor.fetchall())
+        return existing
+
+    def find_vins(self, cursor, vins):
+        """ the vins of vins which are in master_vin """
+
+        found = []
+        for batch in self.batches(list(vins), 1):
+            sql = "".join(("select VIN from master_vin", self.hint("Idx_VIN"), " where VIN in (", ", ".join(["%s"] * len(batch)), ");"))
+            query_stats.execute(cursor, 'vin.lookup', sql, batch)
+            found.extend(row['VIN'] for row in cursor.fetchall())
+        return found
+
+    def insert_cars(self, cursor, site, target_table, columns, rows):
+        """ insert new Cars into _cars or _history, rows of the values of columns """
+
+        table = site + target_table
+        for batch in self.batches(rows, len(columns)):
+            sql = self.insert_ignore(table, ", ".join(columns), "values " + placeholders(len(batch), len(columns))) + ";"
+            parameters = []
+            for row in batch:
+                parameters.extend(row)
+            query_stats.execute(cursor, target_table.strip('_') + '.insert', sql, parameters)
+
+    def update_vins(self, cursor, site, pairs):
+        """ set the vin of Cars, pairs of (id, vin).
+            the pairs go to a staging table of the connection, then one joined update sets every vin,
+            and the failed attempts of those ids are forgotten
+        """
+
+        query_stats.execute(cursor, 'vins.staging',
+                            "create temporary table if not exists staging_vins (id int not null primary key, vin varchar(32));")
+        query_stats.execute(cursor, 'vins.staging', "delete from staging_vins;")
+        for batch in self.batches(pairs, 2):
+            sql = "".join(("insert into staging_vins (id, vin) values ", placeholders(len(batch), 2), ";"))
+            parameters = []
+            for pair in batch:
+                parameters.extend(pair)
+            query_stats.execute(cursor, 'vins.staging', sql, parameters)
+
+        query_stats.execute(cursor, 'vins.update', self.update_vins_from_staging(site))
+        query_stats.execute(cursor, 'vins.attempts_clear',
+                            "delete from master_vin_attempts where site = %s and id in (select id from staging_vins);", (site,))
+        query_stats.execute(cursor, 'vins.staging', "delete from staging_vins;")
+
+    def record_vin_failures(self, cursor, site, ids, hours):
+        """ count a failed vin lookup of ids, they are handed out again hours per failed attempt later """
+
+        for batch in self.batches(ids, 2):
+            sql = "".join(("insert into master_vin_attempts (site, id, attempts, retry_after) values ",
+                           ", ".join(["(%s, %s, 1, " + self.hours_later(hours) + ")"] * len(batch)),
+                           self.upsert_vin_attempts_suffix(hours), ";"))
+            parameters = []
+            for url_id in batch:
+                parameters.extend((site, url_id))
+            query_stats.execute(cursor, 'vins.attempts_record', sql, parameters)
+
+    ### settings
+
+    def initialize_settings(self, site):
+        """ create the master_settings row and the tables of a new website """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        sql = "".join(("select id from master_settings", self.hint("idx_site"), " where site = %s;"))
+        query_stats.execute(cursor, 'settings.exists', sql, (site,))
+        if cursor.fetchone() is None:
+            query_stats.execute(cursor, 'settings.insert', "insert into master_settings(site) values(%s);", (site,))
+            self.create_site_tables(cursor, site)
+            connection.commit()
+
+        cursor.close()
+        connection.close()
+
+    def load_settings(self, site, fields):
+        """ a dict of fields of the master_settings row of the site """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        sql = "".join(("select ", fields, " from master_settings", self.hint("idx_site"), " where site = %s;"))
+        query_stats.execute(cursor, 'settings.load', sql, (site,))
+        result = cursor.fetchone()
+
+        cursor.close()
+        connection.close()
+
+        return result
+
+    def write_settings(self, site, field, value):
+        """ update a field of the master_settings row of the site """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        sql = "".join(("update master_settings", self.hint("idx_site"), " set ", field, " = %s where site = %s;"))
+        query_stats.execute(cursor, 'settings.write', sql, (value, site))
+        connection.commit()
+
+        cursor.close()
+        connection.close()
+
+    def save_settings(self, site, changes, expected):
+        """ update several fields at once if the row still holds the expected values, returns True if it did """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        fields = sorted(changes)
+        sql = "".join(("update master_settings", self.hint("idx_site"), " set ", ", ".join(field + " = %s" for field in fields),
+                       " where site = %s and ", " and ".join(self.same(field) for field in fields), ";"))
+        parameters = [changes[field] for field in fields] + [site] + [expected[field] for field in fields]
+        query_stats.execute(cursor, 'settings.save', sql, parameters)
+        updated = cursor.rowcount > 0
+        connection.commit()
+
+        cursor.close()
+        connection.close()
+
+        return updated
+
+    def get_checking_page(self, site, old_days, block_size, last_id, status):
+        """ an array of the next block_size url_ids of the status inserted in the last old_days, after last_id in id order """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        # idx_status holds (status, id), the page is a range scan from last_id
+        sql = "".join(("select id from ", site, "_urls", self.hint("idx_status"), " where status = %s and id > %s and ",
+                       self.recent("inserted_at"), " order by id limit %s;"))
+        query_stats.execute(cursor, 'urls.page', sql, (status, int(last_id), int(old_days), int(block_size)))
+        url_ids = array('i', (row['id'] for row in cursor.fetchall()))
+
+        cursor.close()
+        connection.close()
+
+        return url_ids
+
+    def get_ids_for_vin(self, site, block_size, max_attempts):
+        """ an array of url_ids of the Cars without vin, skipping the ids whose last attempt failed
+            before their retry_after, and the ids which failed max_attempts times
+        """
+
+        self.migrate()
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        sql = "".join(("select c.id from ", site, "_cars c", self.hint("idx_vin"),
+                       " left join master_vin_attempts a on a.site = %s and a.id = c.id",
+                       " where c.vin is NULL and (a.id is NULL or (a.retry_after <= ", self.now(), " and a.attempts < %s)) limit %s;"))
+        query_stats.execute(cursor, 'cars.missing_vin', sql, (site, int(max_attempts), int(block_size)))
+        url_ids = array('i', (row['id'] for row in cursor.fetchall()))
+
+        cursor.close()
+        connection.close()
+
+        return url_ids
+
+    ### catalog
+
+    def get_all_models(self, make):
+        """ a tuple of the models of the make in year_make_model """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        sql = "".join(("select model from year_make_model", self.hint("idx_make"), " where make = %s;"))
+        query_stats.execute(cursor, 'catalog.models', sql, (make,))
+        all_models = tuple(row['model'] for row in cursor.fetchall())
+
+        cursor.close()
+        connection.close()
+
+        return all_models
+
+    def get_year_make_model(self):
+        """ a tuple of every (make, model) pair of year_make_model """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        query_stats.execute(cursor, 'catalog.pairs', "select distinct make, model from year_make_model;")
+        all_pairs = tuple((row['make'], row['model']) for row in cursor.fetchall())
+
+        cursor.close()
+        connection.close()
+
+        return all_pairs
+
+    ### proxies
+
+    def get_proxy(self):
+        """ a random proxy of master_proxies, an empty string if there is none """
+
+        connection = self.connect()
+        cursor = connection.cursor()
+
+        sql = "".join(("select proxy from master_proxies order by ", self.random(), " limit 1;"))
+        query_stats.execute(cursor, 'proxies.random', sql)
+        row = cursor.fetchone()
+
+        cursor.close()
+        connection.close()
+
+        return row['proxy'] if row else ""
+
+def placeholders(count, width):
+    """ build the values of a multi-row statement, count rows of width columns """
+
+    row = "(" + ", ".join(["%s"] * width) + ")"
+    return ", ".join([row] * count)
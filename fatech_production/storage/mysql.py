@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+#######################################
+### MySQL storage backend
+#######################################
+
+# Python imports
+from twisted.enterprise import adbapi
+from twisted.internet.error import ConnectError
+from twisted.internet.error import ConnectionClosed
+import MySQLdb
+import MySQLdb.cursors
+
+# Custom imports
+from fatech_production.settings import *
+from fatech_production.misc.dbpool import pool
+from fatech_production.storage.base import StorageBackend
+from fatech_production.storage.mysqlprotocol import MySQLError
+
+# error codes of a lost server, of a lock wait timeout and of a deadlock
+TRANSIENT_ERRORS = frozenset((2002, 2003, 2006, 2013, 2055, 1205, 1213))
+
+class MySQLBackend(StorageBackend):
+    """ The production database, synchronous work borrows connections of the process-wide pool """
+
+    name = 'mysql'
+
+    def connect(self):
+        return pool.get_connection()
+
+    def connection_pool(self, **kwargs):
+        return adbapi.ConnectionPool('MySQLdb',
+                                     host=DATABASE_HOST,
+                                     port=DATABASE_PORT,
+                                     db=DATABASE_NAME,
+                                     user=DATABASE_USER,
+                                     passwd=DATABASE_PASSWORD,
+                                     cursorclass=MySQLdb.cursors.DictCursor,
+                                     charset='utf8',
+                                     use_unicode=True,
+                                     **kwargs
+                                     )
+
+    def connection_stats(self):
+        return pool.get_stats()
+
+    def transient(self, error):
+        if isinstance(error, (ConnectError, ConnectionClosed)):
+            # the non-blocking client lost its connection
+            return True
+        return isinstance(error, (MySQLdb.OperationalError, MySQLError)) and bool(error.args) and error.args[0] in TRANSIENT_ERRORS
@@ -0,0 +1,558 @@
+#!/usr/bin/env python
+
+#######################################
+### Non-blocking MySQL client
+#######################################
+
+# Python imports
+import re
+import struct
+from hashlib import sha1
+from collections import deque
+from datetime import date
+from datetime import datetime
+from decimal import Decimal
+from twisted.internet import defer
+from twisted.internet import protocol
+from twisted.internet import reactor
+
+# Custom imports
+from fatech_production.settings import *
+
+# capability flags of the client
+CLIENT_LONG_PASSWORD = 1
+CLIENT_LONG_FLAG = 4
+CLIENT_CONNECT_WITH_DB = 8
+CLIENT_PROTOCOL_41 = 512
+CLIENT_TRANSACTIONS = 8192
+CLIENT_SECURE_CONNECTION = 32768
+CLIENT_PLUGIN_AUTH = 1 << 19
+CAPABILITIES = (CLIENT_LONG_PASSWORD | CLIENT_LONG_FLAG | CLIENT_CONNECT_WITH_DB | CLIENT_PROTOCOL_41 |
+                CLIENT_TRANSACTIONS | CLIENT_SECURE_CONNECTION | CLIENT_PLUGIN_AUTH)
+
+COM_QUIT = 1
+COM_QUERY = 3
+# utf8_general_ci, like charset='utf8' of MySQLdb
+UTF8_GENERAL_CI = 33
+BINARY_CHARSET = 63
+# a payload of this size continues in the next packet
+MAX_PACKET = 0xffffff
+NATIVE_PASSWORD = 'mysql_native_password'
+
+# column types of the text protocol converted like the DictCursor of MySQLdb does
+INTEGER_TYPES = frozenset((1, 2, 3, 8, 9, 13))
+FLOAT_TYPES = frozenset((4, 5))
+DECIMAL_TYPES = frozenset((0, 246))
+DATETIME_TYPES = frozenset((7, 12))
+DATE_TYPE = 10
+
+ESCAPES = {'\0': '\\0', '\n': '\\n', '\r': '\\r', '\\': '\\\\', "'": "\\'", '"': '\\"', '\x1a': '\\Z'}
+ESCAPED = re.compile('[\0\n\r\\\\\'"\x1a]')
+
+class MySQLError(Exception):
+    """ an ERR packet of the server, args are (code, message) like the errors of MySQLdb """
+
+def native_password(password, scramble):
+    """ answer of mysql_native_password to the scramble of the server """
+
+    if not password:
+        return ''
+    stage1 = sha1(password).digest()
+    stage2 = sha1(stage1).digest()
+    digest = sha1(scramble + stage2).digest()
+    return ''.join(chr(ord(a) ^ ord(b)) for a, b in zip(stage1, digest))
+
+def literal(value):
+    """ a parameter as a SQL literal, like MySQLdb escapes them """
+
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, long, Decimal)):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat(' ') if isinstance(value, datetime) else value.isoformat()
+    elif isinstance(value, unicode):
+        value = value.encode('utf-8')
+    else:
+        value = str(value)
+    return "'" + ESCAPED.sub(lambda match: ESCAPES[match.group()], value) + "'"
+
+def format_query(sql, parameters=None):
+    """ a statement with %s markers and its parameters as the bytes of COM_QUERY """
+
+    if isinstance(sql, unicode):
+        sql = sql.encode('utf-8')
+    if parameters is None:
+        return sql
+    if not isinstance(parameters, (list, tuple)):
+        # MySQLdb takes a single value for a single marker
+        parameters = (parameters,)
+    return sql % tuple(literal(value) for value in parameters)
+
+def read_length(data, pos):
+    """ a length-encoded integer at pos, returns (value, next pos), value is None for NULL """
+
+    first = ord(data[pos])
+    if first < 0xfb:
+        return first, pos + 1
+    if first == 0xfb:
+        return None, pos + 1
+    if first == 0xfc:
+        return struct.unpack('<H', data[pos + 1:pos + 3])[0], pos + 3
+    if first == 0xfd:
+        return struct.unpack('<I', data[pos + 1:pos + 4] + '\0')[0], pos + 4
+    return struct.unpack('<Q', data[pos + 1:pos + 9])[0], pos + 9
+
+def read_string(data, pos):
+    """ a length-encoded string at pos, returns (value, next pos) """
+
+    length, pos = read_length(data, pos)
+    if length is None:
+        return None, pos
+    return data[pos:pos + length], pos + length
+
+def read_error(payload):
+    """ MySQLError of an ERR packet """
+
+    code = struct.unpack('<H', payload[1:3])[0]
+    message = payload[9:] if payload[3:4] == '#' else payload[3:]
+    return MySQLError(code, message.decode('utf-8', 'replace'))
+
+def to_datetime(value):
+    if value.startswith('0000-00-00'):
+        return None
+    return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(microsecond=int((value[20:] + '000000')[:6]))
+
+def to_date(value):
+    if value.startswith('0000-00-00'):
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def to_unicode(value):
+    return value.decode('utf-8')
+
+def to_bytes(value):
+    return value
+
+def converter(column_type, charset):
+    """ the conversion of the text value of a column """
+
+    if column_type in INTEGER_TYPES:
+        return int
+    if column_type in FLOAT_TYPES:
+        return float
+    if column_type in DECIMAL_TYPES:
+        return Decimal
+    if column_type in DATETIME_TYPES:
+        return to_datetime
+    if column_type == DATE_TYPE:
+        return to_date
+    if charset == BINARY_CHARSET:
+        return to_bytes
+    return to_unicode
+
+class Result(object):
+    """ the answer to a statement: rows as dicts for a select, rowcount and lastrowid otherwise """
+
+    def __init__(self):
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+class Answer(object):
+    """ reads the packets answering one statement """
+
+    def __init__(self):
+        self.deferred = defer.Deferred()
+        self.result = Result()
+        # MySQLError of an ERR answer
+        self.error = None
+        # payload the client has to send before the answer goes on
+        self.reply = None
+        # (name, conversion) of the columns of a result set
+        self.columns = []
+        self.column_count = 0
+        self.read = self.read_first
+
+    def read_first(self, payload):
+        """ OK, ERR or the column count of a result set, returns True once the answer is complete """
+
+        first = payload[0]
+        if first == '\x00':
+            self.result.rowcount, pos = read_length(payload, 1)
+            self.result.lastrowid, pos = read_length(payload, pos)
+            return True
+        if first == '\xff':
+            self.error = read_error(payload)
+            return True
+        if first == '\xfb':
+            # the server asks for a local file, an empty one ends the statement
+            self.error = MySQLError(0, 'LOAD DATA LOCAL is not supported')
+            self.reply = ''
+            self.read = self.read_infile_end
+            return False
+        self.column_count = read_length(payload, 0)[0]
+        self.read = self.read_column
+        return False
+
+    def read_infile_end(self, payload):
+        return True
+
+    def read_column(self, payload):
+        pos = 0
+        # catalog, schema, table, org_table
+        for i in xrange(4):
+            pos = read_string(payload, pos)[1]
+        name, pos = read_string(payload, pos)
+        pos = read_string(payload, pos)[1]
+        # length of the fixed fields, then charset(2), column length(4), type(1)
+        pos += 1
+        charset = struct.unpack('<H', payload[pos:pos + 2])[0]
+        column_type = ord(payload[pos + 6])
+        self.columns.append((name.decode('utf-8'), converter(column_type, charset)))
+        if len(self.columns) == self.column_count:
+            self.read = self.read_columns_end
+        return False
+
+    def read_columns_end(self, payload):
+        self.read = self.read_row
+        return False
+
+    def read_row(self, payload):
+        if payload[0] == '\xfe' and len(payload) < 9:
+            return True
+        if payload[0] == '\xff':
+            # the statement failed while its rows were sent, a killed query for instance
+            self.error = read_error(payload)
+            return True
+        row = {}
+        pos = 0
+        for name, convert in self.columns:
+            value, pos = read_string(payload, pos)
+            row[name] = None if value is None else convert(value)
+        self.result.rows.append(row)
+        return False
+
+class MySQLProtocol(protocol.Protocol):
+    """ A connection speaking the client protocol of MySQL in the reactor.
+
+        Statements are sent as soon as they are queried, without waiting for the answers of the previous
+        ones (pipelining): the server answers them in order, each answer fires the Deferred of its statement.
+        Only mysql_native_password is supported.
+        When the server sends nothing for timeout seconds while the handshake or an answer is awaited,
+        the pending Deferreds fail and the connection is dropped.
+    """
+
+    def __init__(self, user, password, database, timeout=DATABASE_QUERY_TIMEOUT):
+        self.user = user
+        self.password = password
+        self.database = database
+        self.timeout = timeout
+        # DelayedCall of the timeout
+        self.timer = None
+        # fired with the protocol once authenticated
+        self.ready = defer.Deferred()
+        self.authenticated = False
+        # statements queried before the authentication
+        self.unsent = []
+        # Answer of the sent statements, oldest first
+        self.answers = deque()
+        self.data = ''
+        self.parts = []
+        self.sequence = 0
+        self.read = self.read_handshake
+
+    def connectionMade(self):
+        # the handshake is bounded like an answer
+        self.rearm()
+
+    def rearm(self):
+        """ restart the timeout while the handshake or an answer is awaited, stop it otherwise """
+
+        waiting = bool(self.answers) or not self.ready.called
+        if self.timer is not None and self.timer.active():
+            if waiting:
+                self.timer.reset(self.timeout)
+                return
+            self.timer.cancel()
+            self.timer = None
+        elif waiting and self.connected:
+            self.timer = reactor.callLater(self.timeout, self.timed_out)
+
+    def timed_out(self):
+        """ no answer within the timeout, the connection is dropped like a lost one """
+
+        self.timer = None
+        self.connected = 0
+        self.fail_pending(MySQLError(2013, 'Lost connection to MySQL server: no answer within %s seconds' % self.timeout))
+        if hasattr(self.transport, 'abortConnection'):
+            self.transport.abortConnection()
+        else:
+            self.transport.loseConnection()
+
+    def fail_pending(self, error):
+        """ fail the handshake if it is running and the Deferred of every sent statement """
+
+        if not self.ready.called:
+            self.ready.errback(error)
+        answers, self.answers = self.answers, deque()
+        for answer in answers:
+            answer.deferred.errback(error)
+
+    def dataReceived(self, data):
+        data = self.data + data
+        pos = 0
+        while len(data) - pos >= 4:
+            length = struct.unpack('<I', data[pos:pos + 3] + '\0')[0]
+            if len(data) - pos < 4 + length:
+                break
+            self.sequence = ord(data[pos + 3])
+            self.parts.append(data[pos + 4:pos + 4 + length])
+            pos += 4 + length
+            if length == MAX_PACKET:
+                continue
+            payload = ''.join(self.parts)
+            self.parts = []
+            self.read(payload)
+        self.data = data[pos:]
+        self.rearm()
+
+    def send_packet(self, payload, sequence):
+        """ send a payload, split in packets of at most MAX_PACKET bytes """
+
+        packets = []
+        while True:
+            part, payload = payload[:MAX_PACKET], payload[MAX_PACKET:]
+            packets.append(struct.pack('<I', len(part))[:3] + chr(sequence & 0xff) + part)
+            sequence += 1
+            if len(part) < MAX_PACKET:
+                break
+        self.transport.write(''.join(packets))
+
+    def read_handshake(self, payload):
+        """ answer the handshake of the server with the credentials """
+
+        if payload[0] == '\xff':
+            return self.fail(read_error(payload))
+
+        pos = payload.index('\0', 1) + 1 + 4
+        scramble = payload[pos:pos + 8]
+        pos += 9
+        capabilities = struct.unpack('<H', payload[pos:pos + 2])[0]
+        pos += 2
+        if len(payload) > pos:
+            capabilities |= struct.unpack('<H', payload[pos + 3:pos + 5])[0] << 16
+            scramble_length = ord(payload[pos + 5])
+            pos += 16
+            if capabilities & CLIENT_SECURE_CONNECTION:
+                length = max(13, scramble_length - 8)
+                scramble += payload[pos:pos + length].rstrip('\0')
+        if not capabilities & CLIENT_PROTOCOL_41 or not capabilities & CLIENT_SECURE_CONNECTION:
+            return self.fail(MySQLError(0, 'the server does not speak the protocol 4.1'))
+
+        flags = CAPABILITIES & (capabilities | CLIENT_LONG_PASSWORD)
+        if not self.database:
+            flags &= ~CLIENT_CONNECT_WITH_DB
+        auth = native_password(self.password, scramble[:20])
+        response = [struct.pack('<IIB', flags, MAX_PACKET, UTF8_GENERAL_CI), '\0' * 23, self.user, '\0', chr(len(auth)), auth]
+        if flags & CLIENT_CONNECT_WITH_DB:
+            response.extend((self.database, '\0'))
+        if flags & CLIENT_PLUGIN_AUTH:
+            response.extend((NATIVE_PASSWORD, '\0'))
+        self.send_packet(''.join(response), self.sequence + 1)
+        self.read = self.read_auth
+
+    def read_auth(self, payload):
+        """ OK, ERR, or a switch of the authentication method """
+
+        first = payload[0]
+        if first == '\x00':
+            self.authenticated = True
+            self.read = self.read_answer
+            for packet in self.unsent:
+                self.send_packet(packet, 0)
+            self.unsent = []
+            self.ready.callback(self)
+        elif first == '\xff':
+            self.fail(read_error(payload))
+        elif first == '\xfe' and payload[1:].split('\0', 1)[0] == NATIVE_PASSWORD:
+            scramble = payload[1:].split('\0', 1)[1].rstrip('\0')
+            self.send_packet(native_password(self.password, scramble[:20]), self.sequence + 1)
+        else:
+            self.fail(MySQLError(0, 'unsupported authentication method, the account needs %s' % NATIVE_PASSWORD))
+
+    def read_answer(self, payload):
+        """ a packet of the answer to the oldest sent statement """
+
+        answer = self.answers[0]
+        complete = answer.read(payload)
+        if answer.reply is not None:
+            self.send_packet(answer.reply, self.sequence + 1)
+            answer.reply = None
+        if complete:
+            self.answers.popleft()
+            if answer.error is not None:
+                answer.deferred.errback(answer.error)
+            else:
+                answer.deferred.callback(answer.result)
+
+    def query(self, sql):
+        """ send a statement, returns a Deferred fired with its Result """
+
+        if not self.connected:
+            # a write on a lost transport is dropped, its answer would never come
+            return defer.fail(MySQLError(2006, 'MySQL server has gone away'))
+        answer = Answer()
+        self.answers.append(answer)
+        self.rearm()
+        packet = chr(COM_QUERY) + sql
+        if self.authenticated:
+            self.send_packet(packet, 0)
+        else:
+            self.unsent.append(packet)
+        return answer.deferred
+
+    def execute(self, sql, parameters=None):
+        """ a statement written for MySQLdb, with %s markers """
+
+        return self.query(format_query(sql, parameters))
+
+    def fail(self, error):
+        """ an error of the handshake, the connection is closed """
+
+        if not self.ready.called:
+            self.ready.errback(error)
+        self.transport.loseConnection()
+
+    def close(self):
+        if self.connected:
+            self.send_packet(chr(COM_QUIT), 0)
+            self.transport.loseConnection()
+
+    def connectionLost(self, reason):
+        self.connected = 0
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        self.fail_pending(reason)
+
+class Transaction(object):
+    """ The statements of an interaction on one connection, in one transaction.
+        execute() returns a Deferred and never waits: the statements are pipelined, and the transaction is
+        only committed once every one of them is answered without error.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.sent = []
+
+    def execute(self, sql, parameters=None):
+        d = self.connection.execute(sql, parameters)
+        self.sent.append(d)
+        return d
+
+    def commit(self, result):
+        d = defer.DeferredList(self.sent, fireOnOneErrback=True, consumeErrors=True)
+        d.addCallback(lambda ignored: self.connection.query("commit;"))
+        d.addCallback(lambda ignored: result)
+        return d
+
+    def rollback(self, failure):
+        if isinstance(failure.value, defer.FirstError):
+            failure = failure.value.subFailure
+        if not self.connection.connected:
+            return failure
+        d = self.connection.query("rollback;")
+        d.addBoth(lambda ignored: failure)
+        return d
+
+class MySQLProtocolPool(object):
+    """ At most size connections of MySQLProtocol, with the runInteraction() of adbapi.
+        An interaction gets a Transaction instead of a cursor, and runs in the reactor thread:
+        it should only send statements, their answers come as Deferreds.
+    """
+
+    def __init__(self, size=1, host=DATABASE_HOST, port=DATABASE_PORT, user=DATABASE_USER, password=DATABASE_PASSWORD,
+                 database=DATABASE_NAME, timeout=DATABASE_QUERY_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.idle = []
+        # connections opened or opening
+        self.opened = 0
+        # Deferreds of the interactions waiting for a connection
+        self.waiting = deque()
+
+    def connect(self):
+        creator = protocol.ClientCreator(reactor, MySQLProtocol, self.user, self.password, self.database, self.timeout)
+        d = creator.connectTCP(self.host, self.port, timeout=self.timeout)
+        d.addCallback(lambda connection: connection.ready)
+        d.addErrback(self.connect_failed)
+        return d
+
+    def connect_failed(self, failure):
+        self.opened -= 1
+        return failure
+
+    def acquire(self):
+        """ a Deferred fired with an idle connection, a new one, or the next released one """
+
+        while self.idle:
+            connection = self.idle.pop()
+            if connection.connected:
+                return defer.succeed(connection)
+            # dropped while idle, by a restart or the wait_timeout of the server
+            self.opened -= 1
+        if self.opened < self.size:
+            self.opened += 1
+            return self.connect()
+        d = defer.Deferred()
+        self.waiting.append(d)
+        return d
+
+    def release(self, connection):
+        if not connection.connected:
+            # a lost connection, a waiting interaction opens a new one
+            self.opened -= 1
+            if self.waiting:
+                self.opened += 1
+                self.connect().chainDeferred(self.waiting.popleft())
+        elif self.waiting:
+            self.waiting.popleft().callback(connection)
+        else:
+            self.idle.append(connection)
+
+    def runInteraction(self, interaction, *args, **kw):
+        """ run interaction(transaction, *args, **kw), committed once its statements are answered """
+
+        d = self.acquire()
+        d.addCallback(self.run_interaction, interaction, args, kw)
+        return d
+
+    def run_interaction(self, connection, interaction, args, kw):
+        transaction = Transaction(connection)
+        transaction.execute("start transaction;")
+        d = defer.maybeDeferred(interaction, transaction, *args, **kw)
+        d.addCallback(transaction.commit)
+        d.addErrback(transaction.rollback)
+        d.addBoth(self.released, connection)
+        return d
+
+    def released(self, result, connection):
+        self.release(connection)
+        return result
+
+    def close(self):
+        """ close the idle connections """
+
+        idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
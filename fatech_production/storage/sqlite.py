@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+#######################################
+### SQLite storage backend
+#######################################
+
+# Python imports
+import re
+import sqlite3
+import threading
+from twisted.enterprise import adbapi
+
+# Custom imports
+from fatech_production.settings import *
+from fatech_production.misc.querystats import query_stats
+from fatech_production.storage.base import StorageBackend
+
+# DB-API module attributes, the module is given to adbapi by name
+apilevel = '2.0'
+threadsafety = 1
+
+# tables shared by every site, the site tables follow SITE_TABLES
+SCHEMA = """
+create table if not exists master_settings (
+    id integer primary key autoincrement,
+    site varchar(64) not null unique,
+    active char(1) not null default 'F',
+    block_size integer not null default 1000,
+    cycles integer not null default 0,
+    cycles_limit integer not null default 10,
+    overs integer not null default 0,
+    main_startid integer not null default 0,
+    recon_startid integer not null default 0,
+    recheck_active char(1) not null default 'F',
+    recheck_olddays integer not null default 7,
+    recheck_offset integer not null default 0,
+    finalcheck_olddays integer not null default 30,
+    finalcheck_offset integer not null default 0
+);
+create table if not exists master_vin (RowNum integer primary key autoincrement, VIN varchar(32) not null);
+create index if not exists master_vin_Idx_VIN on master_vin (VIN);
+create table if not exists master_makes_variations (id integer primary key autoincrement, make varchar(128) not null);
+create table if not exists master_makes_hold (id integer primary key autoincrement, make varchar(128) not null);
+create index if not exists master_makes_hold_idx_make on master_makes_hold (make);
+create table if not exists master_models_variations (id integer primary key autoincrement, model varchar(128) not null, fk_make integer);
+create table if not exists master_models_hold (id integer primary key autoincrement, model varchar(128) not null, fk_make varchar(16));
+create table if not exists year_make_model (id integer primary key autoincrement, `year` varchar(4), make varchar(128), model varchar(128));
+create index if not exists year_make_model_idx_make on year_make_model (make);
+create table if not exists master_proxies (id integer primary key autoincrement, proxy varchar(32) not null unique, third_octet varchar(3), account varchar(64));
+create table if not exists master_vin_attempts (
+    site varchar(64) not null,
+    id integer not null,
+    attempts integer not null default 0,
+    retry_after timestamp not null,
+    primary key (site, id)
+);
+create index if not exists master_vin_attempts_idx_retry_after on master_vin_attempts (site, retry_after);
+create table if not exists third_octets (
+    id integer primary key autoincrement,
+    third_octet varchar(3) not null unique,
+    status char(1) not null default 'A',
+    updated_at timestamp not null default current_timestamp
+);
+"""
+
+# the _cars, _history and _urls tables of a site, like template_cars and template_urls of MySQL
+SITE_TABLES = """
+create table if not exists %(site)s_cars (%(car_columns)s, inserted_at timestamp not null default current_timestamp);
+create index if not exists %(site)s_cars_idx_vin on %(site)s_cars (vin);
+create table if not exists %(site)s_history (%(car_columns)s, inserted_at timestamp not null default current_timestamp);
+create table if not exists %(site)s_urls (
+    id integer primary key,
+    url text,
+    status char(1) not null,
+    inserted_at timestamp not null default current_timestamp
+);
+create index if not exists %(site)s_urls_idx_status on %(site)s_urls (status, id);
+"""
+
+CAR_COLUMNS_DDL = ", ".join(["id integer primary key"] + ["%s text" % column for column in (
+    'description', '`year`', 'make', 'trim', 'model', 'price', 'bodystyle', 'exterior_color', 'interior_color', '`engine`',
+    'stock_id', 'vin', 'mileage', 'transmission', 'drive_type', 'doors', 'fuel', 'cab', 'stereo', 'dealer', 'street_number',
+    'street_name', 'city', 'state', 'zip_code', 'phone', 'source_url', 'found_by')])
+
+INDEX_HINT = re.compile(r'\s+use\s+index\s*\([^)]*\)', re.IGNORECASE)
+MARKER = re.compile(r'%[s%]')
+
+# translated statements, the pipelines repeat a few shapes
+translated = {}
+
+def translate(sql):
+    """ a statement written for MySQLdb in the dialect of sqlite3: ? markers, no index hints """
+
+    result = translated.get(sql)
+    if result is None:
+        result = MARKER.sub(lambda match: '?' if match.group() == '%s' else '%', INDEX_HINT.sub('', sql))
+        if len(translated) < 1000:
+            translated[sql] = result
+    return result
+
+def dict_factory(cursor, row):
+    """ rows as dicts, like the DictCursor of MySQLdb """
+
+    return dict((column[0], value) for column, value in zip(cursor.description, row))
+
+class Cursor(object):
+    """ A sqlite3 cursor taking the statements and the parameters of MySQLdb """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.connection.cursor()
+
+    def __getattr__(self, name):
+        # fetchone(), fetchall(), rowcount, lastrowid...
+        return getattr(self.cursor, name)
+
+    def execute(self, sql, parameters=None):
+        if sql.strip().lower() == 'commit;':
+            self.connection.commit()
+            return
+        if parameters is None:
+            parameters = ()
+        elif not isinstance(parameters, (list, tuple)):
+            # MySQLdb takes a single value for a single marker
+            parameters = (parameters,)
+        self.cursor.execute(translate(sql), parameters)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+class Connection(object):
+    """ A sqlite3 connection whose cursors take MySQLdb statements """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, timeout=DATABASE_POOL_TIMEOUT, check_same_thread=False,
+                                          detect_types=sqlite3.PARSE_DECLTYPES)
+        self.connection.row_factory = dict_factory
+        self.connection.text_factory = unicode
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        # like a released pooled connection, an uncommitted transaction is rolled back
+        self.connection.rollback()
+        self.connection.close()
+
+def connect(path):
+    """ DB-API entry point, used by adbapi """
+
+    return Connection(path)
+
+class SQLiteBackend(StorageBackend):
+    """ A single file database standing in for MySQL, for local runs and benchmarks without a server.
+        The schema is created on first use.
+    """
+
+    name = 'sqlite'
+    # SQLITE_MAX_VARIABLE_NUMBER of the builds before 3.32
+    max_parameters = 999
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.prepared = False
+
+    def prepare(self):
+        """ create the shared tables once, the file is switched to WAL so readers do not block the pipeline """
+
+        with self.lock:
+            if self.prepared:
+                return
+            connection = sqlite3.connect(self.path, timeout=DATABASE_POOL_TIMEOUT)
+            connection.execute("pragma journal_mode=wal;")
+            connection.executescript(SCHEMA)
+            connection.commit()
+            connection.close()
+            self.prepared = True
+
+    def connect(self):
+        self.prepare()
+        return Connection(self.path)
+
+    def connection_pool(self, **kwargs):
+        # sqlite has a single writer, one connection serializes the interactions
+        self.prepare()
+        return adbapi.ConnectionPool('fatech_production.storage.sqlite', self.path, cp_min=1, cp_max=1)
+
+    def transient(self, error):
+        # another writer held the file longer than the timeout
+        return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+    def same(self, field):
+        return field + " is %s"
+
+    def recent(self, column):
+        return column + " between datetime('now', '-' || %s || ' days') and datetime('now')"
+
+    def random(self):
+        return "random()"
+
+    def now(self):
+        return "datetime('now')"
+
+    def hours_later(self, hours):
+        return "datetime('now', '+%d hours')" % int(hours)
+
+    def update_vins_from_staging(self, site):
+        table = site + "_cars"
+        return "".join(("update ", table, " set vin = (select s.vin from staging_vins s where s.id = ", table, ".id)",
+                        " where id in (select id from staging_vins);"))
+
+    def upsert_vin_attempts_suffix(self, hours):
+        # the assignments of sqlite all read the old row
+        return "".join((" on conflict(site, id) do update set attempts = attempts + 1, retry_after = datetime('now', '+' || (",
+                        str(int(hours)), " * (attempts + 1)) || ' hours')"))
+
+    def create_vin_attempts(self, cursor):
+        # part of SCHEMA
+        pass
+
+    def upsert_urls_suffix(self, table):
+        return " on conflict(id) do update set status = case when excluded.status = 'S' then 'S' else status end"
+
+    def insert_ignore(self, table, columns, values):
+        return "".join(("insert or ignore into ", table, " (", columns, ") ", values))
+
+    def create_site_tables(self, cursor, site):
+        for statement in (SITE_TABLES % {'site': site, 'car_columns': CAR_COLUMNS_DDL}).split(";"):
+            if statement.strip():
+                query_stats.execute(cursor, 'settings.create_tables', statement + ";")
@@ -23,6 +23,7 @@ from scrapy.http import Request
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.misc.dbutil import *
+from fatech_production.misc.idbitmap import load_stored_ids
 from fatech_production.misc.spidersettings import MainSpiderSettings 
 
 
@@ -36,6 +37,8 @@ class MainSpider(BaseSpider):
     
     # default & custom settings
     settings = ""
+    # site parser shared with the other spiders of the site, set by subclasses
+    parser = None
 
     def __init__(self, site, base_url, **kwargs):
         """
@@ -51,11 +54,14 @@ class MainSpider(BaseSpider):
         dispatcher.connect(self.spider_opened, signals.spider_opened)
         dispatcher.connect(self.spider_closed, signals.spider_closed)
 
+        # Settings of this run, read once and written back by save()
+        self.site_settings = MainSpiderSettings(site)
+
         # Make sure the default settings is initialized
-        MainSpiderSettings(site).initialize_settings()
+        self.site_settings.initialize_settings()
 
         # Get current spider settings for this site
-        self.settings = MainSpiderSettings(site).load_settings()
+        self.settings = self.site_settings.load_settings()
             
     def spider_opened(self, spider):
         """
@@ -81,7 +87,8 @@ class MainSpider(BaseSpider):
             raise exceptions.CloseSpider('Main Spider already active')
 
         # Set spider is activating
-        MainSpiderSettings(self.site).write_active('T')
+        self.site_settings.write_active('T')
+        self.site_settings.save()
 
         # If new recon_start is existed
         if self.settings['recon_startid'] == -1:
@@ -102,18 +109,23 @@ class MainSpider(BaseSpider):
 
         # Shuffle the id list before requesting
         random.shuffle(url_ids)
-        
+
+        # ids already stored with status S are not requested again
+        stored_ids = load_stored_ids(self.site)
+
         for id in url_ids:
+            if id in stored_ids:
+                continue
             req = Request("".join([self.base_url, str(id)]), dont_filter=True, callback=self.parse)
             req.meta['url_id'] = id
             yield req
             
     def parse(self, response):
         """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
+            parse html response with the site parser and then throw scraped items to Scrapy's pipeline
         """
-        # Place custom code here
-        pass
+
+        return self.parser.parse(response)
 
     def fireon_spider(self, spider):
         """ send curl request to fire on next spider """
@@ -131,9 +143,11 @@ class MainSpider(BaseSpider):
             return
 
         # Write a new start_id for next run
-        MainSpiderSettings(self.site).write_startid(self.settings['main_startid'] + self.settings['block_size'])
+        self.site_settings.write_startid(self.settings['main_startid'] + self.settings['block_size'])
         # Set deactive the spider
-        MainSpiderSettings(self.site).write_active('F')
+        self.site_settings.write_active('F')
+        # both in a single update
+        self.site_settings.save()
 
         # Determine main or recon spider to be fired on next
         if self.settings['main_startid'] + 2*self.settings['block_size'] < self.settings['recon_startid']: 
@@ -25,6 +25,7 @@ from scrapy.http import Request
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.misc.dbutil import *
+from fatech_production.misc.idbitmap import load_stored_ids
 from fatech_production.misc.spidersettings import RecheckSpiderSettings
 
 
@@ -37,6 +38,8 @@ class RecheckSpider(BaseSpider):
     
     # default & custom settings
     settings = ""
+    # site parser shared with the other spiders of the site, set by subclasses
+    parser = None
 
     def __init__(self, site, base_url, **kwargs):
         """
@@ -52,11 +55,14 @@ class RecheckSpider(BaseSpider):
         dispatcher.connect(self.spider_opened, signals.spider_opened)
         dispatcher.connect(self.spider_closed, signals.spider_closed)
 
+        # Settings of this run, read once and written back by save()
+        self.site_settings = RecheckSpiderSettings(site)
+
         # Make sure the default settings is initialized
-        RecheckSpiderSettings(site).initialize_settings()
+        self.site_settings.initialize_settings()
         
         # Get current spider settings for this site
-        self.settings = RecheckSpiderSettings(site).load_settings()
+        self.settings = self.site_settings.load_settings()
 
     def spider_opened(self, spider):
         """
@@ -82,28 +88,37 @@ class RecheckSpider(BaseSpider):
             raise exceptions.CloseSpider('Recheck Spider already active')
 
         # if any available urls
-        if len(self.settings['url_ids']) == 0:
+        if self.settings['url_ids'].is_empty():
             log.msg('[RECHECK_IS_EMPTY] - at %s EST' % (datetime.now(timezone('US/Eastern')).strftime("%Y-%m-%d %H:%M:%S")), level=log.INFO)
             # Close the spider
+            # the cursor is reset
+            self.settings['url_ids'].write_cursor()
+            self.site_settings.save()
             raise exceptions.CloseSpider('Recheck URLs is empty')             
         
         # Set spider is activating
-        RecheckSpiderSettings(self.site).write_active('T')
+        self.site_settings.write_active('T')
+        self.site_settings.save()
 
-        log.msg('[URL_QUANTITY] - %s at %s EST' % (len(self.settings['url_ids']), datetime.now(timezone('US/Eastern'))
+        log.msg('[URL_CURSOR] - %s at %s EST' % (self.settings['url_ids'].cursor, datetime.now(timezone('US/Eastern'))
                 .strftime("%Y-%m-%d %H:%M:%S")), level=log.INFO)
 
+        # ids already stored with status S meanwhile are not requested again
+        stored_ids = load_stored_ids(self.site)
+
         for id in self.settings['url_ids']:
+            if id in stored_ids:
+                continue
             req = Request("".join((self.base_url, str(id))), dont_filter=True, callback=self.parse)
             req.meta['url_id'] = id
             yield req
 
     def parse(self, response):
         """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
+            parse html response with the site parser and then throw scraped items to Scrapy's pipeline
         """
-        # Place custom code here
-        pass
+
+        return self.parser.parse(response)
 
     def spider_closed(self, spider):
         """
@@ -113,8 +128,10 @@ class RecheckSpider(BaseSpider):
         if spider is not self:
             return
 
-        # Set deactive the spider
-        RecheckSpiderSettings(self.site).write_active('F')
+        # Write the cursor for the next run and set deactive the spider
+        self.settings['url_ids'].write_cursor()
+        self.site_settings.write_active('F')
+        self.site_settings.save()
 
         log.msg('[DEACTIVE SPIDER] - at %s EST' % (datetime.now(timezone('US/Eastern')).strftime(
             "%Y-%m-%d %H:%M:%S")), level=log.INFO)
@@ -22,8 +22,10 @@ from scrapy.http import Request
 from fatech_production.items import Car
 from fatech_production.items import Link
 from fatech_production.misc.spiderutil import generate_ids
+from fatech_production.misc.idbitmap import load_stored_ids
 from fatech_production.misc.spidersettings import ReconSpiderSettings
 from fatech_production.misc.spidersettings import MainSpiderSettings
+from fatech_production.parsers.siteparser import count
 
 
 class ReconSpider(BaseSpider):
@@ -39,8 +41,12 @@ class ReconSpider(BaseSpider):
     newest_startid = -1
     # default & custom settings
     settings = ""
+    # site parser shared with the other spiders of the site, set by subclasses
+    parser = None
+    # probe mode: None to download every page, 'head' or 'range' to check ids first
+    probe = None
 
-    def __init__(self, site, base_url, recon_startid=None, **kwargs):
+    def __init__(self, site, base_url, recon_startid=None, probe=None, **kwargs):
         """
             Assign all custom settings
         """
@@ -50,21 +56,31 @@ class ReconSpider(BaseSpider):
         # base url to add id to
         self.base_url = base_url
 
+        # Opt-in probe mode, e.g. scrapy crawl carlocate_recon -a probe=head
+        if probe:
+            self.probe = 'range' if probe == 'range' else 'head'
+            # probes are not redirected, the spider has to see the redirects
+            self.handle_httpstatus_list = self.handle_httpstatus_list + [302, 303, 307]
+
         # Connect to Scrapy Signal
         dispatcher.connect(self.spider_opened, signals.spider_opened)
         dispatcher.connect(self.spider_closed, signals.spider_closed)
 
+        # Settings of this run, read once and written back by save()
+        self.site_settings = ReconSpiderSettings(site)
+
         # Make sure the default settings is initialized
-        ReconSpiderSettings(site).initialize_settings()
+        self.site_settings.initialize_settings()
 
         # Get current spider settings for this site
-        self.settings = ReconSpiderSettings(site).load_settings()
+        self.settings = self.site_settings.load_settings()
 
         # Override recon_startid from parameter
         if recon_startid:
             self.settings['recon_startid'] = recon_startid
             # update initial recon_startid into the database
-            ReconSpiderSettings(self.site).write_startid(recon_startid)
+            self.site_settings.write_startid(recon_startid)
+            self.site_settings.save()
         
     def spider_opened(self, spider):
         """
@@ -90,7 +106,8 @@ class ReconSpider(BaseSpider):
             raise exceptions.CloseSpider('Recon Spider already active')
 
         # Set spider is activating
-        ReconSpiderSettings(self.site).write_active('T')
+        self.site_settings.write_active('T')
+        self.site_settings.save()
 
         log.msg('[START_ID] - %s at %s EST' % (str(self.settings['recon_startid']), datetime.now(timezone('US/Eastern'))
                 .strftime("%Y-%m-%d %H:%M:%S")), level=log.INFO)
@@ -103,21 +120,63 @@ class ReconSpider(BaseSpider):
             raise exceptions.CloseSpider('Provide start_id value via start_id parameter for initilizing')
 
         # Generate ids list for reconnoitering
-        url_ids = generate_ids(self.site)
-        
+        url_ids = generate_ids(self.site_settings)
+
+        # ids already stored with status S are not requested again
+        stored_ids = load_stored_ids(self.site)
+
         # Send URL requests
         for id in url_ids:
+            if id in stored_ids:
+                continue
+            yield self.get_request(id)
+
+    def get_request(self, id):
+        """ build the request of an id, a probing one in probe mode """
+
+        if not self.probe:
             req = Request("".join([self.base_url, str(id)]), dont_filter=True, callback=self.parse)
-            # save url_id for calling back
-            req.meta['url_id'] = id
-            yield req
-            
+        elif self.probe == 'range':
+            # only the first byte of the page is downloaded
+            req = Request("".join([self.base_url, str(id)]), dont_filter=True, callback=self.parse_probe,
+                          headers={'Range': 'bytes=0-0'})
+        else:
+            req = Request("".join([self.base_url, str(id)]), method='HEAD', dont_filter=True, callback=self.parse_probe)
+
+        # save url_id for calling back
+        req.meta['url_id'] = id
+        if self.probe:
+            # the redirect itself tells whether the id exists, never download its target
+            req.meta['dont_redirect'] = True
+        return req
+
+    def parse_probe(self, response):
+        """
+            check if the probed id exists, confirmed hits are requested again to download the full page
+        """
+
+        url_id = response.request.meta['url_id']
+        if self.parser.is_probe_miss(response):
+            count(self.site, 'probe_miss')
+            return [self.parser.get_link(url_id, 'E')]
+
+        count(self.site, 'probe_hit')
+        req = Request("".join([self.base_url, str(url_id)]), dont_filter=True, callback=self.parse)
+        req.meta['url_id'] = url_id
+        return [req]
+
     def parse(self, response):
         """
-            a custom method to parse html response and then throw scraped items to Scrapy's pipeline
+            parse html response with the site parser and then throw scraped items to Scrapy's pipeline
         """
-        # Place custom code here
-        pass
+
+        items = self.parser.parse(response)
+        for item in items:
+            if isinstance(item, Car):
+                # Set a new start_id
+                self.set_newest_startid(int(item['url_id']))
+
+        return items
 
     def set_newest_startid(self, setting):
         """ set newest start_id value """
@@ -140,17 +199,20 @@ class ReconSpider(BaseSpider):
             return
 
         # Set deactive the spider
-        ReconSpiderSettings(self.site).write_active('F')
+        self.site_settings.write_active('F')
         
         # Set settings if it needs to be reset
         if self.newest_startid > -1:
             # reset cycles
-            ReconSpiderSettings(self.site).write_cycles(1)
+            self.site_settings.write_cycles(1)
             # Write a new start_id
-            ReconSpiderSettings(self.site).write_startid(self.newest_startid)
+            self.site_settings.write_startid(self.newest_startid)
         else:
             # Increase cycles value
-            ReconSpiderSettings(self.site).write_cycles(self.settings['cycles'] + 1)
+            self.site_settings.write_cycles(self.settings['cycles'] + 1)
+
+        # active, cycles, start_id and overs in a single update
+        self.site_settings.save()
             
         # Determine main or recon spider to be fired on next
         if self.newest_startid > self.settings['main_startid'] + self.settings['block_size']:
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+#######################################
+### MySQLProtocol against the packets of a server
+#######################################
+
+# Python imports
+import struct
+import unittest
+from hashlib import sha1
+from binascii import unhexlify
+from datetime import datetime
+from decimal import Decimal
+from twisted.internet import defer
+from twisted.internet.error import ConnectionDone
+from twisted.python.failure import Failure
+from twisted.test.proto_helpers import StringTransport
+
+# Custom imports
+from fatech_production.storage.mysqlprotocol import MAX_PACKET
+from fatech_production.storage.mysqlprotocol import MySQLError
+from fatech_production.storage.mysqlprotocol import MySQLProtocol
+from fatech_production.storage.mysqlprotocol import MySQLProtocolPool
+from fatech_production.storage.mysqlprotocol import format_query
+from fatech_production.storage.mysqlprotocol import literal
+
+# scramble of the handshake, 8 + 12 bytes
+SCRAMBLE = 'abcdefgh' + 'ijklmnopqrst'
+# PASSWORD('secret'), as the server stores it
+PASSWORD_HASH = unhexlify('14E65567ABDB5135D0CFD9A70B3032C179A49EE7')
+
+def packet(payload, sequence):
+    return struct.pack('<I', len(payload))[:3] + chr(sequence) + payload
+
+def length(value):
+    if value < 0xfb:
+        return chr(value)
+    if value < 0x10000:
+        return '\xfc' + struct.pack('<H', value)
+    if value < 0x1000000:
+        return '\xfd' + struct.pack('<I', value)[:3]
+    return '\xfe' + struct.pack('<Q', value)
+
+def string(value):
+    return '\xfb' if value is None else length(len(value)) + value
+
+def handshake():
+    """ the handshake of a MySQL 5.5 server """
+
+    capabilities = 0xf7ff | (0x81bf << 16)
+    return ''.join(('\x0a', '5.5.40\0', struct.pack('<I', 7), SCRAMBLE[:8], '\0',
+                    struct.pack('<H', capabilities & 0xffff), chr(33), struct.pack('<H', 2),
+                    struct.pack('<H', capabilities >> 16), chr(21), '\0' * 10, SCRAMBLE[8:], '\0',
+                    'mysql_native_password\0'))
+
+def ok(rowcount=0, lastrowid=0):
+    return '\x00' + length(rowcount) + length(lastrowid) + struct.pack('<HH', 2, 0)
+
+def error(code, message):
+    return '\xff' + struct.pack('<H', code) + '#23000' + message
+
+def column(name, column_type, charset=33):
+    return ''.join((string('def'), string('spiderweb01'), string('t'), string('t'), string(name), string(name),
+                    '\x0c', struct.pack('<HIB', charset, 255, column_type), '\0\0\0\0\0'))
+
+EOF = '\xfe\0\0\x02\0'
+
+def result_set(columns, rows):
+    """ the packets of a result set, columns as (name, type) and rows as lists of text values """
+
+    payloads = [length(len(columns))] + [column(name, column_type) for name, column_type in columns] + [EOF]
+    payloads.extend(''.join(string(value) for value in row) for row in rows)
+    payloads.append(EOF)
+    return ''.join(packet(payload, sequence + 1) for sequence, payload in enumerate(payloads))
+
+class LiteralTest(unittest.TestCase):
+
+    def test_quotes_and_backslashes(self):
+        self.assertEqual(literal("O'Reilly \"GT\""), "'O\\'Reilly \\\"GT\\\"'")
+        self.assertEqual(literal('C:\\cars\n'), "'C:\\\\cars\\n'")
+
+    def test_nul_and_ctrl_z(self):
+        self.assertEqual(literal('a\0b\x1a\r'), "'a\\0b\\Z\\r'")
+
+    def test_unicode_is_utf8(self):
+        self.assertEqual(literal(u'Citro\xebn'), "'Citro\xc3\xabn'")
+        self.assertEqual(format_query(u"select %s, %s", (u"l'\xe9t\xe9", None)), "select 'l\\'\xc3\xa9t\xc3\xa9', NULL")
+
+    def test_values(self):
+        self.assertEqual(format_query("select %s, %s, %s, %s", (12, Decimal('1.50'), True, datetime(2013, 5, 1, 8, 30))),
+                         "select 12, 1.50, 1, '2013-05-01 08:30:00'")
+        # a single value for a single marker, like MySQLdb
+        self.assertEqual(format_query("select %s", 'a'), "select 'a'")
+
+class ProtocolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.protocol = MySQLProtocol('spider', 'secret', 'spiderweb01', timeout=5)
+        self.transport = StringTransport()
+        self.protocol.makeConnection(self.transport)
+
+    def tearDown(self):
+        if self.protocol.timer is not None and self.protocol.timer.active():
+            self.protocol.timer.cancel()
+
+    def authenticate(self):
+        self.protocol.dataReceived(packet(handshake(), 0))
+        self.protocol.dataReceived(packet(ok(), 2))
+        self.transport.clear()
+
+    def answered(self, d):
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1, 'not answered')
+        return results[0]
+
+    def test_native_password(self):
+        ready = []
+        self.protocol.ready.addCallback(ready.append)
+        self.protocol.dataReceived(packet(handshake(), 0))
+
+        sent = self.transport.value()
+        self.assertEqual(ord(sent[3]), 1)
+        payload = sent[4:]
+        user_end = payload.index('\0', 32)
+        self.assertEqual(payload[32:user_end], 'spider')
+        auth = payload[user_end + 2:user_end + 2 + ord(payload[user_end + 1])]
+        # checked like the server does with the stored hash
+        digest = sha1(SCRAMBLE + PASSWORD_HASH).digest()
+        stage1 = ''.join(chr(ord(a) ^ ord(b)) for a, b in zip(auth, digest))
+        self.assertEqual(sha1(stage1).digest(), PASSWORD_HASH)
+        self.assertTrue(payload.endswith('spiderweb01\0mysql_native_password\0'))
+
+        self.protocol.dataReceived(packet(ok(), 2))
+        self.assertEqual(ready, [self.protocol])
+
+    def test_statements_wait_for_the_authentication(self):
+        d = self.protocol.query('select 1')
+        self.protocol.dataReceived(packet(handshake(), 0))
+        self.transport.clear()
+        self.protocol.dataReceived(packet(ok(), 2))
+        self.assertEqual(self.transport.value(), packet('\x03select 1', 0))
+        self.protocol.dataReceived(packet(ok(), 1))
+        self.assertEqual(self.answered(d).rowcount, 0)
+
+    def test_access_denied(self):
+        failures = []
+        self.protocol.ready.addErrback(failures.append)
+        self.protocol.dataReceived(packet(handshake(), 0))
+        self.protocol.dataReceived(packet(error(1045, "Access denied for user 'spider'"), 2))
+        self.assertEqual(failures[0].value.args[0], 1045)
+        self.assertTrue(self.transport.disconnecting)
+
+    def test_ok(self):
+        self.authenticate()
+        d = self.protocol.execute("insert into t values (%s)", "a")
+        self.assertEqual(self.transport.value(), packet("\x03insert into t values ('a')", 0))
+        self.protocol.dataReceived(packet(ok(3, 300), 1))
+        result = self.answered(d)
+        self.assertEqual((result.rowcount, result.lastrowid), (3, 300))
+
+    def test_error(self):
+        self.authenticate()
+        d = self.protocol.query('insert into t values (1)')
+        self.protocol.dataReceived(packet(error(1062, "Duplicate entry '1' for key 'PRIMARY'"), 1))
+        failure = self.answered(d)
+        self.assertTrue(failure.check(MySQLError))
+        self.assertEqual(failure.value.args, (1062, u"Duplicate entry '1' for key 'PRIMARY'"))
+
+    def test_result_set(self):
+        self.authenticate()
+        d = self.protocol.query('select * from t')
+        columns = (('id', 3), ('vin', 253), ('price', 246), ('updated', 12))
+        self.protocol.dataReceived(result_set(columns, (('1', 'VIN1', '1500.50', '2013-05-01 08:30:00'),
+                                                        ('2', None, None, '0000-00-00 00:00:00'))))
+        self.assertEqual(self.answered(d).rows, [
+            {u'id': 1, u'vin': u'VIN1', u'price': Decimal('1500.50'), u'updated': datetime(2013, 5, 1, 8, 30)},
+            {u'id': 2, u'vin': None, u'price': None, u'updated': None},
+        ])
+
+    def test_packets_split_across_reads(self):
+        self.authenticate()
+        first = self.protocol.query('select id from t')
+        second = self.protocol.query('update t set id = 2')
+        data = result_set((('id', 3),), (('1',), ('2',))) + packet(ok(1), 1)
+        for byte in data:
+            self.protocol.dataReceived(byte)
+        self.assertEqual(self.answered(first).rows, [{u'id': 1}, {u'id': 2}])
+        self.assertEqual(self.answered(second).rowcount, 1)
+
+    def test_continued_packet(self):
+        self.authenticate()
+        d = self.protocol.query('select vin from t')
+        value = 'x' * (MAX_PACKET + 10)
+        row = string(value)
+        # the row payload exceeds MAX_PACKET: a full packet, then the rest
+        data = ''.join((packet(length(1), 1), packet(column('vin', 252, 63), 2), packet(EOF, 3),
+                        packet(row[:MAX_PACKET], 4), packet(row[MAX_PACKET:], 5), packet(EOF, 6)))
+        self.protocol.dataReceived(data[:MAX_PACKET // 2])
+        self.protocol.dataReceived(data[MAX_PACKET // 2:])
+        rows = self.answered(d).rows
+        self.assertEqual(len(rows), 1)
+        self.assertTrue(rows[0][u'vin'] == value)
+
+    def test_error_among_rows(self):
+        self.authenticate()
+        d = self.protocol.query('select id from t')
+        following = self.protocol.query('select 1')
+        data = result_set((('id', 3),), (('1',),))
+        # the EOF closing the rows replaced by the ERR of a killed query
+        data = data[:-len(packet(EOF, 0))] + packet(error(1317, 'Query execution was interrupted'), 5)
+        self.protocol.dataReceived(data + packet(ok(), 1))
+        self.assertEqual(self.answered(d).value.args[0], 1317)
+        self.assertEqual(self.answered(following).rowcount, 0)
+        self.assertTrue(self.protocol.connected)
+
+    def test_query_on_a_lost_connection(self):
+        self.authenticate()
+        pending = self.protocol.query('select 1')
+        self.protocol.connectionLost(Failure(ConnectionDone()))
+        self.assertTrue(self.answered(pending).check(ConnectionDone))
+        self.assertEqual(self.answered(self.protocol.query('select 1')).value.args[0], 2006)
+
+    def test_timeout(self):
+        self.authenticate()
+        d = self.protocol.query('select sleep(100)')
+        self.assertTrue(self.protocol.timer.active())
+        self.protocol.timer.cancel()
+        self.protocol.timed_out()
+        self.assertEqual(self.answered(d).value.args[0], 2013)
+        self.assertFalse(self.protocol.connected)
+
+class TransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = MySQLProtocolPool(size=1)
+        self.protocol = MySQLProtocol('spider', 'secret', 'spiderweb01', timeout=5)
+        self.transport = StringTransport()
+        self.protocol.makeConnection(self.transport)
+        self.protocol.dataReceived(packet(handshake(), 0))
+        self.protocol.dataReceived(packet(ok(), 2))
+        self.transport.clear()
+        self.pool.idle.append(self.protocol)
+        self.pool.opened = 1
+
+    def tearDown(self):
+        if self.protocol.timer is not None and self.protocol.timer.active():
+            self.protocol.timer.cancel()
+
+    def statements(self):
+        data = self.transport.value()
+        statements = []
+        while data:
+            size = struct.unpack('<I', data[:3] + '\0')[0]
+            statements.append(data[5:4 + size])
+            data = data[4 + size:]
+        return statements
+
+    def test_commit(self):
+        def interaction(transaction):
+            transaction.execute('insert into t values (%s)', 1)
+            return 'done'
+
+        results = []
+        d = self.pool.runInteraction(interaction)
+        d.addBoth(results.append)
+        self.protocol.dataReceived(packet(ok(), 1) + packet(ok(1), 1))
+        self.assertEqual(self.statements(), ['start transaction;', 'insert into t values (1)', 'commit;'])
+        self.protocol.dataReceived(packet(ok(), 1))
+        self.assertEqual(results, ['done'])
+        self.assertEqual(self.pool.idle, [self.protocol])
+
+    def test_rollback_on_the_first_failed_statement(self):
+        def interaction(transaction):
+            transaction.execute('insert into t values (1)')
+            transaction.execute('insert into t values (2)')
+
+        results = []
+        d = self.pool.runInteraction(interaction)
+        d.addBoth(results.append)
+        self.protocol.dataReceived(packet(ok(), 1) + packet(error(1062, "Duplicate entry '1'"), 1))
+        self.protocol.dataReceived(packet(ok(1), 1))
+        self.assertEqual(self.statements(), ['start transaction;', 'insert into t values (1)',
+                                             'insert into t values (2)', 'rollback;'])
+        self.assertEqual(results, [])
+        self.protocol.dataReceived(packet(ok(), 1))
+        self.assertEqual(results[0].value.args[0], 1062)
+        self.assertEqual(self.pool.idle, [self.protocol])
+
+    def test_release_of_a_lost_connection(self):
+        waiting = self.pool.acquire()
+        self.assertEqual(self.pool.opened, 1)
+        second = []
+        self.pool.acquire().addCallback(second.append)
+        connected = defer.Deferred()
+        self.pool.connect = lambda: connected
+
+        self.protocol.connectionLost(Failure(ConnectionDone()))
+        self.pool.release(self.answered(waiting))
+        # the waiting interaction gets a new connection instead of the lost one
+        self.assertEqual(self.pool.opened, 1)
+        self.assertEqual(self.pool.idle, [])
+        connected.callback('new connection')
+        self.assertEqual(second, ['new connection'])
+
+    def test_acquire_skips_a_lost_idle_connection(self):
+        self.protocol.connectionLost(Failure(ConnectionDone()))
+        connected = defer.Deferred()
+        self.pool.connect = lambda: connected
+        self.assertTrue(self.pool.acquire() is connected)
+        self.assertEqual(self.pool.opened, 1)
+
+    def answered(self, d):
+        results = []
+        d.addBoth(results.append)
+        return results[0]
+
+if __name__ == '__main__':
+    unittest.main()
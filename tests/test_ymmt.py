@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+#######################################
+### extract_YMMT against the nested loop it replaced
+#######################################
+
+# Python imports
+import re
+import unittest
+
+# Custom imports
+from fatech_production.misc.catalog import catalog
+from fatech_production.misc.spiderutil import extract_YMMT
+from fatech_production.misc.spiderutil import generate_ngrams
+
+# (make, model) rows of year_make_model
+PAIRS = (
+    ('Honda', 'Civic'), ('Honda', 'Accord'), ('Honda', 'CR-V'), ('Honda', 'Odyssey'),
+    ('Toyota', 'Camry'), ('Toyota', 'Corolla'), ('Toyota', 'RAV4'), ('Toyota', 'Land Cruiser'),
+    ('Ford', 'F-150'), ('Ford', 'Mustang'), ('Ford', 'Escape'), ('Ford', 'Focus'),
+    ('Chevrolet', 'Silverado 1500'), ('Chevrolet', 'Malibu'), ('Chevrolet', 'Tahoe'), ('Chevrolet', 'Monte Carlo'),
+    ('Dodge', 'Ram 1500'), ('Dodge', 'Grand Caravan'), ('Dodge', 'Charger'),
+    ('Nissan', 'Altima'), ('Nissan', 'Maxima'), ('Nissan', 'Pathfinder'),
+    ('BMW', '328i'), ('BMW', 'X5'), ('Mercedes-Benz', 'C300'), ('Mercedes-Benz', 'E350'),
+    ('Hyundai', 'Sonata'), ('Hyundai', 'Elantra'), ('Kia', 'Optima'), ('Kia', 'Sorento'),
+    ('Jeep', 'Wrangler'), ('Jeep', 'Grand Cherokee'), ('Subaru', 'Outback'), ('Subaru', 'Forester'),
+    ('Volkswagen', 'Jetta'), ('Volkswagen', 'Passat'), ('Mazda', 'MAZDA3'), ('Lexus', 'RX 350'),
+    ('Land Rover', 'Range Rover Sport'), ('GMC', 'Sierra 1500'), ('Cadillac', 'Escalade'),
+)
+
+# descriptions as listed by the sites
+DESCRIPTIONS = (
+    "2012 Honda Civic LX",
+    "2010 Honda Accord EX-L V6 Sedan",
+    "2009 Honda CR-V EX 4WD",
+    "2007 Honda Odyssey Touring",
+    "Honda Civic 2012 LX",
+    "2011 Toyota Camry LE",
+    "2008 Toyota Corolla S",
+    "2013 Toyota RAV4 Limited AWD",
+    "2004 Toyota Land Cruiser Base",
+    "2010 Ford F-150 XLT SuperCrew",
+    "2006 Ford Mustang GT Premium Convertible",
+    "2012 Ford Escape XLT",
+    "2014 Ford Focus",
+    "2008 Chevrolet Silverado 1500 LT Crew Cab",
+    "2011 Chevrolet Malibu LT",
+    "2007 Chevrolet Tahoe LTZ 4x4",
+    "2003 Chevrolet Monte Carlo SS",
+    "2009 Dodge Ram 1500 SLT Quad Cab",
+    "2010 Dodge Grand Caravan SXT",
+    "2012 Dodge Charger R/T",
+    "2009 Nissan Altima 2.5 S",
+    "2011 Nissan Maxima SV",
+    "2005 Nissan Pathfinder LE",
+    "2008 BMW 328i Sedan",
+    "2010 BMW X5 xDrive30i",
+    "2011 Mercedes-Benz C300 4MATIC Sport",
+    "2010 Mercedes-Benz E350",
+    "2012 Hyundai Sonata GLS",
+    "2013 Hyundai Elantra Limited",
+    "2011 Kia Optima EX",
+    "2012 Kia Sorento LX V6",
+    "2010 Jeep Wrangler Unlimited Sahara",
+    "2011 Subaru Outback 2.5i Premium",
+    "2009 Subaru Forester X Limited",
+    "2012 Volkswagen Jetta SE",
+    "2008 Volkswagen Passat Komfort",
+    "2012 Mazda MAZDA3 i Touring",
+    "2010 Lexus RX 350 AWD",
+    "2011 Land Rover Range Rover Sport HSE",
+    "2012 GMC Sierra 1500 SLE",
+    "2008 Cadillac Escalade AWD",
+    "2010 Honda Prelude Si",
+    "2011 Ford Unknownmodel XL",
+    "2010 Tractor Supply Model 12",
+)
+
+def baseline_YMMT(data):
+    """ extract_YMMT before the hash index: every gram against every model of the make """
+
+    standard_makes = (
+        'Acura', 'Alfa Romeo', 'AMC', 'Aston Martin',
+        'Audi', 'Avanti', 'Bentley', 'BMW', 'Buick',
+        'Cadillac', 'Chevrolet', 'Chrysler', 'Daewoo',
+        'Daihatsu', 'Datsun', 'DeLorean', 'Dodge', 'Eagle',
+        'Ferrari', 'Fiat', 'Fisker', 'Ford', 'Freightliner',
+        'Geo', 'GMC', 'Honda', 'Hummer', 'Hyundai',
+        'Infiniti', 'Isuzu', 'Jaguar', 'Jeep', 'Kia',
+        'Lamborghini', 'Lancia', 'Land Rover', 'Lexus',
+        'Lincoln', 'Lotus', 'Maserati', 'Maybach', 'Mazda',
+        'McLaren', 'Mercedes-Benz', 'Mercury', 'Merkur',
+        'Mini', 'Mitsubishi', 'Nissan', 'Oldsmobile',
+        'Peugeot', 'Plymouth', 'Pontiac', 'Porsche',
+        'Renault', 'Rolls-Royce', 'Saab', 'Saturn', 'Scion',
+        'Smart', 'SRT', 'Sterling', 'Subaru', 'Suzuki',
+        'Tesla', 'Toyota', 'Triumph', 'Volkswagen', 'Volvo',
+        'Yugo', 'Ram',
+    )
+
+    year = re.search(r'(\d+)', data).group(1)
+
+    make = None
+    for m in standard_makes:
+        if m in data:
+            make = m
+            break
+        elif m.upper() in data:
+            make = m.upper()
+            break
+    if not make:
+        return -1
+
+    data = data.replace(year, '', 1)
+    data = data.replace(make, '', 1).strip()
+
+    model = ""
+    trim = ""
+    ngrams = generate_ngrams(data)
+    all_models = catalog.get_models(make)
+
+    for gram in ngrams:
+        found = False
+        for each in all_models:
+            if each.lower().strip() == gram.lower().strip():
+                model = gram
+                try:
+                    trim = re.search(model + r'(.+)', data).group(1).strip()
+                except:
+                    pass
+                found = True
+                break
+        if found:
+            break
+
+    return {'year': year, 'make': make.strip(), 'model': model.strip(), 'trim': trim.strip()}
+
+class ExtractYMMTTest(unittest.TestCase):
+
+    def setUp(self):
+        catalog.load_pairs(PAIRS)
+
+    def test_same_as_baseline(self):
+        for description in DESCRIPTIONS:
+            self.assertEqual(extract_YMMT(description), baseline_YMMT(description), description)
+
+    def test_year_inside_description(self):
+        # "Civic 2012 LX" leaves "Civic  LX" once the year is removed
+        catalog.load_pairs((('Honda', 'Civic LX'),))
+        self.assertEqual(extract_YMMT("Honda Civic 2012 LX"), baseline_YMMT("Honda Civic 2012 LX"))
+        self.assertEqual(extract_YMMT("Honda Civic 2012 LX")['trim'], '')
+
+    def test_longest_model_wins(self):
+        # the nested loop stopped at the first unigram, 'Cherokee'
+        catalog.load_pairs((('Jeep', 'Cherokee'), ('Jeep', 'Grand Cherokee')))
+        result = extract_YMMT("2011 Jeep Grand Cherokee Laredo 4WD")
+        self.assertEqual((result['model'], result['trim']), ('Grand Cherokee', 'Laredo 4WD'))
+
+if __name__ == '__main__':
+    unittest.main()